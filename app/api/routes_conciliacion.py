@@ -1,8 +1,8 @@
 from datetime import datetime, timedelta
 from fastapi import APIRouter, HTTPException, Depends, Request, Form, UploadFile, File, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import io, pandas as pd
 import PyPDF2
 import openai
@@ -20,7 +20,11 @@ from ..database import get_db
 from ..models import Conciliacion, Movimiento, ConciliacionMatch, Empresa, ConciliacionManual, ConciliacionManualBanco, ConciliacionManualAuxiliar, User, Task
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from ..utils.conciliaciones import realizar_conciliacion_automatica, crear_conciliacion_manual
+from ..utils.conciliaciones import realizar_conciliacion_automatica, crear_conciliacion_manual, construir_estrategias, invalidar_indice_conciliacion
+from ..utils.asignacion import MODOS_ASIGNACION
+from ..utils.conciliacion_lote import procesar_conciliaciones_en_lote
+from ..utils.previsualizacion import previsualizar_conciliacion_automatica, lineas_ndjson_previsualizacion, aplicar_propuestas
+from ..utils.fechas import normalizar_fecha, normalizar_fechas_columna
 from ..repositories.factory import RepositoryFactory
 
 router = APIRouter()
@@ -67,13 +71,14 @@ def lista_conciliaciones_json(
         # Usuario normal solo ve las suyas
         conciliaciones = conciliacion_repo.get_by_usuario(current_user.id)
 
+    # Conteos de movimientos de todas las conciliaciones en una sola consulta agrupada
+    conteos = movimiento_repo.count_by_conciliaciones([c.id for c in conciliaciones])
+
     conciliaciones_por_empresa = {}
     for c in conciliaciones:
         empresa = c.empresa.razon_social if c.empresa and c.empresa.razon_social else (c.empresa.nombre_comercial if c.empresa else 'Desconocida')
 
-        # Obtener estadísticas usando el repositorio
-        total = movimiento_repo.count_by_conciliacion(c.id)
-        conciliados = movimiento_repo.count_by_conciliacion(c.id, {'estado_conciliacion': 'conciliado'})
+        total, conciliados = conteos[c.id]
         pendientes = total - conciliados
 
         # Calcular el porcentaje de conciliación
@@ -104,6 +109,9 @@ def lista_conciliaciones_json(
 
     return JSONResponse(content=jsonable_encoder(conciliaciones_por_empresa))
 
+# Columnas de los movimientos pendientes en el detalle de una conciliación
+COLUMNAS_DETALLE_MOVIMIENTO = ['id', 'id_conciliacion', 'fecha', 'descripcion', 'valor', 'tipo', 'es', 'estado_conciliacion']
+
 @router.get("/{conciliacion_id}")
 def detalle_conciliacion_json(
     conciliacion_id: int,
@@ -127,11 +135,13 @@ def detalle_conciliacion_json(
             detail="No tienes permiso para acceder a esta conciliación"
         )
 
-    movimientos = movimiento_repo.get_by_conciliacion(conciliacion_id)
-    movimientos_no_conciliados = {
-        "banco": jsonable_encoder([m for m in movimientos if m.tipo == "banco" and m.estado_conciliacion == "no_conciliado"]),
-        "auxiliar": jsonable_encoder([m for m in movimientos if m.tipo == "auxiliar" and m.estado_conciliacion == "no_conciliado"]),
-    }
+    # Solo los pendientes y solo las columnas que se muestran, leídos por lotes
+    movimientos_no_conciliados = {"banco": [], "auxiliar": []}
+    for movimiento in movimiento_repo.iter_by_conciliacion(
+        conciliacion_id, {'estado_conciliacion': 'no_conciliado'}, columnas=COLUMNAS_DETALLE_MOVIMIENTO
+    ):
+        if movimiento.tipo in movimientos_no_conciliados:
+            movimientos_no_conciliados[movimiento.tipo].append(movimiento._asdict())
 
     # Obtener matches automáticos usando repositorio
     matches_automaticos = match_repo.get_by_conciliacion(conciliacion_id)
@@ -169,8 +179,7 @@ def detalle_conciliacion_json(
     movimientos_conciliados = movimientos_conciliados_automaticos + movimientos_conciliados_manuales
 
     # Calcular estadísticas usando el repositorio
-    total = movimiento_repo.count_by_conciliacion(conciliacion_id)
-    conciliados = movimiento_repo.count_by_conciliacion(conciliacion_id, {'estado_conciliacion': 'conciliado'})
+    total, conciliados = movimiento_repo.count_by_conciliaciones([conciliacion_id])[conciliacion_id]
     pendientes = total - conciliados
 
     # Calcular el porcentaje de conciliación
@@ -276,13 +285,13 @@ async def upload_files(
     try:
         banco_content = await file_banco.read()
         df_banco = pd.read_excel(io.BytesIO(banco_content))
-        df_banco['fecha'] = pd.to_datetime(df_banco['fecha'], format='%d-%m-%Y', errors='coerce').dt.strftime('%Y-%m-%d')
+        df_banco['fecha'] = normalizar_fechas_columna(df_banco['fecha'])
         df_banco.dropna(subset=['fecha'], inplace=True)
         validar_excel(df_banco, nombre_archivo=file_banco.filename, tipo_archivo="BANCO")
 
         auxiliar_content = await file_auxiliar.read()
         df_auxiliar = pd.read_excel(io.BytesIO(auxiliar_content))
-        df_auxiliar['fecha'] = pd.to_datetime(df_auxiliar['fecha'], format='%d-%m-%Y', errors='coerce').dt.strftime('%Y-%m-%d')
+        df_auxiliar['fecha'] = normalizar_fechas_columna(df_auxiliar['fecha'])
         df_auxiliar.dropna(subset=['fecha'], inplace=True)
         validar_excel(df_auxiliar, nombre_archivo=file_auxiliar.filename, tipo_archivo="AUXILIAR")
 
@@ -328,8 +337,8 @@ async def upload_files(
             for _, row in df_auxiliar.iterrows()
         ]
 
-        movimiento_repo.create_bulk(movimientos_banco_data)
-        movimiento_repo.create_bulk(movimientos_auxiliar_data)
+        movimiento_repo.create_bulk(movimientos_banco_data, return_ids=False)
+        movimiento_repo.create_bulk(movimientos_auxiliar_data, return_ids=False)
 
         return JSONResponse(content={"message": f"Archivos cargados exitosamente para la conciliación #{conciliacion_id}"})
     except Exception as e:
@@ -358,7 +367,7 @@ async def carga_archivo_individual(
         df = pd.read_excel(io.BytesIO(contenido))
         
         # Validar formato de fecha
-        df['fecha'] = pd.to_datetime(df['fecha'], format='%d-%m-%Y', errors='coerce').dt.strftime('%Y-%m-%d')
+        df['fecha'] = normalizar_fechas_columna(df['fecha'])
         df.dropna(subset=['fecha'], inplace=True)
         
         # Validar archivo usando validar_excel de utils
@@ -366,21 +375,20 @@ async def carga_archivo_individual(
         
         # Crear movimientos
         nuevos_movimientos = [
-            Movimiento(
-                id_conciliacion=conciliacion_id,
-                fecha=str(row['fecha']),
-                descripcion=row['descripcion'],
-                valor=abs(row['valor']),
-                es=row['es'],
-                tipo=tipo_movimiento,
-                estado_conciliacion="no_conciliado"
-            )
+            {
+                "id_conciliacion": conciliacion_id,
+                "fecha": str(row['fecha']),
+                "descripcion": row['descripcion'],
+                "valor": abs(row['valor']),
+                "es": row['es'],
+                "tipo": tipo_movimiento,
+                "estado_conciliacion": "no_conciliado"
+            }
             for _, row in df.iterrows()
         ]
         
-        # Guardar en base de datos
-        db.bulk_save_objects(nuevos_movimientos)
-        db.commit()
+        # Guardar en base de datos (create_bulk calcula las características de la descripción)
+        RepositoryFactory(db).get_movimiento_repository().create_bulk(nuevos_movimientos, return_ids=False)
         
         return JSONResponse(content={
             "message": f"{len(nuevos_movimientos)} movimientos agregados exitosamente a la conciliación #{conciliacion_id}",
@@ -486,20 +494,8 @@ async def agregar_movimientos_a_conciliacion(
         # Normalizar nombres de columnas a minúsculas
         df.columns = df.columns.str.lower().str.strip()
         
-        # Validar formato de fecha - intentar múltiples formatos
-        try:
-            # Primero intentar con formato DD/MM/YYYY
-            df['fecha'] = pd.to_datetime(df['fecha'], format='%d/%m/%Y', errors='coerce')
-        except:
-            try:
-                # Si falla, intentar con formato DD-MM-YYYY
-                df['fecha'] = pd.to_datetime(df['fecha'], format='%d-%m-%Y', errors='coerce')
-            except:
-                # Si falla, usar inferencia automática
-                df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
-        
-        # Convertir a formato estándar YYYY-MM-DD
-        df['fecha'] = df['fecha'].dt.strftime('%Y-%m-%d')
+        # Validar formato de fecha (múltiples formatos) y convertir a YYYY-MM-DD
+        df['fecha'] = normalizar_fechas_columna(df['fecha'])
         df.dropna(subset=['fecha'], inplace=True)
         
         # Validar archivo
@@ -507,21 +503,20 @@ async def agregar_movimientos_a_conciliacion(
         
         # Crear movimientos
         nuevos_movimientos = [
-            Movimiento(
-                id_conciliacion=conciliacion_id,
-                fecha=str(row['fecha']),
-                descripcion=row['descripcion'],
-                valor=abs(row['valor']),
-                es=row['es'],
-                tipo=tipo_movimiento,
-                estado_conciliacion="no_conciliado"
-            )
+            {
+                "id_conciliacion": conciliacion_id,
+                "fecha": str(row['fecha']),
+                "descripcion": row['descripcion'],
+                "valor": abs(row['valor']),
+                "es": row['es'],
+                "tipo": tipo_movimiento,
+                "estado_conciliacion": "no_conciliado"
+            }
             for _, row in df.iterrows()
         ]
         
-        # Guardar en base de datos
-        db.bulk_save_objects(nuevos_movimientos)
-        db.commit()
+        # Guardar en base de datos (create_bulk calcula las características de la descripción)
+        RepositoryFactory(db).get_movimiento_repository().create_bulk(nuevos_movimientos, return_ids=False)
         
         return JSONResponse(content={
             "message": f"{len(nuevos_movimientos)} movimientos agregados exitosamente a la conciliación #{conciliacion_id}",
@@ -536,14 +531,220 @@ async def agregar_movimientos_a_conciliacion(
 @router.post("/{conciliacion_id}/procesar")
 def procesar_conciliacion(
     conciliacion_id: int,
+    modo_asignacion: str = 'greedy',
+    incremental: bool = False,
+    estrategias: str = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Procesa automáticamente una conciliación utilizando los métodos de conciliación en utils/conciliaciones.py.
+
+    modo_asignacion: 'greedy' (por defecto) u 'optimo' (emparejamiento de cardinalidad máxima).
+    incremental: solo concilia los movimientos agregados desde el último procesamiento.
+    estrategias: etapas a ejecutar y su orden, separadas por coma
+    (ej. 'exacto,aproximado'). Por defecto CONCILIACION_ESTRATEGIAS.
     """
-    realizar_conciliacion_automatica(conciliacion_id, db)
-    return {"message": f"Conciliación #{conciliacion_id} procesada automáticamente."}
+    if modo_asignacion not in MODOS_ASIGNACION:
+        raise HTTPException(status_code=400, detail=f"modo_asignacion debe ser uno de: {', '.join(MODOS_ASIGNACION)}")
+    try:
+        estrategias = construir_estrategias(estrategias)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    stats = realizar_conciliacion_automatica(
+        conciliacion_id, db, modo_asignacion=modo_asignacion, incremental=incremental, estrategias=estrategias
+    )
+    return {"message": f"Conciliación #{conciliacion_id} procesada automáticamente.", "stats": stats}
+
+@router.get("/{conciliacion_id}/previsualizar")
+def previsualizar_conciliacion(
+    conciliacion_id: int,
+    modo_asignacion: str = 'greedy',
+    estrategias: str = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Ejecuta la conciliación automática sin guardar nada y devuelve las propuestas
+    como NDJSON (application/x-ndjson) en bloques: primero una línea con el resumen
+    ({"tipo": "resumen", "stats": ...}) y luego una línea por propuesta
+    ({"tipo": "propuesta", "criterio": ..., "id_banco"/"id_auxiliar" o "ids_banco"/"ids_auxiliar"}).
+    Las propuestas aceptadas se guardan con /aplicar_propuestas.
+    """
+    if modo_asignacion not in MODOS_ASIGNACION:
+        raise HTTPException(status_code=400, detail=f"modo_asignacion debe ser uno de: {', '.join(MODOS_ASIGNACION)}")
+    try:
+        estrategias = construir_estrategias(estrategias)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    conciliacion = RepositoryFactory(db).get_conciliacion_repository().get_by_id(conciliacion_id)
+    if not conciliacion:
+        raise HTTPException(404, "Conciliación no encontrada")
+    if not verify_access_to_conciliacion(conciliacion, current_user):
+        raise HTTPException(status_code=403, detail="No tiene acceso a esta conciliación")
+
+    # Se calcula antes de responder: la sesión de la dependencia no sigue abierta durante el streaming
+    stats, resultados = previsualizar_conciliacion_automatica(
+        conciliacion_id, db, modo_asignacion=modo_asignacion, estrategias=estrategias
+    )
+    return StreamingResponse(lineas_ndjson_previsualizacion(stats, resultados), media_type="application/x-ndjson")
+
+class PropuestaConciliacion(BaseModel):
+    criterio: str
+    id_banco: Optional[int] = None
+    id_auxiliar: Optional[int] = None
+    diferencia_valor: float = 0.0
+    ids_banco: Optional[List[int]] = None
+    ids_auxiliar: Optional[List[int]] = None
+
+class AplicarPropuestasRequest(BaseModel):
+    propuestas: List[PropuestaConciliacion]
+
+@router.post("/{conciliacion_id}/aplicar_propuestas")
+def aplicar_propuestas_conciliacion(
+    conciliacion_id: int,
+    request: AplicarPropuestasRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Guarda en una sola transacción las propuestas aceptadas de /previsualizar.
+    Si alguna ya no es válida (ej. sus movimientos se conciliaron entretanto)
+    responde 409 y no guarda ninguna.
+    """
+    conciliacion = RepositoryFactory(db).get_conciliacion_repository().get_by_id(conciliacion_id)
+    if not conciliacion:
+        raise HTTPException(404, "Conciliación no encontrada")
+    if not verify_access_to_conciliacion(conciliacion, current_user):
+        raise HTTPException(status_code=403, detail="No tiene acceso a esta conciliación")
+    try:
+        resultado = aplicar_propuestas(conciliacion_id, [p.dict() for p in request.propuestas], db)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"message": f"Propuestas aplicadas a la conciliación #{conciliacion_id}.", **resultado}
+
+class ProcesarLoteRequest(BaseModel):
+    ids: Optional[List[int]] = None
+    id_empresa: Optional[int] = None
+    mes: Optional[str] = None
+    anio: Optional[str] = None
+    modo_asignacion: str = 'greedy'
+    incremental: bool = False
+    estrategias: Optional[str] = None
+    max_workers: Optional[int] = None
+
+@router.post("/procesar_lote")
+def procesar_lote(
+    request: ProcesarLoteRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Inicia en segundo plano la conciliación automática de varias conciliaciones
+    en paralelo (ver utils/conciliacion_lote.py).
+
+    Se indican los ids o una empresa (opcionalmente con mes/año); en este caso
+    se toman sus conciliaciones no finalizadas. Devuelve el id de la tarea
+    cuyo progreso avanza con cada conciliación terminada.
+
+    tasks.id_conciliacion no admite NULL, así que la tarea queda asociada a la
+    primera conciliación del lote (de ella sale el control de acceso) y guarda
+    todos los ids en ids_conciliaciones. Si se elimina esa conciliación, la
+    tarea pasa a la siguiente del lote en lugar de borrarse.
+    """
+    if request.modo_asignacion not in MODOS_ASIGNACION:
+        raise HTTPException(status_code=400, detail=f"modo_asignacion debe ser uno de: {', '.join(MODOS_ASIGNACION)}")
+    try:
+        construir_estrategias(request.estrategias)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    conciliacion_repo = RepositoryFactory(db).get_conciliacion_repository()
+    if request.ids:
+        conciliaciones = [conciliacion_repo.get_by_id(cid) for cid in request.ids]
+        no_encontradas = [cid for cid, c in zip(request.ids, conciliaciones) if c is None]
+        if no_encontradas:
+            raise HTTPException(status_code=404, detail=f"Conciliaciones no encontradas: {no_encontradas}")
+    elif request.id_empresa is not None:
+        conciliaciones = conciliacion_repo.get_by_empresa_periodo(request.id_empresa, request.mes, request.anio)
+    else:
+        raise HTTPException(status_code=400, detail="Debe indicar ids o id_empresa")
+
+    sin_acceso = [c.id for c in conciliaciones if not verify_access_to_conciliacion(c, current_user)]
+    if sin_acceso:
+        raise HTTPException(status_code=403, detail=f"No tiene acceso a las conciliaciones: {sin_acceso}")
+
+    conciliacion_ids = sorted(c.id for c in conciliaciones)
+    if not conciliacion_ids:
+        return {"message": "No hay conciliaciones para procesar en lote.", "conciliaciones": [], "task_id": None}
+
+    task = RepositoryFactory(db).get_task_repository().create({
+        "id_conciliacion": conciliacion_ids[0],
+        "ids_conciliaciones": ",".join(str(cid) for cid in conciliacion_ids),
+        "tipo": "conciliacion_lote",
+        "estado": "pending",
+        "descripcion": f"Conciliación automática en lote de {len(conciliacion_ids)} conciliaciones",
+        "progreso": 0.0
+    })
+    background_tasks.add_task(
+        procesar_lote_en_segundo_plano,
+        conciliacion_ids=conciliacion_ids,
+        task_id=task.id,
+        max_workers=request.max_workers,
+        modo_asignacion=request.modo_asignacion,
+        incremental=request.incremental,
+        estrategias=request.estrategias
+    )
+    return {
+        "message": f"Conciliación en lote de {len(conciliacion_ids)} conciliaciones iniciada en segundo plano.",
+        "conciliaciones": conciliacion_ids,
+        "estado": "iniciado",
+        "task_id": task.id
+    }
+
+
+def ids_conciliaciones_tarea(task) -> List[int]:
+    """Conciliaciones de una tarea: todas las del lote o solo la suya."""
+    if task.ids_conciliaciones:
+        return [int(cid) for cid in task.ids_conciliaciones.split(",")]
+    return [task.id_conciliacion]
+
+
+def procesar_lote_en_segundo_plano(conciliacion_ids: List[int], task_id: int, **opciones):
+    """
+    Función de segundo plano que procesa el lote y actualiza el progreso de la tarea.
+    """
+    from app.database import SessionLocal
+    db = SessionLocal()  # Crear nueva sesión independiente
+    task_repo = RepositoryFactory(db).get_task_repository()
+
+    def al_completar(resultado, completadas, total):
+        task_repo.update(task_id, {
+            "progreso": round(100.0 * completadas / total, 1),
+            "descripcion": f"Conciliación #{resultado['conciliacion_id']} ({resultado['estado']}) - {completadas}/{total}"
+        })
+
+    try:
+        task_repo.update(task_id, {"estado": "processing"})
+        resultado = procesar_conciliaciones_en_lote(conciliacion_ids, al_completar=al_completar, **opciones)
+        stats = resultado['stats']
+        task_repo.update(task_id, {
+            "estado": "completed" if stats['conciliaciones_con_error'] == 0 else "failed",
+            "progreso": 100.0,
+            "descripcion": (f"Lote completado: {stats['conciliaciones_ok']} conciliaciones correctas, "
+                            f"{stats['conciliaciones_con_error']} con error, {stats.get('total_matches', 0)} matches")
+        })
+    except Exception as e:
+        print(f"❌ Error en conciliación en lote: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        try:
+            task_repo.update(task_id, {"estado": "failed", "descripcion": f"Error: {str(e)}"})
+        except:
+            pass
+    finally:
+        db.close()
 
 @router.post("/{conciliacion_id}/terminar_conciliacion")
 def terminar_conciliacion(
@@ -615,16 +816,23 @@ def eliminar_conciliacion(
         # Las relaciones se eliminarán automáticamente por cascade
         db.delete(cm)
     
+    # Eliminar el índice de conciliación incremental
+    RepositoryFactory(db).get_indice_repository().delete_by_conciliacion(conciliacion_id)
+    
     # Eliminar movimientos
     movimientos = db.query(Movimiento).filter(Movimiento.id_conciliacion == conciliacion_id).all()
     for movimiento in movimientos:
         db.delete(movimiento)
     
-    # Eliminar tareas relacionadas
+    # Eliminar tareas relacionadas; las de un lote pasan a otra conciliación del lote
     tareas = db.query(Task).filter(Task.id_conciliacion == conciliacion_id).all()
     for tarea in tareas:
+        otras = [cid for cid in ids_conciliaciones_tarea(tarea) if cid != conciliacion_id]
+        if otras:
+            tarea.id_conciliacion = otras[0]
+            tarea.ids_conciliaciones = ",".join(str(cid) for cid in otras)
+            continue
         # Eliminar resultados de DeepSeek relacionados con esta tarea
-        from ..repositories.factory import RepositoryFactory
         factory = RepositoryFactory(db)
         deepseek_repo = factory.get_deepseek_result_repository()
         deepseek_repo.delete_by_task(tarea.id)
@@ -678,7 +886,15 @@ def eliminar_conciliacion_manual(
         if movimiento:
             movimiento.estado_conciliacion = 'no_conciliado'
     
-    # Eliminar conciliación manual (las relaciones se eliminarán automáticamente por cascade)
+    # Los movimientos liberados deben volver a entrar en la conciliación incremental
+    invalidar_indice_conciliacion(conciliacion_manual.id_conciliacion, db)
+    
+    # Quitar las relaciones antes de eliminar: el cascade="all" de las colecciones
+    # eliminaría también los movimientos en lugar de solo las relaciones
+    conciliacion_manual.movimientos_banco.clear()
+    conciliacion_manual.movimientos_auxiliar.clear()
+    
+    # Eliminar conciliación manual
     db.delete(conciliacion_manual)
     
     db.commit()
@@ -1157,10 +1373,12 @@ IMPORTANTE:
             for entrada in movimientos_json["entradas"]:
                 if not isinstance(entrada, dict):
                     continue
-                fecha = entrada.get("fecha", "").strip()
+                fecha_texto = entrada.get("fecha", "").strip()
+                fecha = normalizar_fecha(fecha_texto)  # YYYY-MM-DD; None si no se puede interpretar
                 descripcion = entrada.get("descripcion", "").strip()
                 valor = entrada.get("valor", 0)
                 if not fecha or not descripcion:
+                    print(f"⚠️ Entrada inválida omitida: fecha='{fecha_texto}', desc='{descripcion[:50]}...'")
                     continue
                 try:
                     if isinstance(valor, str):
@@ -1170,15 +1388,15 @@ IMPORTANTE:
                 except:
                     valor = 0.0
 
-                movimiento = Movimiento(
-                    id_conciliacion=conciliacion_id,
-                    fecha=fecha,
-                    descripcion=f"[DeepSeek] {descripcion}",
-                    valor=abs(valor),
-                    tipo="banco",
-                    es="E",  # Entradas son E (crédito)
-                    estado_conciliacion="no_conciliado"
-                )
+                movimiento = {
+                    "id_conciliacion": conciliacion_id,
+                    "fecha": fecha,
+                    "descripcion": f"[DeepSeek] {descripcion}",
+                    "valor": abs(valor),
+                    "tipo": "banco",
+                    "es": "E",  # Entradas son E (crédito)
+                    "estado_conciliacion": "no_conciliado"
+                }
                 nuevos_movimientos.append(movimiento)
                 total_entradas += 1
 
@@ -1187,10 +1405,12 @@ IMPORTANTE:
             for salida in movimientos_json["salidas"]:
                 if not isinstance(salida, dict):
                     continue
-                fecha = salida.get("fecha", "").strip()
+                fecha_texto = salida.get("fecha", "").strip()
+                fecha = normalizar_fecha(fecha_texto)  # YYYY-MM-DD; None si no se puede interpretar
                 descripcion = salida.get("descripcion", "").strip()
                 valor = salida.get("valor", 0)
                 if not fecha or not descripcion:
+                    print(f"⚠️ Salida inválida omitida: fecha='{fecha_texto}', desc='{descripcion[:50]}...'")
                     continue
                 try:
                     if isinstance(valor, str):
@@ -1200,15 +1420,15 @@ IMPORTANTE:
                 except:
                     valor = 0.0
 
-                movimiento = Movimiento(
-                    id_conciliacion=conciliacion_id,
-                    fecha=fecha,
-                    descripcion=f"[DeepSeek] {descripcion}",
-                    valor=abs(valor),
-                    tipo="banco",
-                    es="S",  # Salidas son S (débito)
-                    estado_conciliacion="no_conciliado"
-                )
+                movimiento = {
+                    "id_conciliacion": conciliacion_id,
+                    "fecha": fecha,
+                    "descripcion": f"[DeepSeek] {descripcion}",
+                    "valor": abs(valor),
+                    "tipo": "banco",
+                    "es": "S",  # Salidas son S (débito)
+                    "estado_conciliacion": "no_conciliado"
+                }
                 nuevos_movimientos.append(movimiento)
                 total_salidas += 1
 
@@ -1221,9 +1441,9 @@ IMPORTANTE:
 
         # Guardar movimientos
         print(f"💾 Guardando {len(nuevos_movimientos)} movimientos...")
-        db.bulk_save_objects(nuevos_movimientos)
-        conciliacion.estado = 'completado_extracto'
-        db.commit()
+        with factory.unit_of_work():
+            factory.get_movimiento_repository().create_bulk(nuevos_movimientos, return_ids=False)
+            conciliacion.estado = 'completado_extracto'
 
         print(f"✅ Procesamiento completado: {total_entradas} entradas, {total_salidas} salidas")
         task_repo.update(task_id, {"estado": "completed", "progreso": 100.0, "descripcion": f"Procesamiento completado: {total_entradas} entradas, {total_salidas} salidas"})
@@ -1908,12 +2128,13 @@ async def cargar_movimientos_deepseek(
                     continue
 
                 # Validar campos requeridos
-                fecha = entrada.get("fecha", "").strip()
+                fecha_texto = entrada.get("fecha", "").strip()
+                fecha = normalizar_fecha(fecha_texto)  # YYYY-MM-DD; None si no se puede interpretar
                 descripcion = entrada.get("descripcion", "").strip()
                 valor = entrada.get("valor", 0)
 
                 if not fecha or not descripcion:
-                    print(f"⚠️ Entrada inválida omitida: fecha='{fecha}', desc='{descripcion[:50]}...'")
+                    print(f"⚠️ Entrada inválida omitida: fecha='{fecha_texto}', desc='{descripcion[:50]}...'")
                     continue
 
                 # Convertir valor a float si es string
@@ -1927,15 +2148,15 @@ async def cargar_movimientos_deepseek(
                     print(f"⚠️ Valor inválido en entrada: {valor}, usando 0.0")
                     valor = 0.0
 
-                movimiento = Movimiento(
-                    id_conciliacion=conciliacion_id,
-                    fecha=fecha,
-                    descripcion=f"[DeepSeek] {descripcion}",
-                    valor=abs(valor),  # Siempre positivo
-                    tipo="banco",
-                    es="E",  # Entradas son E (crédito)
-                    estado_conciliacion="no_conciliado"
-                )
+                movimiento = {
+                    "id_conciliacion": conciliacion_id,
+                    "fecha": fecha,
+                    "descripcion": f"[DeepSeek] {descripcion}",
+                    "valor": abs(valor),  # Siempre positivo
+                    "tipo": "banco",
+                    "es": "E",  # Entradas son E (crédito)
+                    "estado_conciliacion": "no_conciliado"
+                }
                 nuevos_movimientos.append(movimiento)
                 total_entradas += 1
                 print(f"✅ Entrada procesada: {fecha} - {descripcion[:50]}... - ${valor}")
@@ -1947,12 +2168,13 @@ async def cargar_movimientos_deepseek(
                     continue
 
                 # Validar campos requeridos
-                fecha = salida.get("fecha", "").strip()
+                fecha_texto = salida.get("fecha", "").strip()
+                fecha = normalizar_fecha(fecha_texto)  # YYYY-MM-DD; None si no se puede interpretar
                 descripcion = salida.get("descripcion", "").strip()
                 valor = salida.get("valor", 0)
 
                 if not fecha or not descripcion:
-                    print(f"⚠️ Salida inválida omitida: fecha='{fecha}', desc='{descripcion[:50]}...'")
+                    print(f"⚠️ Salida inválida omitida: fecha='{fecha_texto}', desc='{descripcion[:50]}...'")
                     continue
 
                 # Convertir valor a float si es string
@@ -1966,15 +2188,15 @@ async def cargar_movimientos_deepseek(
                     print(f"⚠️ Valor inválido en salida: {valor}, usando 0.0")
                     valor = 0.0
 
-                movimiento = Movimiento(
-                    id_conciliacion=conciliacion_id,
-                    fecha=fecha,
-                    descripcion=f"[DeepSeek] {descripcion}",
-                    valor=abs(valor),  # Siempre positivo
-                    tipo="banco",
-                    es="S",  # Salidas son S (débito)
-                    estado_conciliacion="no_conciliado"
-                )
+                movimiento = {
+                    "id_conciliacion": conciliacion_id,
+                    "fecha": fecha,
+                    "descripcion": f"[DeepSeek] {descripcion}",
+                    "valor": abs(valor),  # Siempre positivo
+                    "tipo": "banco",
+                    "es": "S",  # Salidas son S (débito)
+                    "estado_conciliacion": "no_conciliado"
+                }
                 nuevos_movimientos.append(movimiento)
                 total_salidas += 1
                 print(f"✅ Salida procesada: {fecha} - {descripcion[:50]}... - ${valor}")
@@ -1984,8 +2206,7 @@ async def cargar_movimientos_deepseek(
 
         # Guardar movimientos en la base de datos
         print(f"💾 Guardando {len(nuevos_movimientos)} movimientos en la base de datos...")
-        db.bulk_save_objects(nuevos_movimientos)
-        db.commit()
+        RepositoryFactory(db).get_movimiento_repository().create_bulk(nuevos_movimientos, return_ids=False)
 
         print(f"✅ Carga completada exitosamente: {total_entradas} entradas, {total_salidas} salidas")
 
@@ -2069,6 +2290,7 @@ def get_failed_tasks(
             failed_tasks.append({
                 "id": task.id,
                 "id_conciliacion": task.id_conciliacion,
+                "ids_conciliaciones": ids_conciliaciones_tarea(task),
                 "tipo": task.tipo,
                 "estado": task.estado,
                 "descripcion": task.descripcion,
@@ -2100,6 +2322,7 @@ def get_pending_tasks(
             {
                 "id": t.id,
                 "id_conciliacion": t.id_conciliacion,
+                "ids_conciliaciones": ids_conciliaciones_tarea(t),
                 "tipo": t.tipo,
                 "estado": t.estado,
                 "descripcion": t.descripcion,
@@ -2136,6 +2359,7 @@ def get_task(
         "task": {
             "id": task.id,
             "id_conciliacion": task.id_conciliacion,
+            "ids_conciliaciones": ids_conciliaciones_tarea(task),
             "tipo": task.tipo,
             "estado": task.estado,
             "descripcion": task.descripcion,
@@ -2249,6 +2473,7 @@ def get_task_details(
         "task": {
             "id": task.id,
             "id_conciliacion": task.id_conciliacion,
+            "ids_conciliaciones": ids_conciliaciones_tarea(task),
             "tipo": task.tipo,
             "estado": task.estado,
             "descripcion": task.descripcion,
@@ -5,6 +5,7 @@ from app.database import get_db
 from app.models import Conciliacion, Movimiento, User
 from app.utils.pdf_generator import generar_pdf_informe
 from app.utils.auth import get_current_active_user
+from app.repositories.factory import RepositoryFactory
 import os
 
 router = APIRouter()
@@ -19,10 +20,16 @@ def generar_informe(
     if not conciliacion:
         raise HTTPException(status_code=404, detail="Conciliación no encontrada")
 
-    movimientos = db.query(Movimiento).filter(Movimiento.id_conciliacion == conciliacion_id).all()
-
-    conciliados = [m for m in movimientos if m.estado_conciliacion == "conciliado"]
-    pendientes = [m for m in movimientos if m.estado_conciliacion == "no_conciliado"]
+    # Filas de solo las columnas del informe, leídas por lotes (sin objetos ORM)
+    conciliados, pendientes = [], []
+    movimientos = RepositoryFactory(db).get_movimiento_repository().iter_by_conciliacion(
+        conciliacion_id, columnas=['fecha', 'descripcion', 'valor', 'tipo', 'es', 'estado_conciliacion']
+    )
+    for m in movimientos:
+        if m.estado_conciliacion == "conciliado":
+            conciliados.append(m)
+        elif m.estado_conciliacion == "no_conciliado":
+            pendientes.append(m)
 
     file_path = generar_pdf_informe(conciliacion, conciliados, pendientes)
 
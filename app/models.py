@@ -1,7 +1,59 @@
-from sqlalchemy import Column, Integer, String, Date, Float, ForeignKey, Text, Boolean
+import pandas as pd
+from sqlalchemy import Column, Integer, BigInteger, String, Date, Float, ForeignKey, Text, Boolean, Index, Numeric, event, inspect
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
 from .database import Base
-from datetime import date, datetime
+from .utils.descripciones import caracteristicas_descripcion
+from .utils.fechas import parse_fecha
+from datetime import datetime
+
+
+class FechaISO(TypeDecorator):
+    """
+    Columna DATE que se lee y escribe como texto YYYY-MM-DD.
+
+    Al guardar acepta texto en cualquier formato de utils/fechas.py, date o
+    datetime; None o texto vacío quedan NULL y un texto que no se puede
+    interpretar lanza ValueError en lugar de perderse. Al leer devuelve el
+    texto ISO, el mismo formato que guardaba la columna cuando era String, para
+    que el JSON de las rutas y los informes no cambien. El motor de conciliación
+    lee la columna como date (ver columnas_tuplas_con_tipo) y no re-interpreta
+    el texto.
+    """
+    impl = Date
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        fecha = parse_fecha(value)
+        if pd.isna(fecha):
+            vacia = not value.strip() if isinstance(value, str) else pd.isna(value)
+            if vacia:
+                return None
+            raise ValueError(f"Fecha no reconocida: {value!r}")
+        return fecha.date()
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, str):
+            return value
+        return value.isoformat()
+
+
+class Importe(TypeDecorator):
+    """
+    Columna NUMERIC(18, 2) que se expone como float redondeado a centavos.
+
+    La base guarda el valor exacto (las sumas en SQL no acumulan error de
+    punto flotante) y el resto del código sigue trabajando con float.
+    """
+    impl = Numeric(18, 2, asdecimal=False)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else round(float(value), 2)
+
+    def process_result_value(self, value, dialect):
+        # SQLite devuelve los valores enteros como int
+        return None if value is None else float(value)
 
 
 class User(Base):
@@ -63,16 +115,26 @@ class Movimiento(Base):
     __tablename__ = 'movimientos'
     id = Column(Integer, primary_key=True)
     id_conciliacion = Column(Integer, ForeignKey('conciliaciones.id'))
-    fecha = Column(String)  # Puedes usar Date para fechas
+    fecha = Column(FechaISO)  # DATE en la base (scripts/migrate_movimientos_fecha_valor.py)
     descripcion = Column(String)
-    valor = Column(Float)
+    valor = Column(Importe)
     tipo = Column(String)  # 'banco' o 'auxiliar'
     es = Column(String)
     estado_conciliacion = Column(String, default='no_conciliado')
+    # Características de la descripción calculadas al insertar (ver utils/descripciones.py);
+    # NULL en movimientos anteriores a la columna
+    descripcion_normalizada = Column(String)
+    referencias_descripcion = Column(String)
 
     # Relación con la tabla Conciliacion
     conciliacion = relationship("Conciliacion", back_populates="movimientos")
 
+    __table_args__ = (
+        # Carga de pendientes, detalle y conteos filtran por conciliación, estado, tipo y E/S
+        # (en bases existentes: scripts/migrate_add_indices_conciliacion.py)
+        Index('ix_movimientos_conciliacion_estado_tipo_es', 'id_conciliacion', 'estado_conciliacion', 'tipo', 'es'),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -85,6 +147,18 @@ class Movimiento(Base):
             "estado_conciliacion": self.estado_conciliacion,
         }
 
+@event.listens_for(Movimiento, 'before_insert')
+def calcular_caracteristicas_al_insertar(mapper, connection, movimiento):
+    """Calcula la descripción normalizada y las referencias si no vienen precalculadas."""
+    if movimiento.descripcion_normalizada is None:
+        movimiento.descripcion_normalizada, movimiento.referencias_descripcion = caracteristicas_descripcion(movimiento.descripcion)
+
+@event.listens_for(Movimiento, 'before_update')
+def recalcular_caracteristicas_al_actualizar(mapper, connection, movimiento):
+    """Recalcula las características cuando cambia la descripción."""
+    if inspect(movimiento).attrs.descripcion.history.has_changes():
+        movimiento.descripcion_normalizada, movimiento.referencias_descripcion = caracteristicas_descripcion(movimiento.descripcion)
+
 class ConciliacionMatch(Base):
     __tablename__ = 'conciliacion_matches'
     id = Column(Integer, primary_key=True)
@@ -100,6 +174,10 @@ class ConciliacionMatch(Base):
     movimiento_banco = relationship("Movimiento", foreign_keys=[id_movimiento_banco])
     movimiento_auxiliar = relationship("Movimiento", foreign_keys=[id_movimiento_auxiliar])
 
+    __table_args__ = (
+        Index('ix_conciliacion_matches_conciliacion', 'id_conciliacion'),
+    )
+
     
 #======================================INTERMEDIOS PARA CONCILIACION MANUALES ==========================
 class ConciliacionManual(Base):
@@ -124,6 +202,37 @@ class ConciliacionManualAuxiliar(Base):
     id_conciliacion_manual = Column(Integer, ForeignKey('conciliaciones_manuales.id'), nullable=False)
     id_movimiento_auxiliar = Column(Integer, ForeignKey('movimientos.id'), nullable=False)
 
+class IndiceConciliacion(Base):
+    """
+    Índice persistente de los movimientos pendientes de una conciliación por
+    bucket de valor y día. La conciliación incremental lo consulta solo con los
+    movimientos agregados desde la última ejecución.
+    """
+    __tablename__ = 'indice_conciliacion'
+    id = Column(Integer, primary_key=True)
+    id_conciliacion = Column(Integer, ForeignKey('conciliaciones.id'), nullable=False)
+    id_movimiento = Column(Integer, ForeignKey('movimientos.id'), nullable=False)
+    tipo = Column(String, nullable=False)  # 'banco' o 'auxiliar'
+    es = Column(String, nullable=False)
+    bucket_valor = Column(BigInteger, nullable=False)  # valor en centavos // ancho_bucket
+    dia = Column(Integer, nullable=False)  # días desde 1970-01-01
+
+    __table_args__ = (
+        Index('ix_indice_conciliacion_bucket', 'id_conciliacion', 'tipo', 'es', 'bucket_valor'),
+        Index('ix_indice_conciliacion_dia', 'id_conciliacion', 'tipo', 'es', 'dia'),
+    )
+
+class EstadoIndiceConciliacion(Base):
+    """
+    Marca de agua del índice: último movimiento considerado y ancho de bucket
+    con el que se construyó (si cambia la configuración, el índice se reconstruye).
+    """
+    __tablename__ = 'estado_indice_conciliacion'
+    id_conciliacion = Column(Integer, ForeignKey('conciliaciones.id'), primary_key=True)
+    ultimo_movimiento_id = Column(Integer, nullable=False)
+    ancho_bucket = Column(BigInteger, nullable=False)
+    fecha_actualizacion = Column(String)
+
 
 class DeepSeekProcessingResult(Base):
     """
@@ -156,6 +265,9 @@ class Task(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     id_conciliacion = Column(Integer, ForeignKey('conciliaciones.id'), nullable=False)
+    # Tareas 'conciliacion_lote': ids de todas las conciliaciones del lote separados por coma
+    # (id_conciliacion es una de ellas)
+    ids_conciliaciones = Column(Text)
     tipo = Column(String, nullable=False)  # 'deepseek_processing', etc.
     estado = Column(String, default='pending')  # 'pending', 'processing', 'completed', 'failed'
     descripcion = Column(Text)
@@ -2,12 +2,14 @@
 Factory para crear instancias de repositorios.
 Facilita el cambio entre diferentes implementaciones (SQLAlchemy, MySQL directo, etc.)
 """
+from contextlib import contextmanager
 from sqlalchemy.orm import Session
 from typing import Literal
 
 from .interfaces import (
     IUserRepository, IEmpresaRepository, IConciliacionRepository,
-    IMovimientoRepository, IConciliacionMatchRepository, IConciliacionManualRepository, ITaskRepository, IDeepSeekProcessingResultRepository
+    IMovimientoRepository, IConciliacionMatchRepository, IConciliacionManualRepository, ITaskRepository, IDeepSeekProcessingResultRepository,
+    IIndiceConciliacionRepository
 )
 from .sqlalchemy_impl import (
     SQLAlchemyUserRepository,
@@ -17,7 +19,10 @@ from .sqlalchemy_impl import (
     SQLAlchemyConciliacionMatchRepository,
     SQLAlchemyConciliacionManualRepository,
     SQLAlchemyTaskRepository,
-    SQLAlchemyDeepSeekProcessingResultRepository
+    SQLAlchemyDeepSeekProcessingResultRepository,
+    SQLAlchemyIndiceConciliacionRepository,
+    CLAVE_UNIDAD_DE_TRABAJO,
+    confirmar
 )
 
 
@@ -30,6 +35,11 @@ class RepositoryFactory:
         user_repo = factory.get_user_repository()
         empresa_repo = factory.get_empresa_repository()
     
+    Para agrupar varias operaciones en una sola transacción:
+        with factory.unit_of_work():
+            manual = factory.get_manual_repository().create({...})
+            ...
+    
     Para cambiar a otra implementación (ej: MySQL directo), 
     solo hay que modificar esta clase.
     """
@@ -38,6 +48,34 @@ class RepositoryFactory:
         self.db = db
         self.implementation = implementation
     
+    @contextmanager
+    def unit_of_work(self):
+        """
+        Agrupa las operaciones de los repositorios de esta sesión en una sola transacción.
+        
+        Dentro del bloque create/update/delete solo hacen flush (sin commit ni
+        refresh por fila); al salir se hace un único commit, o rollback si se
+        lanzó una excepción. El estado vive en la sesión, así que también aplica
+        a los repositorios creados por otras factories sobre la misma sesión. Los
+        bloques anidados se integran en el más externo.
+        """
+        profundidad = self.db.info.get(CLAVE_UNIDAD_DE_TRABAJO, 0)
+        self.db.info[CLAVE_UNIDAD_DE_TRABAJO] = profundidad + 1
+        try:
+            yield self
+        except Exception:
+            if profundidad == 0:
+                self.db.rollback()
+            raise
+        finally:
+            self.db.info[CLAVE_UNIDAD_DE_TRABAJO] = profundidad
+        if profundidad == 0:
+            self.db.commit()
+    
+    def commit(self):
+        """Confirma la transacción; dentro de una unidad de trabajo solo hace flush."""
+        confirmar(self.db)
+    
     def get_user_repository(self) -> IUserRepository:
         """Obtiene repositorio de usuarios"""
         if self.implementation == 'sqlalchemy':
@@ -88,6 +126,12 @@ class RepositoryFactory:
         if self.implementation == 'sqlalchemy':
             return SQLAlchemyDeepSeekProcessingResultRepository(self.db)
         raise ValueError(f"Implementación desconocida: {self.implementation}")
+    
+    def get_indice_repository(self) -> IIndiceConciliacionRepository:
+        """Obtiene repositorio del índice de conciliación incremental"""
+        if self.implementation == 'sqlalchemy':
+            return SQLAlchemyIndiceConciliacionRepository(self.db)
+        raise ValueError(f"Implementación desconocida: {self.implementation}")
 
 
 # Helper function para obtener todos los repositorios de una vez
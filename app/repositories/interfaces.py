@@ -3,7 +3,7 @@ Interfaces abstractas para los repositorios.
 Define el contrato que debe cumplir cualquier implementación de repositorio.
 """
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator, Tuple
 from datetime import datetime
 
 
@@ -108,6 +108,12 @@ class IConciliacionRepository(ABC):
         """Obtiene todas las conciliaciones creadas por un usuario"""
         pass
     
+    @abstractmethod
+    def get_by_empresa_periodo(self, empresa_id: int, mes: Optional[str] = None, anio: Optional[str] = None,
+                               incluir_finalizadas: bool = False) -> List:
+        """Obtiene las conciliaciones de una empresa, opcionalmente de un mes/año"""
+        pass
+    
     @abstractmethod
     def create(self, conciliacion_data: Dict[str, Any]):
         """Crea una nueva conciliación"""
@@ -137,19 +143,45 @@ class IMovimientoRepository(ABC):
         """Obtiene movimientos de una conciliación con filtros opcionales"""
         pass
     
+    @abstractmethod
+    def iter_by_conciliacion(self, conciliacion_id: int, filters: Optional[Dict[str, Any]] = None,
+                             columnas: Optional[List] = None, tamano_lote: int = 5000) -> Iterator:
+        """Recorre los movimientos de una conciliación por lotes (cursor del servidor), proyectando solo las columnas indicadas"""
+        pass
+    
+    @abstractmethod
+    def get_tuplas_by_conciliacion(self, conciliacion_id: int, filters: Optional[Dict[str, Any]] = None) -> List:
+        """Obtiene tuplas (id, fecha, descripcion, valor) de una conciliación con filtros opcionales"""
+        pass
+    
+    @abstractmethod
+    def get_tuplas_con_tipo_by_conciliacion(self, conciliacion_id: int, filters: Optional[Dict[str, Any]] = None) -> List:
+        """Obtiene tuplas (id, fecha, descripcion, valor, tipo, es, descripcion_normalizada, referencias_descripcion) de una conciliación en una sola consulta"""
+        pass
+    
+    @abstractmethod
+    def get_tuplas_con_tipo_by_ids(self, conciliacion_id: int, movimiento_ids: List[int], filters: Optional[Dict[str, Any]] = None) -> List:
+        """Obtiene las tuplas de get_tuplas_con_tipo_by_conciliacion de los movimientos indicados"""
+        pass
+    
     @abstractmethod
     def count_by_conciliacion(self, conciliacion_id: int, filters: Optional[Dict[str, Any]] = None) -> int:
         """Cuenta movimientos de una conciliación con filtros opcionales"""
         pass
     
+    @abstractmethod
+    def count_by_conciliaciones(self, conciliacion_ids: List[int]) -> Dict[int, Tuple[int, int]]:
+        """Cuenta movimientos totales y conciliados de varias conciliaciones en una consulta: {id: (total, conciliados)}"""
+        pass
+    
     @abstractmethod
     def create(self, movimiento_data: Dict[str, Any]):
         """Crea un nuevo movimiento"""
         pass
     
     @abstractmethod
-    def create_bulk(self, movimientos_data: List[Dict[str, Any]]) -> List:
-        """Crea múltiples movimientos en lote"""
+    def create_bulk(self, movimientos_data: List[Dict[str, Any]], return_ids: bool = True) -> Optional[List[int]]:
+        """Crea múltiples movimientos en lote; devuelve sus ids (None con return_ids=False)"""
         pass
     
     @abstractmethod
@@ -158,8 +190,13 @@ class IMovimientoRepository(ABC):
         pass
     
     @abstractmethod
-    def update_bulk(self, movimientos_updates: List[Dict[str, Any]]):
-        """Actualiza múltiples movimientos en lote"""
+    def set_estado_bulk(self, movimiento_ids: List[int], estado: str, estado_actual: Optional[str] = None) -> int:
+        """Cambia el estado de conciliación de varios movimientos (sin commit); devuelve los actualizados"""
+        pass
+    
+    @abstractmethod
+    def update_bulk(self, movimientos_updates: List[Dict[str, Any]]) -> int:
+        """Actualiza múltiples movimientos en lote y devuelve la cantidad de filas actualizadas"""
         pass
     
     @abstractmethod
@@ -187,8 +224,13 @@ class IConciliacionMatchRepository(ABC):
         pass
     
     @abstractmethod
-    def create_bulk(self, matches_data: List[Dict[str, Any]]) -> List:
-        """Crea múltiples matches en lote"""
+    def create_bulk(self, matches_data: List[Dict[str, Any]], return_ids: bool = True) -> Optional[List[int]]:
+        """Crea múltiples matches en lote; devuelve sus ids (None con return_ids=False)"""
+        pass
+    
+    @abstractmethod
+    def insert_bulk(self, matches_data: List[Dict[str, Any]]) -> int:
+        """Inserta múltiples matches en un solo INSERT (sin commit)"""
         pass
     
     @abstractmethod
@@ -244,6 +286,11 @@ class IConciliacionManualRepository(ABC):
     def create_auxiliar_item(self, item_data: Dict[str, Any]):
         """Crea un item auxiliar para conciliación manual"""
         pass
+    
+    @abstractmethod
+    def insert_grupos_bulk(self, conciliacion_id: int, grupos: List) -> List[int]:
+        """Crea en bloque conciliaciones manuales a partir de (ids_banco, ids_auxiliar), sin commit"""
+        pass
 
 
 class ITaskRepository(ABC):
@@ -322,3 +369,42 @@ class IDeepSeekProcessingResultRepository(ABC):
     def delete_by_task(self, task_id: int):
         """Elimina todos los resultados de una tarea"""
         pass
+
+
+class IIndiceConciliacionRepository(ABC):
+    """Repositorio del índice persistente de movimientos pendientes (conciliación incremental)"""
+    
+    @abstractmethod
+    def get_estado(self, conciliacion_id: int):
+        """Obtiene la marca de agua del índice de una conciliación (o None si no existe)"""
+        pass
+    
+    @abstractmethod
+    def guardar_estado(self, conciliacion_id: int, ultimo_movimiento_id: int, ancho_bucket: int):
+        """Crea o actualiza la marca de agua del índice, sin commit"""
+        pass
+    
+    @abstractmethod
+    def insert_bulk(self, entradas: List[Dict[str, Any]]) -> int:
+        """Inserta entradas del índice en bloque, sin commit"""
+        pass
+    
+    @abstractmethod
+    def delete_movimientos(self, conciliacion_id: int, movimiento_ids: List[int]) -> int:
+        """Elimina del índice los movimientos indicados, sin commit"""
+        pass
+    
+    @abstractmethod
+    def delete_by_conciliacion(self, conciliacion_id: int):
+        """Elimina el índice completo y su marca de agua, sin commit"""
+        pass
+    
+    @abstractmethod
+    def get_ids_por_buckets(self, conciliacion_id: int, tipo: str, es: str, buckets: List[int]) -> List[int]:
+        """Obtiene los ids de movimiento de un tipo/es indexados en los buckets de valor indicados"""
+        pass
+    
+    @abstractmethod
+    def get_ids_por_rangos_dia(self, conciliacion_id: int, tipo: str, es: str, rangos: List) -> List[int]:
+        """Obtiene los ids de movimiento de un tipo/es indexados dentro de los rangos de días (desde, hasta)"""
+        pass
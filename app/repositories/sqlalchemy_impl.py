@@ -2,21 +2,103 @@
 Implementación de repositorios usando SQLAlchemy.
 Esta es la capa que interactúa directamente con la base de datos.
 """
-from typing import List, Optional, Dict, Any
+from collections import defaultdict
+from typing import List, Optional, Dict, Any, Iterator, Tuple
+import pandas as pd
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, asc, and_
+from sqlalchemy import Date, desc, asc, and_, or_, bindparam, case, delete, func, insert, select, type_coerce, update
 from datetime import datetime
 
 from ..models import (
     User, Empresa, Conciliacion, Movimiento, 
     ConciliacionMatch, ConciliacionManual,
-    ConciliacionManualBanco, ConciliacionManualAuxiliar, Task, DeepSeekProcessingResult
+    ConciliacionManualBanco, ConciliacionManualAuxiliar, Task, DeepSeekProcessingResult,
+    IndiceConciliacion, EstadoIndiceConciliacion
 )
+from ..utils.descripciones import caracteristicas_descripcion, caracteristicas_descripcion_columna
 from .interfaces import (
     IUserRepository, IEmpresaRepository, IConciliacionRepository,
-    IMovimientoRepository, IConciliacionMatchRepository, IConciliacionManualRepository, ITaskRepository, IDeepSeekProcessingResultRepository
+    IMovimientoRepository, IConciliacionMatchRepository, IConciliacionManualRepository, ITaskRepository, IDeepSeekProcessingResultRepository,
+    IIndiceConciliacionRepository
 )
 
+# Cantidad máxima de ids por cláusula IN (SQLite antiguo limita a 999 parámetros)
+TAMANO_LOTE_IN = 500
+
+# Filas por lote al recorrer movimientos con cursor del servidor (iter_by_conciliacion)
+TAMANO_LOTE_STREAMING = 5000
+
+# Filas por sentencia executemany en las escrituras en bloque
+TAMANO_LOTE_ESCRITURA = 5000
+
+# Clave en Session.info con la profundidad de la unidad de trabajo activa (ver RepositoryFactory.unit_of_work)
+CLAVE_UNIDAD_DE_TRABAJO = 'unidad_de_trabajo'
+
+
+def en_unidad_de_trabajo(db: Session) -> bool:
+    """Indica si la sesión está dentro de una unidad de trabajo."""
+    return db.info.get(CLAVE_UNIDAD_DE_TRABAJO, 0) > 0
+
+
+def confirmar(db: Session, *instancias) -> None:
+    """
+    Confirma los cambios de una operación de repositorio.
+
+    Fuera de una unidad de trabajo hace commit y refresca las instancias, como
+    siempre. Dentro de una, solo hace flush (los ids quedan asignados y las
+    consultas siguientes ven los cambios) y deja el commit para el final del bloque.
+    """
+    if en_unidad_de_trabajo(db):
+        db.flush()
+        return
+    db.commit()
+    for instancia in instancias:
+        db.refresh(instancia)
+
+
+def insertar_filas(db: Session, modelo, filas: List[Dict[str, Any]], return_ids: bool = True) -> Optional[List[int]]:
+    """
+    INSERT en bloque por lotes de TAMANO_LOTE_ESCRITURA, sin objetos ORM ni refresh por fila.
+    No hace commit.
+
+    Con return_ids devuelve los ids en el orden de las filas: salen del mismo
+    INSERT ... RETURNING cuando el dialecto lo soporta con executemany
+    (PostgreSQL, SQLite >= 3.35); si no, las filas se insertan de a una.
+    Con return_ids=False no devuelve nada.
+    """
+    if not return_ids:
+        for i in range(0, len(filas), TAMANO_LOTE_ESCRITURA):
+            db.execute(insert(modelo), filas[i:i + TAMANO_LOTE_ESCRITURA])
+        return None
+
+    ids = []
+    if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        stmt = insert(modelo).returning(modelo.id, sort_by_parameter_order=True)
+        for i in range(0, len(filas), TAMANO_LOTE_ESCRITURA):
+            ids.extend(db.execute(stmt, filas[i:i + TAMANO_LOTE_ESCRITURA]).scalars().all())
+    else:
+        tabla = modelo.__table__
+        for fila in filas:
+            ids.append(db.execute(insert(tabla).values(**fila)).inserted_primary_key[0])
+    return ids
+
+
+def con_caracteristicas_descripcion(movimientos_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Copia de los movimientos con descripcion_normalizada y referencias_descripcion
+    calculadas en bloque: los INSERT en bloque no disparan los eventos ORM de Movimiento.
+    """
+    pendientes = [i for i, data in enumerate(movimientos_data) if data.get('descripcion_normalizada') is None]
+    if not pendientes:
+        return movimientos_data
+    normalizadas, referencias = caracteristicas_descripcion_columna(
+        pd.Series([movimientos_data[i].get('descripcion') for i in pendientes], dtype=object)
+    )
+    filas = list(movimientos_data)
+    for i, normalizada, referencia in zip(pendientes, normalizadas, referencias):
+        filas[i] = {**filas[i], 'descripcion_normalizada': normalizada, 'referencias_descripcion': referencia}
+    return filas
+
 
 class SQLAlchemyUserRepository(IUserRepository):
     """Implementación de UserRepository con SQLAlchemy"""
@@ -39,8 +121,7 @@ class SQLAlchemyUserRepository(IUserRepository):
     def create(self, user_data: Dict[str, Any]):
         user = User(**user_data)
         self.db.add(user)
-        self.db.commit()
-        self.db.refresh(user)
+        confirmar(self.db, user)
         return user
     
     def update(self, user_id: int, user_data: Dict[str, Any]):
@@ -48,15 +129,14 @@ class SQLAlchemyUserRepository(IUserRepository):
         if user:
             for key, value in user_data.items():
                 setattr(user, key, value)
-            self.db.commit()
-            self.db.refresh(user)
+            confirmar(self.db, user)
         return user
     
     def delete(self, user_id: int):
         user = self.get_by_id(user_id)
         if user:
             self.db.delete(user)
-            self.db.commit()
+            confirmar(self.db)
         return user
 
 
@@ -89,8 +169,7 @@ class SQLAlchemyEmpresaRepository(IEmpresaRepository):
     def create(self, empresa_data: Dict[str, Any]):
         empresa = Empresa(**empresa_data)
         self.db.add(empresa)
-        self.db.commit()
-        self.db.refresh(empresa)
+        confirmar(self.db, empresa)
         return empresa
     
     def update(self, empresa_id: int, empresa_data: Dict[str, Any]):
@@ -98,15 +177,14 @@ class SQLAlchemyEmpresaRepository(IEmpresaRepository):
         if empresa:
             for key, value in empresa_data.items():
                 setattr(empresa, key, value)
-            self.db.commit()
-            self.db.refresh(empresa)
+            confirmar(self.db, empresa)
         return empresa
     
     def delete(self, empresa_id: int):
         empresa = self.get_by_id(empresa_id)
         if empresa:
             self.db.delete(empresa)
-            self.db.commit()
+            confirmar(self.db)
         return empresa
 
 
@@ -138,11 +216,22 @@ class SQLAlchemyConciliacionRepository(IConciliacionRepository):
             Conciliacion.id_usuario_creador == usuario_id
         ).order_by(desc(Conciliacion.id)).all()
     
+    def get_by_empresa_periodo(self, empresa_id: int, mes: Optional[str] = None, anio: Optional[str] = None,
+                               incluir_finalizadas: bool = False) -> List:
+        """Conciliaciones de una empresa filtradas por mes/año, en orden de id"""
+        query = self.db.query(Conciliacion).filter(Conciliacion.id_empresa == empresa_id)
+        if mes is not None:
+            query = query.filter(Conciliacion.mes_conciliado == mes)
+        if anio is not None:
+            query = query.filter(Conciliacion.año_conciliado == str(anio))
+        if not incluir_finalizadas:
+            query = query.filter(or_(Conciliacion.estado.is_(None), Conciliacion.estado != 'finalizada'))
+        return query.order_by(asc(Conciliacion.id)).all()
+    
     def create(self, conciliacion_data: Dict[str, Any]):
         conciliacion = Conciliacion(**conciliacion_data)
         self.db.add(conciliacion)
-        self.db.commit()
-        self.db.refresh(conciliacion)
+        confirmar(self.db, conciliacion)
         return conciliacion
     
     def update(self, conciliacion_id: int, conciliacion_data: Dict[str, Any]):
@@ -150,15 +239,14 @@ class SQLAlchemyConciliacionRepository(IConciliacionRepository):
         if conciliacion:
             for key, value in conciliacion_data.items():
                 setattr(conciliacion, key, value)
-            self.db.commit()
-            self.db.refresh(conciliacion)
+            confirmar(self.db, conciliacion)
         return conciliacion
     
     def delete(self, conciliacion_id: int):
         conciliacion = self.get_by_id(conciliacion_id)
         if conciliacion:
             self.db.delete(conciliacion)
-            self.db.commit()
+            confirmar(self.db)
         return conciliacion
 
 
@@ -184,6 +272,112 @@ class SQLAlchemyMovimientoRepository(IMovimientoRepository):
         
         return query.all()
     
+    def iter_by_conciliacion(self, conciliacion_id: int, filters: Optional[Dict[str, Any]] = None,
+                             columnas: Optional[List] = None, tamano_lote: int = TAMANO_LOTE_STREAMING) -> Iterator:
+        """
+        Recorre los movimientos de una conciliación ordenados por id, sin objetos ORM
+        y sin materializar la lista completa: usa un cursor del servidor
+        (stream_results) y trae las filas en lotes de tamano_lote (yield_per).
+
+        columnas: nombres de columna de Movimiento o expresiones a proyectar; por
+        defecto todas las columnas. Las filas permiten acceso por atributo
+        (fila.tipo) y fila._asdict().
+
+        El cursor mantiene ocupada la conexión hasta agotar o cerrar el iterador.
+        """
+        columnas = columnas or list(Movimiento.__table__.columns)
+        columnas = [getattr(Movimiento, columna) if isinstance(columna, str) else columna for columna in columnas]
+        stmt = select(*columnas).where(Movimiento.id_conciliacion == conciliacion_id)
+        
+        if filters:
+            if 'tipo' in filters:
+                stmt = stmt.where(Movimiento.tipo == filters['tipo'])
+            if 'es' in filters:
+                stmt = stmt.where(Movimiento.es == filters['es'])
+            if 'estado_conciliacion' in filters:
+                stmt = stmt.where(Movimiento.estado_conciliacion == filters['estado_conciliacion'])
+            if 'id_mayor_a' in filters:
+                stmt = stmt.where(Movimiento.id > filters['id_mayor_a'])
+        
+        result = self.db.execute(
+            stmt.order_by(Movimiento.id).execution_options(stream_results=True, yield_per=tamano_lote)
+        )
+        try:
+            for lote in result.partitions():
+                yield from lote
+        finally:
+            result.close()
+    
+    def get_tuplas_by_conciliacion(self, conciliacion_id: int, filters: Optional[Dict[str, Any]] = None) -> List:
+        """
+        Devuelve tuplas (id, fecha, descripcion, valor) sin instanciar objetos ORM.
+        """
+        query = self.db.query(
+            Movimiento.id, Movimiento.fecha, Movimiento.descripcion, Movimiento.valor
+        ).filter(Movimiento.id_conciliacion == conciliacion_id)
+        
+        if filters:
+            if 'tipo' in filters:
+                query = query.filter(Movimiento.tipo == filters['tipo'])
+            if 'es' in filters:
+                query = query.filter(Movimiento.es == filters['es'])
+            if 'estado_conciliacion' in filters:
+                query = query.filter(Movimiento.estado_conciliacion == filters['estado_conciliacion'])
+        
+        return [tuple(row) for row in query.all()]
+    
+    @staticmethod
+    def columnas_tuplas_con_tipo():
+        """
+        Columnas de las tuplas (id, fecha, descripcion, valor, tipo, es,
+        descripcion_normalizada, referencias_descripcion). La descripción original
+        solo se trae si falta la normalizada (movimientos antiguos). La fecha se
+        lee como date, sin pasar por el texto ISO de FechaISO.
+        """
+        return (
+            Movimiento.id, type_coerce(Movimiento.fecha, Date).label('fecha'),
+            case((Movimiento.descripcion_normalizada.is_(None), Movimiento.descripcion), else_=None).label('descripcion'),
+            Movimiento.valor, Movimiento.tipo, Movimiento.es,
+            Movimiento.descripcion_normalizada, Movimiento.referencias_descripcion
+        )
+    
+    def get_tuplas_con_tipo_by_conciliacion(self, conciliacion_id: int, filters: Optional[Dict[str, Any]] = None) -> List:
+        """
+        Devuelve tuplas (id, fecha, descripcion, valor, tipo, es, descripcion_normalizada,
+        referencias_descripcion) en una sola consulta de columnas (sin ORM ni
+        identity map), ordenadas por id.
+        """
+        stmt = select(*self.columnas_tuplas_con_tipo()).where(Movimiento.id_conciliacion == conciliacion_id)
+        
+        if filters:
+            if 'tipo' in filters:
+                stmt = stmt.where(Movimiento.tipo == filters['tipo'])
+            if 'es' in filters:
+                stmt = stmt.where(Movimiento.es == filters['es'])
+            if 'estado_conciliacion' in filters:
+                stmt = stmt.where(Movimiento.estado_conciliacion == filters['estado_conciliacion'])
+            if 'id_mayor_a' in filters:
+                stmt = stmt.where(Movimiento.id > filters['id_mayor_a'])
+        
+        return [tuple(row) for row in self.db.execute(stmt.order_by(Movimiento.id))]
+    
+    def get_tuplas_con_tipo_by_ids(self, conciliacion_id: int, movimiento_ids: List[int], filters: Optional[Dict[str, Any]] = None) -> List:
+        """
+        Devuelve las tuplas de get_tuplas_con_tipo_by_conciliacion de los movimientos
+        indicados, con un SELECT ... WHERE id IN (...) por lote, ordenadas por id.
+        """
+        tuplas = []
+        for i in range(0, len(movimiento_ids), TAMANO_LOTE_IN):
+            stmt = select(*self.columnas_tuplas_con_tipo()).where(
+                Movimiento.id_conciliacion == conciliacion_id,
+                Movimiento.id.in_(movimiento_ids[i:i + TAMANO_LOTE_IN])
+            )
+            if filters and 'estado_conciliacion' in filters:
+                stmt = stmt.where(Movimiento.estado_conciliacion == filters['estado_conciliacion'])
+            tuplas.extend(tuple(row) for row in self.db.execute(stmt))
+        tuplas.sort(key=lambda fila: fila[0])
+        return tuplas
+    
     def count_by_conciliacion(self, conciliacion_id: int, filters: Optional[Dict[str, Any]] = None) -> int:
         query = self.db.query(Movimiento).filter(Movimiento.id_conciliacion == conciliacion_id)
         
@@ -197,44 +391,128 @@ class SQLAlchemyMovimientoRepository(IMovimientoRepository):
         
         return query.count()
     
+    def count_by_conciliaciones(self, conciliacion_ids: List[int]) -> Dict[int, Tuple[int, int]]:
+        """
+        Cuenta los movimientos totales y conciliados de varias conciliaciones con un
+        SELECT ... GROUP BY id_conciliacion (SUM condicional) por lote de ids.
+
+        Returns:
+            dict {conciliacion_id: (total, conciliados)}, con (0, 0) para las que no tienen movimientos.
+        """
+        conciliacion_ids = list(dict.fromkeys(conciliacion_ids))
+        conteos = {conciliacion_id: (0, 0) for conciliacion_id in conciliacion_ids}
+        conciliados = func.sum(case((Movimiento.estado_conciliacion == 'conciliado', 1), else_=0))
+        for i in range(0, len(conciliacion_ids), TAMANO_LOTE_IN):
+            stmt = select(Movimiento.id_conciliacion, func.count(Movimiento.id), conciliados).where(
+                Movimiento.id_conciliacion.in_(conciliacion_ids[i:i + TAMANO_LOTE_IN])
+            ).group_by(Movimiento.id_conciliacion)
+            for conciliacion_id, total, total_conciliados in self.db.execute(stmt):
+                conteos[conciliacion_id] = (int(total), int(total_conciliados or 0))
+        return conteos
+    
     def create(self, movimiento_data: Dict[str, Any]):
         movimiento = Movimiento(**movimiento_data)
         self.db.add(movimiento)
-        self.db.commit()
-        self.db.refresh(movimiento)
+        confirmar(self.db, movimiento)
         return movimiento
     
-    def create_bulk(self, movimientos_data: List[Dict[str, Any]]) -> List:
-        movimientos = [Movimiento(**data) for data in movimientos_data]
-        self.db.add_all(movimientos)
-        self.db.commit()
-        for mov in movimientos:
-            self.db.refresh(mov)
-        return movimientos
+    def create_bulk(self, movimientos_data: List[Dict[str, Any]], return_ids: bool = True) -> Optional[List[int]]:
+        """
+        Inserta los movimientos en bloque (ver insertar_filas) y hace commit.
+        
+        Returns:
+            Ids de los movimientos en el orden recibido, o None con return_ids=False
+        """
+        ids = insertar_filas(self.db, Movimiento, con_caracteristicas_descripcion(movimientos_data), return_ids)
+        confirmar(self.db)
+        return ids
     
     def update(self, movimiento_id: int, movimiento_data: Dict[str, Any]):
         movimiento = self.get_by_id(movimiento_id)
         if movimiento:
             for key, value in movimiento_data.items():
                 setattr(movimiento, key, value)
-            self.db.commit()
-            self.db.refresh(movimiento)
+            confirmar(self.db, movimiento)
         return movimiento
     
-    def update_bulk(self, movimientos_updates: List[Dict[str, Any]]):
+    def set_estado_bulk(self, movimiento_ids: List[int], estado: str, estado_actual: Optional[str] = None) -> int:
         """
-        Actualiza múltiples movimientos.
-        Cada dict debe tener 'id' y los campos a actualizar
+        Cambia estado_conciliacion de varios movimientos con un UPDATE ... WHERE id IN (...)
+        por lote. Con estado_actual solo cambia los que siguen en ese estado; el
+        llamador compara la cantidad devuelta para detectar cambios concurrentes.
+        No hace commit: el llamador controla la transacción.
         """
+        actualizados = 0
+        for i in range(0, len(movimiento_ids), TAMANO_LOTE_IN):
+            lote = movimiento_ids[i:i + TAMANO_LOTE_IN]
+            stmt = update(Movimiento).where(Movimiento.id.in_(lote))
+            if estado_actual is not None:
+                stmt = stmt.where(Movimiento.estado_conciliacion == estado_actual)
+            result = self.db.execute(
+                stmt.values(estado_conciliacion=estado),
+                execution_options={"synchronize_session": False}
+            )
+            actualizados += result.rowcount
+        return actualizados
+    
+    def update_bulk(self, movimientos_updates: List[Dict[str, Any]]) -> int:
+        """
+        Actualiza múltiples movimientos sin cargarlos como objetos ORM.
+        Cada dict debe tener 'id' y los campos a actualizar.
+        
+        Las actualizaciones con los mismos campos y valores se aplican con un
+        UPDATE ... WHERE id IN (...) por lote; las demás, agrupadas por conjunto
+        de campos, con un UPDATE por id en executemany. Si cambia la descripción
+        se recalculan sus características (los eventos ORM no se disparan). Los
+        objetos ya cargados en la sesión no se actualizan.
+        
+        Returns:
+            Cantidad de filas actualizadas
+        """
+        ids_por_valores = defaultdict(list)
         for update_data in movimientos_updates:
-            movimiento_id = update_data.pop('id')
-            self.update(movimiento_id, update_data)
+            campos = {key: value for key, value in update_data.items() if key != 'id'}
+            if 'descripcion' in campos and 'descripcion_normalizada' not in campos:
+                campos['descripcion_normalizada'], campos['referencias_descripcion'] = caracteristicas_descripcion(campos['descripcion'])
+            if campos:
+                ids_por_valores[tuple(sorted(campos.items()))].append(update_data['id'])
+        
+        actualizados = 0
+        parametros_por_campos = defaultdict(list)
+        for valores, ids in ids_por_valores.items():
+            if len(ids) == 1:
+                parametros_por_campos[tuple(campo for campo, _ in valores)].append(
+                    {'b_id': ids[0], **{f'b_{campo}': valor for campo, valor in valores}}
+                )
+                continue
+            for i in range(0, len(ids), TAMANO_LOTE_IN):
+                result = self.db.execute(
+                    update(Movimiento).where(Movimiento.id.in_(ids[i:i + TAMANO_LOTE_IN])).values(dict(valores)),
+                    execution_options={"synchronize_session": False}
+                )
+                actualizados += result.rowcount
+        
+        tabla = Movimiento.__table__
+        # Algunos drivers no informan filas afectadas en executemany; se asume una por id
+        conteo_fiable = self.db.get_bind().dialect.supports_sane_multi_rowcount
+        for campos, parametros in parametros_por_campos.items():
+            stmt = update(tabla).where(tabla.c.id == bindparam('b_id')).values(
+                {campo: bindparam(f'b_{campo}') for campo in campos}
+            )
+            for i in range(0, len(parametros), TAMANO_LOTE_ESCRITURA):
+                lote = parametros[i:i + TAMANO_LOTE_ESCRITURA]
+                result = self.db.execute(stmt, lote)
+                actualizados += result.rowcount if conteo_fiable else len(lote)
+        
+        confirmar(self.db)
+        return actualizados
     
     def delete(self, movimiento_id: int):
         movimiento = self.get_by_id(movimiento_id)
         if movimiento:
+            self.db.execute(delete(IndiceConciliacion).where(IndiceConciliacion.id_movimiento == movimiento_id))
             self.db.delete(movimiento)
-            self.db.commit()
+            confirmar(self.db)
         return movimiento
 
 
@@ -255,30 +533,42 @@ class SQLAlchemyConciliacionMatchRepository(IConciliacionMatchRepository):
     def create(self, match_data: Dict[str, Any]):
         match = ConciliacionMatch(**match_data)
         self.db.add(match)
-        self.db.commit()
-        self.db.refresh(match)
+        confirmar(self.db, match)
         return match
     
-    def create_bulk(self, matches_data: List[Dict[str, Any]]) -> List:
-        matches = [ConciliacionMatch(**data) for data in matches_data]
-        self.db.add_all(matches)
-        self.db.commit()
-        for match in matches:
-            self.db.refresh(match)
-        return matches
+    def create_bulk(self, matches_data: List[Dict[str, Any]], return_ids: bool = True) -> Optional[List[int]]:
+        """
+        Inserta los matches en bloque (ver insertar_filas) y hace commit.
+        
+        Returns:
+            Ids de los matches en el orden recibido, o None con return_ids=False
+        """
+        ids = insertar_filas(self.db, ConciliacionMatch, matches_data, return_ids)
+        confirmar(self.db)
+        return ids
+    
+    def insert_bulk(self, matches_data: List[Dict[str, Any]]) -> int:
+        """
+        Inserta varios matches en un INSERT multi-fila sin cargar objetos ORM.
+        No hace commit: el llamador controla la transacción.
+        """
+        if not matches_data:
+            return 0
+        self.db.execute(insert(ConciliacionMatch), matches_data)
+        return len(matches_data)
     
     def delete(self, match_id: int):
         match = self.get_by_id(match_id)
         if match:
             self.db.delete(match)
-            self.db.commit()
+            confirmar(self.db)
         return match
     
     def delete_by_conciliacion(self, conciliacion_id: int):
         self.db.query(ConciliacionMatch).filter(
             ConciliacionMatch.id_conciliacion == conciliacion_id
         ).delete()
-        self.db.commit()
+        confirmar(self.db)
 
 
 class SQLAlchemyConciliacionManualRepository(IConciliacionManualRepository):
@@ -298,15 +588,14 @@ class SQLAlchemyConciliacionManualRepository(IConciliacionManualRepository):
     def create(self, manual_data: Dict[str, Any]):
         manual = ConciliacionManual(**manual_data)
         self.db.add(manual)
-        self.db.commit()
-        self.db.refresh(manual)
+        confirmar(self.db, manual)
         return manual
     
     def delete(self, manual_id: int):
         manual = self.get_by_id(manual_id)
         if manual:
             self.db.delete(manual)
-            self.db.commit()
+            confirmar(self.db)
         return manual
     
     def get_banco_items(self, manual_id: int) -> List:
@@ -322,16 +611,43 @@ class SQLAlchemyConciliacionManualRepository(IConciliacionManualRepository):
     def create_banco_item(self, item_data: Dict[str, Any]):
         item = ConciliacionManualBanco(**item_data)
         self.db.add(item)
-        self.db.commit()
-        self.db.refresh(item)
+        confirmar(self.db, item)
         return item
     
     def create_auxiliar_item(self, item_data: Dict[str, Any]):
         item = ConciliacionManualAuxiliar(**item_data)
         self.db.add(item)
-        self.db.commit()
-        self.db.refresh(item)
+        confirmar(self.db, item)
         return item
+    
+    def insert_grupos_bulk(self, conciliacion_id: int, grupos: List) -> List[int]:
+        """
+        Crea varias conciliaciones manuales con sus movimientos de banco y
+        auxiliar en INSERTs multi-fila. No hace commit.
+        """
+        if not grupos:
+            return []
+        fecha_creacion = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cabeceras = [{"id_conciliacion": conciliacion_id, "fecha_creacion": fecha_creacion} for _ in grupos]
+        sentencia = insert(ConciliacionManual).returning(ConciliacionManual.id, sort_by_parameter_order=True)
+        if self.db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+            manual_ids = list(self.db.execute(sentencia, cabeceras).scalars())
+        else:
+            manual_ids = [self.db.execute(sentencia, cabecera).scalar_one() for cabecera in cabeceras]
+
+        items_banco = [
+            {"id_conciliacion_manual": manual_id, "id_movimiento_banco": int(mov_id)}
+            for manual_id, (ids_banco, _) in zip(manual_ids, grupos) for mov_id in ids_banco
+        ]
+        items_auxiliar = [
+            {"id_conciliacion_manual": manual_id, "id_movimiento_auxiliar": int(mov_id)}
+            for manual_id, (_, ids_auxiliar) in zip(manual_ids, grupos) for mov_id in ids_auxiliar
+        ]
+        if items_banco:
+            self.db.execute(insert(ConciliacionManualBanco), items_banco)
+        if items_auxiliar:
+            self.db.execute(insert(ConciliacionManualAuxiliar), items_auxiliar)
+        return manual_ids
 
 
 class SQLAlchemyTaskRepository(ITaskRepository):
@@ -356,8 +672,7 @@ class SQLAlchemyTaskRepository(ITaskRepository):
     def create(self, task_data: Dict[str, Any]):
         task = Task(**task_data)
         self.db.add(task)
-        self.db.commit()
-        self.db.refresh(task)
+        confirmar(self.db, task)
         return task
     
     def update(self, task_id: int, task_data: Dict[str, Any]):
@@ -366,15 +681,14 @@ class SQLAlchemyTaskRepository(ITaskRepository):
             for key, value in task_data.items():
                 setattr(task, key, value)
             task.updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.db.commit()
-            self.db.refresh(task)
+            confirmar(self.db, task)
         return task
     
     def delete(self, task_id: int):
         task = self.get_by_id(task_id)
         if task:
             self.db.delete(task)
-            self.db.commit()
+            confirmar(self.db)
             return True
         return False
     
@@ -400,8 +714,7 @@ class SQLAlchemyDeepSeekProcessingResultRepository(IDeepSeekProcessingResultRepo
     def create(self, result_data: Dict[str, Any]):
         result = DeepSeekProcessingResult(**result_data)
         self.db.add(result)
-        self.db.commit()
-        self.db.refresh(result)
+        confirmar(self.db, result)
         return result
     
     def update(self, result_id: int, result_data: Dict[str, Any]):
@@ -410,8 +723,7 @@ class SQLAlchemyDeepSeekProcessingResultRepository(IDeepSeekProcessingResultRepo
             for key, value in result_data.items():
                 setattr(result, key, value)
             result.updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.db.commit()
-            self.db.refresh(result)
+            confirmar(self.db, result)
         return result
     
     def get_successful_results(self, task_id: int) -> List:
@@ -424,4 +736,79 @@ class SQLAlchemyDeepSeekProcessingResultRepository(IDeepSeekProcessingResultRepo
         results = self.db.query(DeepSeekProcessingResult).filter(DeepSeekProcessingResult.id_task == task_id).all()
         for result in results:
             self.db.delete(result)
-        self.db.commit()
+        confirmar(self.db)
+
+
+class SQLAlchemyIndiceConciliacionRepository(IIndiceConciliacionRepository):
+    """Implementación de IndiceConciliacionRepository con SQLAlchemy (sin commits: los controla el llamador)"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_estado(self, conciliacion_id: int):
+        return self.db.get(EstadoIndiceConciliacion, conciliacion_id)
+    
+    def guardar_estado(self, conciliacion_id: int, ultimo_movimiento_id: int, ancho_bucket: int):
+        estado = self.get_estado(conciliacion_id)
+        if estado is None:
+            estado = EstadoIndiceConciliacion(id_conciliacion=conciliacion_id)
+            self.db.add(estado)
+        estado.ultimo_movimiento_id = ultimo_movimiento_id
+        estado.ancho_bucket = ancho_bucket
+        estado.fecha_actualizacion = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return estado
+    
+    def insert_bulk(self, entradas: List[Dict[str, Any]]) -> int:
+        if not entradas:
+            return 0
+        self.db.execute(insert(IndiceConciliacion), entradas)
+        return len(entradas)
+    
+    def delete_movimientos(self, conciliacion_id: int, movimiento_ids: List[int]) -> int:
+        eliminados = 0
+        for i in range(0, len(movimiento_ids), TAMANO_LOTE_IN):
+            result = self.db.execute(
+                delete(IndiceConciliacion).where(
+                    IndiceConciliacion.id_conciliacion == conciliacion_id,
+                    IndiceConciliacion.id_movimiento.in_(movimiento_ids[i:i + TAMANO_LOTE_IN])
+                ),
+                execution_options={"synchronize_session": False}
+            )
+            eliminados += result.rowcount
+        return eliminados
+    
+    def delete_by_conciliacion(self, conciliacion_id: int):
+        self.db.execute(
+            delete(IndiceConciliacion).where(IndiceConciliacion.id_conciliacion == conciliacion_id),
+            execution_options={"synchronize_session": False}
+        )
+        self.db.execute(
+            delete(EstadoIndiceConciliacion).where(EstadoIndiceConciliacion.id_conciliacion == conciliacion_id),
+            execution_options={"synchronize_session": False}
+        )
+    
+    def get_ids_por_buckets(self, conciliacion_id: int, tipo: str, es: str, buckets: List[int]) -> List[int]:
+        ids = []
+        for i in range(0, len(buckets), TAMANO_LOTE_IN):
+            ids.extend(self.db.execute(
+                select(IndiceConciliacion.id_movimiento).where(
+                    IndiceConciliacion.id_conciliacion == conciliacion_id,
+                    IndiceConciliacion.tipo == tipo,
+                    IndiceConciliacion.es == es,
+                    IndiceConciliacion.bucket_valor.in_(buckets[i:i + TAMANO_LOTE_IN])
+                )
+            ).scalars())
+        return ids
+    
+    def get_ids_por_rangos_dia(self, conciliacion_id: int, tipo: str, es: str, rangos: List) -> List[int]:
+        ids = []
+        for i in range(0, len(rangos), TAMANO_LOTE_IN):
+            ids.extend(self.db.execute(
+                select(IndiceConciliacion.id_movimiento).where(
+                    IndiceConciliacion.id_conciliacion == conciliacion_id,
+                    IndiceConciliacion.tipo == tipo,
+                    IndiceConciliacion.es == es,
+                    or_(*[IndiceConciliacion.dia.between(desde, hasta) for desde, hasta in rangos[i:i + TAMANO_LOTE_IN]])
+                )
+            ).scalars())
+        return ids
@@ -0,0 +1,269 @@
+"""
+Asignación 1:1 de pares candidatos banco/auxiliar.
+
+Los buscadores de matches generan pares candidatos (un movimiento del banco
+puede ser compatible con varios del auxiliar y viceversa). Este módulo elige
+qué pares conservar para que cada movimiento quede conciliado una sola vez:
+
+- 'greedy': recorre los candidatos de menor a mayor diferencia de días y toma
+  cada par cuyos dos movimientos sigan libres.
+- 'optimo': parte del resultado greedy y, en cada grupo de valor donde greedy
+  no alcanzó el máximo posible, aplica Hopcroft-Karp para obtener un
+  emparejamiento de cardinalidad máxima.
+"""
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+MODOS_ASIGNACION = ('greedy', 'optimo')
+
+
+def validar_modo_asignacion(modo_asignacion):
+    if modo_asignacion not in MODOS_ASIGNACION:
+        raise ValueError(
+            f"Modo de asignación desconocido: {modo_asignacion}. "
+            f"Valores permitidos: {', '.join(MODOS_ASIGNACION)}"
+        )
+
+
+def seleccionar_pares_greedy(nodos_banco, nodos_auxiliar, diferencias):
+    """
+    Selección greedy por menor diferencia de días.
+
+    Args:
+        nodos_banco / nodos_auxiliar: códigos enteros (0..n-1) de cada lado por candidato
+        diferencias: diferencia de días de cada candidato (los empates respetan el orden de entrada)
+
+    Returns:
+        Índices (ordenados) de los candidatos seleccionados.
+    """
+    nodos_banco = np.asarray(nodos_banco, dtype=np.int64)
+    nodos_auxiliar = np.asarray(nodos_auxiliar, dtype=np.int64)
+    if len(nodos_banco) == 0:
+        return np.array([], dtype=np.int64)
+
+    # Los candidatos cuyos dos movimientos no aparecen en ningún otro par se aceptan directamente
+    veces_banco = np.bincount(nodos_banco)
+    veces_auxiliar = np.bincount(nodos_auxiliar)
+    unicos = (veces_banco[nodos_banco] == 1) & (veces_auxiliar[nodos_auxiliar] == 1)
+    seleccion = np.flatnonzero(unicos).tolist()
+
+    resto = np.flatnonzero(~unicos)
+    if len(resto):
+        resto = resto[np.argsort(np.asarray(diferencias)[resto], kind='stable')]
+        usados_banco = bytearray(len(veces_banco))
+        usados_auxiliar = bytearray(len(veces_auxiliar))
+        for i, b, a in zip(resto.tolist(), nodos_banco[resto].tolist(), nodos_auxiliar[resto].tolist()):
+            if not usados_banco[b] and not usados_auxiliar[a]:
+                usados_banco[b] = 1
+                usados_auxiliar[a] = 1
+                seleccion.append(i)
+
+    return np.sort(np.array(seleccion, dtype=np.int64))
+
+
+def hopcroft_karp(adyacencia, n_derecha, pareja_izquierda=None, pareja_derecha=None):
+    """
+    Emparejamiento bipartito de cardinalidad máxima (Hopcroft-Karp).
+
+    Args:
+        adyacencia: lista, por nodo izquierdo, de los nodos derechos compatibles
+        n_derecha: cantidad de nodos derechos
+        pareja_izquierda / pareja_derecha: emparejamiento inicial opcional (-1 = libre)
+
+    Returns:
+        Lista pareja_izquierda con el nodo derecho asignado a cada nodo izquierdo (-1 = libre).
+    """
+    n_izquierda = len(adyacencia)
+    pareja_izquierda = list(pareja_izquierda) if pareja_izquierda is not None else [-1] * n_izquierda
+    pareja_derecha = list(pareja_derecha) if pareja_derecha is not None else [-1] * n_derecha
+
+    while True:
+        # BFS: capas de nodos izquierdos alcanzables desde los libres por caminos alternantes
+        distancia = [-1] * n_izquierda
+        cola = deque()
+        for u in range(n_izquierda):
+            if pareja_izquierda[u] == -1:
+                distancia[u] = 0
+                cola.append(u)
+        # Solo interesan los caminos más cortos: no se expande más allá de la
+        # primera capa donde aparece un nodo derecho libre
+        capa_limite = -1
+        while cola:
+            u = cola.popleft()
+            if capa_limite != -1 and distancia[u] >= capa_limite:
+                continue
+            for v in adyacencia[u]:
+                w = pareja_derecha[v]
+                if w == -1:
+                    if capa_limite == -1:
+                        capa_limite = distancia[u] + 1
+                elif distancia[w] == -1:
+                    distancia[w] = distancia[u] + 1
+                    cola.append(w)
+        if capa_limite == -1:
+            break
+
+        # DFS iterativo: caminos de aumento disjuntos siguiendo las capas
+        puntero = [0] * n_izquierda
+        for raiz in range(n_izquierda):
+            if pareja_izquierda[raiz] != -1:
+                continue
+            pila = [raiz]
+            while pila:
+                u = pila[-1]
+                if puntero[u] < len(adyacencia[u]):
+                    v = adyacencia[u][puntero[u]]
+                    puntero[u] += 1
+                    w = pareja_derecha[v]
+                    if w == -1:
+                        for x in pila:
+                            vx = adyacencia[x][puntero[x] - 1]
+                            pareja_izquierda[x] = vx
+                            pareja_derecha[vx] = x
+                        break
+                    if distancia[w] == distancia[u] + 1:
+                        pila.append(w)
+                else:
+                    distancia[u] = -1
+                    pila.pop()
+
+    return pareja_izquierda
+
+
+def seleccionar_pares_optimo(nodos_banco, nodos_auxiliar, diferencias, grupos, seleccion_greedy=None):
+    """
+    Emparejamiento de cardinalidad máxima por grupo de valor.
+
+    Solo se ejecuta Hopcroft-Karp en los grupos donde la selección greedy dejó
+    movimientos sin pareja pudiendo emparejarlos; en el resto greedy ya es óptimo.
+
+    Returns:
+        Índices (ordenados) de los candidatos seleccionados.
+    """
+    nodos_banco = np.asarray(nodos_banco, dtype=np.int64)
+    nodos_auxiliar = np.asarray(nodos_auxiliar, dtype=np.int64)
+    diferencias = np.asarray(diferencias)
+    grupos = np.asarray(grupos, dtype=np.int64)
+    if seleccion_greedy is None:
+        seleccion_greedy = seleccionar_pares_greedy(nodos_banco, nodos_auxiliar, diferencias)
+    if len(nodos_banco) == 0:
+        return seleccion_greedy
+
+    # Cota superior por grupo: min(movimientos banco distintos, movimientos auxiliar distintos)
+    n_grupos = int(grupos.max()) + 1
+    distintos_banco = np.bincount(grupos[np.unique(grupos * (nodos_banco.max() + 1) + nodos_banco, return_index=True)[1]], minlength=n_grupos)
+    distintos_auxiliar = np.bincount(grupos[np.unique(grupos * (nodos_auxiliar.max() + 1) + nodos_auxiliar, return_index=True)[1]], minlength=n_grupos)
+    emparejados = np.bincount(grupos[seleccion_greedy], minlength=n_grupos)
+    deficitarios = np.flatnonzero(emparejados < np.minimum(distintos_banco, distintos_auxiliar))
+    if len(deficitarios) == 0:
+        return seleccion_greedy
+
+    en_greedy = np.zeros(len(nodos_banco), dtype=bool)
+    en_greedy[seleccion_greedy] = True
+    mantener = ~np.isin(grupos, deficitarios) & en_greedy
+    seleccion = np.flatnonzero(mantener).tolist()
+
+    # Candidatos de los grupos deficitarios, ordenados por grupo y diferencia de días
+    indices = np.flatnonzero(np.isin(grupos, deficitarios))
+    indices = indices[np.lexsort((diferencias[indices], grupos[indices]))]
+    limites = np.flatnonzero(np.diff(grupos[indices])) + 1
+    for bloque in np.split(indices, limites):
+        locales_banco, izquierda = np.unique(nodos_banco[bloque], return_inverse=True)
+        locales_auxiliar, derecha = np.unique(nodos_auxiliar[bloque], return_inverse=True)
+        n_izquierda, n_derecha = len(locales_banco), len(locales_auxiliar)
+
+        # Adyacencia en formato CSR (por nodo banco, de menor a mayor diferencia de días)
+        orden = np.argsort(izquierda, kind='stable')
+        inicio = np.searchsorted(izquierda[orden], np.arange(n_izquierda + 1))
+        vecinos = derecha[orden].tolist()
+        adyacencia = [vecinos[inicio[u]:inicio[u + 1]] for u in range(n_izquierda)]
+
+        pareja_izquierda = [-1] * n_izquierda
+        pareja_derecha = [-1] * n_derecha
+        iniciales = en_greedy[bloque]
+        for u, v in zip(izquierda[iniciales].tolist(), derecha[iniciales].tolist()):
+            pareja_izquierda[u] = v
+            pareja_derecha[v] = u
+
+        pareja_izquierda = np.array(
+            hopcroft_karp(adyacencia, n_derecha, pareja_izquierda, pareja_derecha), dtype=np.int64
+        )
+
+        # Recuperar el índice del candidato de cada par (u, v) emparejado
+        claves_bloque = izquierda.astype(np.int64) * n_derecha + derecha
+        orden_claves = np.argsort(claves_bloque)
+        u_emparejados = np.flatnonzero(pareja_izquierda >= 0)
+        buscadas = u_emparejados * n_derecha + pareja_izquierda[u_emparejados]
+        posiciones = orden_claves[np.searchsorted(claves_bloque[orden_claves], buscadas)]
+        seleccion.extend(bloque[posiciones].tolist())
+
+    return np.sort(np.array(seleccion, dtype=np.int64))
+
+
+def componentes_conexas(nodos_banco, nodos_auxiliar):
+    """
+    Etiqueta cada candidato con la componente conexa del grafo bipartito al que
+    pertenece (propagación de la etiqueta mínima hasta converger).
+
+    Se usa como agrupación para el modo 'optimo' cuando los dos lados de un par
+    no comparten el mismo valor (ej. matches con tolerancia de valor).
+    """
+    nodos_banco = np.asarray(nodos_banco, dtype=np.int64)
+    nodos_auxiliar = np.asarray(nodos_auxiliar, dtype=np.int64)
+    if len(nodos_banco) == 0:
+        return np.array([], dtype=np.int64)
+
+    etiqueta_banco = np.arange(nodos_banco.max() + 1, dtype=np.int64)
+    while True:
+        etiqueta_auxiliar = np.full(nodos_auxiliar.max() + 1, len(etiqueta_banco), dtype=np.int64)
+        np.minimum.at(etiqueta_auxiliar, nodos_auxiliar, etiqueta_banco[nodos_banco])
+        nueva_banco = etiqueta_banco.copy()
+        np.minimum.at(nueva_banco, nodos_banco, etiqueta_auxiliar[nodos_auxiliar])
+        if np.array_equal(nueva_banco, etiqueta_banco):
+            break
+        etiqueta_banco = nueva_banco
+
+    grupos, _ = pd.factorize(etiqueta_banco[nodos_banco])
+    return grupos
+
+
+def asignar_candidatos(candidatos: pd.DataFrame, modo_asignacion: str = 'greedy', prioridad=None,
+                       grupos=None) -> pd.DataFrame:
+    """
+    Reduce los pares candidatos a una relación 1:1.
+
+    Args:
+        candidatos: DataFrame con 'id_banco', 'id_auxiliar', 'valor_centavos' y 'diff_dias'
+        modo_asignacion: 'greedy' u 'optimo'
+        prioridad: orden de preferencia de cada candidato (menor primero).
+            Por defecto la diferencia de días.
+        grupos: 'valor' (por defecto, banco y auxiliar comparten valor) o
+            'componentes' (componentes conexas, para pares con valores distintos).
+            Solo aplica al modo 'optimo'.
+
+    Returns:
+        DataFrame con los candidatos seleccionados. En modo 'optimo' el atributo
+        attrs['pares_greedy'] indica cuántos pares habría encontrado greedy.
+    """
+    validar_modo_asignacion(modo_asignacion)
+    if candidatos.empty:
+        return candidatos
+
+    nodos_banco, _ = pd.factorize(candidatos['id_banco'])
+    nodos_auxiliar, _ = pd.factorize(candidatos['id_auxiliar'])
+    diferencias = candidatos['diff_dias'].to_numpy() if prioridad is None else np.asarray(prioridad)
+    seleccion = seleccionar_pares_greedy(nodos_banco, nodos_auxiliar, diferencias)
+    pares_greedy = len(seleccion)
+
+    if modo_asignacion == 'optimo':
+        if grupos == 'componentes':
+            grupos = componentes_conexas(nodos_banco, nodos_auxiliar)
+        else:
+            grupos, _ = pd.factorize(candidatos['valor_centavos'])
+        seleccion = seleccionar_pares_optimo(nodos_banco, nodos_auxiliar, diferencias, grupos, seleccion)
+
+    asignados = candidatos.iloc[seleccion].reset_index(drop=True)
+    asignados.attrs['pares_greedy'] = pares_greedy
+    return asignados
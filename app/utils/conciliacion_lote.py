@@ -0,0 +1,161 @@
+"""
+Conciliación automática en lote.
+
+Reparte una lista de conciliaciones entre procesos de un ProcessPoolExecutor
+(contexto 'spawn', sin heredar conexiones abiertas del proceso padre). Cada
+worker crea su propio engine y abre una sesión por conciliación, de modo que
+las conciliaciones se procesan de forma independiente: un error en una no
+afecta a las demás y queda reportado en su resultado.
+
+La concurrencia está acotada por CONCILIACION_LOTE_MAX_WORKERS (y por el
+max_workers de cada llamada, si es menor).
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from .asignacion import validar_modo_asignacion
+from .conciliaciones import construir_estrategias, realizar_conciliacion_automatica
+
+# Máximo de procesos simultáneos de un lote
+MAX_WORKERS_LOTE = int(os.getenv("CONCILIACION_LOTE_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Fábrica de sesiones del proceso worker (la crea inicializar_worker)
+fabrica_sesiones_worker = None
+
+
+def inicializar_worker(database_url):
+    """Inicializador de cada proceso del pool: crea su propio engine y fábrica de sesiones."""
+    global fabrica_sesiones_worker
+    engine = create_engine(database_url, pool_pre_ping=True)
+    fabrica_sesiones_worker = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def conciliar_en_worker(conciliacion_id, opciones):
+    """
+    Concilia una conciliación dentro de un worker con una sesión propia.
+
+    Returns:
+        dict con conciliacion_id, estado ('ok' o 'error'), stats o error y tiempo_segundos.
+    """
+    inicio = time.perf_counter()
+    db = fabrica_sesiones_worker()
+    try:
+        stats = realizar_conciliacion_automatica(conciliacion_id, db, **opciones)
+        return {
+            'conciliacion_id': conciliacion_id, 'estado': 'ok', 'stats': stats,
+            'tiempo_segundos': round(time.perf_counter() - inicio, 3)
+        }
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error conciliando #{conciliacion_id} en lote: {e}")
+        return {
+            'conciliacion_id': conciliacion_id, 'estado': 'error', 'error': str(e),
+            'tiempo_segundos': round(time.perf_counter() - inicio, 3)
+        }
+    finally:
+        db.close()
+
+
+def agregar_stats_lote(resultados):
+    """
+    Suma las estadísticas numéricas de las conciliaciones procesadas sin error.
+    Los picos de memoria se agregan con el máximo y las etapas por estrategia.
+    """
+    exitosos = [resultado for resultado in resultados if resultado['estado'] == 'ok']
+    stats = {
+        'conciliaciones': len(resultados),
+        'conciliaciones_ok': len(exitosos),
+        'conciliaciones_con_error': len(resultados) - len(exitosos),
+        'conciliaciones_busqueda_grupos_interrumpida': 0
+    }
+    etapas = {}
+    for resultado in exitosos:
+        for clave, valor in resultado['stats'].items():
+            if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+                continue
+            if clave.startswith('memoria_pico'):
+                stats[clave] = max(stats.get(clave, 0), valor)
+            else:
+                stats[clave] = stats.get(clave, 0) + valor
+        if resultado['stats'].get('busqueda_grupos_interrumpida'):
+            stats['conciliaciones_busqueda_grupos_interrumpida'] += 1
+        for etapa in resultado['stats'].get('etapas', []):
+            acumulada = etapas.setdefault(
+                etapa['estrategia'], {'estrategia': etapa['estrategia'], 'tiempo_segundos': 0.0, 'candidatos': 0, 'matches': 0}
+            )
+            acumulada['tiempo_segundos'] = round(acumulada['tiempo_segundos'] + etapa['tiempo_segundos'], 4)
+            acumulada['candidatos'] += etapa['candidatos']
+            acumulada['matches'] += etapa['matches']
+    stats['etapas'] = list(etapas.values())
+    return stats
+
+
+def procesar_conciliaciones_en_lote(conciliacion_ids, max_workers=None, database_url=None, modo_asignacion='greedy',
+                                    incremental=False, estrategias=None, tolerancia_dias=None, al_completar=None):
+    """
+    Concilia automáticamente varias conciliaciones en paralelo.
+
+    Args:
+        conciliacion_ids: ids de las conciliaciones a procesar.
+        max_workers: procesos simultáneos; se acota a MAX_WORKERS_LOTE.
+        database_url: base de datos de los workers. Por defecto DATABASE_URL.
+        modo_asignacion, incremental, estrategias, tolerancia_dias: opciones de
+            realizar_conciliacion_automatica, iguales para todo el lote.
+        al_completar: función opcional llamada en el proceso padre cada vez que
+            termina una conciliación, con (resultado, completadas, total).
+
+    Returns:
+        dict con 'resultados' (uno por conciliación, en orden de id), 'stats'
+        agregadas (ver agregar_stats_lote), 'workers' y 'tiempo_segundos'.
+
+    Raises:
+        ValueError: si el modo de asignación o las estrategias no son válidos.
+    """
+    validar_modo_asignacion(modo_asignacion)
+    if estrategias is not None:
+        # Se envían los nombres a los workers; aquí solo se validan
+        estrategias = [estrategia.nombre for estrategia in construir_estrategias(estrategias)]
+    if database_url is None:
+        from ..database import DATABASE_URL
+        database_url = DATABASE_URL
+
+    conciliacion_ids = sorted(set(int(cid) for cid in conciliacion_ids))
+    inicio = time.perf_counter()
+    if not conciliacion_ids:
+        return {'resultados': [], 'stats': agregar_stats_lote([]), 'workers': 0, 'tiempo_segundos': 0.0}
+
+    workers = max(1, min(max_workers or MAX_WORKERS_LOTE, MAX_WORKERS_LOTE, len(conciliacion_ids)))
+    opciones = {
+        'modo_asignacion': modo_asignacion, 'incremental': incremental,
+        'estrategias': estrategias, 'tolerancia_dias': tolerancia_dias
+    }
+    print(f"Procesando {len(conciliacion_ids)} conciliaciones en lote con {workers} workers")
+
+    resultados = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                             initializer=inicializar_worker, initargs=(database_url,)) as executor:
+        futuros = {executor.submit(conciliar_en_worker, cid, opciones): cid for cid in conciliacion_ids}
+        for futuro in as_completed(futuros):
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                # El worker murió (ej. sin memoria): la conciliación queda como error
+                resultado = {'conciliacion_id': futuros[futuro], 'estado': 'error', 'error': str(e), 'tiempo_segundos': None}
+            resultados.append(resultado)
+            print(f"✓ Conciliación #{resultado['conciliacion_id']} ({resultado['estado']}) "
+                  f"- {len(resultados)}/{len(conciliacion_ids)}")
+            if al_completar is not None:
+                al_completar(resultado, len(resultados), len(conciliacion_ids))
+
+    resultados.sort(key=lambda resultado: resultado['conciliacion_id'])
+    return {
+        'resultados': resultados,
+        'stats': agregar_stats_lote(resultados),
+        'workers': workers,
+        'tiempo_segundos': round(time.perf_counter() - inicio, 3)
+    }
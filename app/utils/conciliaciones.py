@@ -1,18 +1,29 @@
 import pandas as pd
 import numpy as np
-import re
-from datetime import datetime, timedelta
+import os
+import time
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta
+from itertools import islice
 from sqlalchemy import and_
 from sqlalchemy.sql import text  # Importar text para consultas SQL sin procesar
 from difflib import SequenceMatcher
 from ..models import Conciliacion, ConciliacionMatch, Movimiento, ConciliacionManual, ConciliacionManualBanco, ConciliacionManualAuxiliar
 from ..repositories.factory import RepositoryFactory
+from .asignacion import asignar_candidatos, validar_modo_asignacion
+from .subconjuntos import PresupuestoBusqueda, buscar_grupos_por_suma
+from .memoria import MedidorMemoria
+from .fechas import parse_fecha, parse_fechas_columna
+from .descripciones import (
+    caracteristicas_descripcion_columna, extraer_referencias, limpiar_descripcion, limpiar_descripcion_columna
+)
 
 
 
 def obtener_movimientos_por_tipo(conciliacion_id, db, fuente, tipo_es):
     """
     Obtiene movimientos filtrados por fuente (banco/auxiliar) y tipo (E/S)
+    como tuplas (id, fecha, descripcion, valor)
     """
     factory = RepositoryFactory(db)
     movimiento_repo = factory.get_movimiento_repository()
@@ -23,7 +34,7 @@ def obtener_movimientos_por_tipo(conciliacion_id, db, fuente, tipo_es):
         'estado_conciliacion': 'no_conciliado'
     }
     
-    return movimiento_repo.get_by_conciliacion(conciliacion_id, filters)
+    return movimiento_repo.get_tuplas_by_conciliacion(conciliacion_id, filters)
 
 def categorizar_por_valor(valor):
     if valor < 100000: return 'pequeño'
@@ -31,58 +42,356 @@ def categorizar_por_valor(valor):
     elif valor < 10000000: return 'grande'
     else: return 'muy_grande'
 
-def limpiar_descripcion(descripcion):
-    if not descripcion: return ""
-    clean = descripcion.lower()
-    clean = re.sub(r'[^\w\s]', ' ', clean)
-    clean = re.sub(r'\s+', ' ', clean).strip()
-    stop_words = {
-        'de', 'la', 'el', 'en', 'a', 'por', 'con', 'para', 'del', 'los', 'las', 'y', 'o', 'un', 'una',
-        'banco', 'debito', 'credito', 'transferencia', 'pago', 'ref', 'referencia', 'mov', 'movimiento'
-    }
-    words = [w for w in clean.split() if w not in stop_words and len(w) > 2]
-    return ' '.join(words)
+def categorizar_por_valor_columna(valores):
+    """
+    Versión vectorizada de categorizar_por_valor para una columna completa
+    """
+    valores = np.asarray(valores, dtype='float64')
+    return np.select(
+        [valores < 100000, valores < 1000000, valores < 10000000],
+        ['pequeño', 'mediano', 'grande'],
+        default='muy_grande'
+    ).astype(object)
+
+# Diferencia máxima de días para los matches aproximados
+TOLERANCIA_DIAS_APROXIMADO = int(os.getenv("CONCILIACION_TOLERANCIA_DIAS", "2"))
+
+# Estrategia valor + descripción: ventana de fechas del bloque, similitud mínima
+# y máximo de candidatos por movimiento del banco dentro de cada bloque
+VENTANA_DIAS_DESCRIPCION = int(os.getenv("CONCILIACION_VENTANA_DIAS_DESCRIPCION", "30"))
+UMBRAL_SIMILITUD_DESCRIPCION = float(os.getenv("CONCILIACION_UMBRAL_SIMILITUD", "0.6"))
+MAX_CANDIDATOS_DESCRIPCION = int(os.getenv("CONCILIACION_MAX_CANDIDATOS_DESCRIPCION", "20"))
+
+# Estrategia con tolerancia de valor (comisiones, redondeos, retenciones): se acepta
+# la mayor de las dos cotas, absoluta en pesos o porcentual sobre el valor del banco.
+# Con ambas en 0 la estrategia queda desactivada. No está en ESTRATEGIAS_POR_DEFECTO:
+# se activa agregando 'tolerancia_valor' a CONCILIACION_ESTRATEGIAS.
+TOLERANCIA_VALOR_ABSOLUTA = float(os.getenv("CONCILIACION_TOLERANCIA_VALOR", "100"))
+TOLERANCIA_VALOR_PORCENTAJE = float(os.getenv("CONCILIACION_TOLERANCIA_VALOR_PORCENTAJE", "0"))
+
+# Estrategia de grupos N:1 / 1:N por suma exacta: máximo de movimientos por grupo
+# (menos de 2 la desactiva), ventana de fechas, candidatos por movimiento y
+# presupuesto de tiempo (segundos) y combinaciones evaluadas por ejecución
+MAX_MOVIMIENTOS_GRUPO = int(os.getenv("CONCILIACION_GRUPO_MAX_MOVIMIENTOS", "4"))
+VENTANA_DIAS_GRUPO = int(os.getenv("CONCILIACION_GRUPO_VENTANA_DIAS", "5"))
+MAX_CANDIDATOS_GRUPO = int(os.getenv("CONCILIACION_GRUPO_MAX_CANDIDATOS", "20"))
+TIEMPO_MAX_GRUPOS = float(os.getenv("CONCILIACION_GRUPO_TIEMPO_MAX", "10"))
+MAX_COMBINACIONES_GRUPOS = int(os.getenv("CONCILIACION_GRUPO_MAX_COMBINACIONES", "2000000"))
+
+# Estrategias de matching y su orden (nombres separados por coma, ver
+# ESTRATEGIAS_MATCHING). Permite reordenar o quitar etapas costosas.
+ESTRATEGIAS_POR_DEFECTO = os.getenv(
+    "CONCILIACION_ESTRATEGIAS", "exacto,aproximado,valor_descripcion,agrupado"
+)
+
+# Ancho (en pesos) del bucket de valor del índice incremental
+ANCHO_BUCKET_INDICE = float(os.getenv("CONCILIACION_INDICE_ANCHO_BUCKET", "100"))
+
+# Movimientos por lote al leerlos de la base de datos para armar los DataFrames del motor
+TAMANO_LOTE_CARGA = int(os.getenv("CONCILIACION_TAMANO_LOTE_CARGA", "20000"))
+
+# Pico de memoria de cada ejecución con tracemalloc (ver utils/memoria.py).
+# Sin activarlo, las estadísticas solo traen el pico RSS del proceso.
+MEDIR_MEMORIA_DETALLADA = os.getenv("CONCILIACION_MEDIR_MEMORIA", "false").lower() == "true"
 
 def parse_fecha_segura(fecha_str):
-    if not fecha_str: return pd.NaT
-    fecha_clean = str(fecha_str).strip()
-    formatos = ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%Y%m%d', '%d/%m/%y']
-    for formato in formatos:
-        try: return pd.to_datetime(fecha_clean, format=formato)
-        except: continue
-    try: return pd.to_datetime(fecha_clean, dayfirst=True)
-    except: return pd.NaT
+    return parse_fecha(fecha_str)
+
+COLUMNAS_MOVIMIENTO = ['id', 'fecha', 'descripcion', 'valor']
+# Tuplas de get_tuplas_con_tipo_by_conciliacion: incluyen las características precalculadas de la descripción
+COLUMNAS_CARGA = COLUMNAS_MOVIMIENTO + ['tipo', 'es', 'descripcion_normalizada', 'referencias_descripcion']
+
+# Marcadores para valores o fechas que no se pueden convertir a entero
+VALOR_INVALIDO = -1
+DIA_INVALIDO = np.iinfo(np.int32).min
+
+def valor_a_centavos(valores) -> np.ndarray:
+    """
+    Convierte valores monetarios a centavos (int64). Los NaN quedan en VALOR_INVALIDO.
+    """
+    valores = np.asarray(valores, dtype='float64')
+    centavos = np.full(len(valores), VALOR_INVALIDO, dtype=np.int64)
+    validos = np.isfinite(valores)
+    centavos[validos] = np.rint(valores[validos] * 100).astype(np.int64)
+    return centavos
+
+def fecha_a_dia(fechas) -> np.ndarray:
+    """
+    Convierte fechas a número de día desde 1970-01-01 (int32). NaT queda en DIA_INVALIDO.
+    """
+    fechas = pd.to_datetime(pd.Series(fechas), errors='coerce')
+    dias = np.full(len(fechas), DIA_INVALIDO, dtype=np.int32)
+    validas = fechas.notna().to_numpy()
+    dias[validas] = fechas.to_numpy()[validas].astype('datetime64[D]').astype(np.int64)
+    return dias
+
+def dias_de_fechas(fechas: pd.Series) -> np.ndarray:
+    """
+    Número de día (ver fecha_a_dia) de la columna fecha de los movimientos. Las
+    fechas que llegan como date (columna DATE) se convierten directamente; si
+    hay texto se interpreta con parse_fechas_columna.
+    """
+    valores = fechas.to_numpy(dtype=object)
+    nulos = pd.isna(valores)
+    if not all(isinstance(valor, date) for valor in valores[~nulos]):
+        return fecha_a_dia(parse_fechas_columna(fechas))
+    dias = np.full(len(valores), DIA_INVALIDO, dtype=np.int32)
+    dias[~nulos] = np.array(valores[~nulos].tolist(), dtype='datetime64[D]').astype(np.int64)
+    return dias
+
+def dia_del_mes(dias) -> np.ndarray:
+    """
+    Día del mes (1-31) a partir del número de día, sin pasar por datetime.
+    """
+    dias = np.asarray(dias)
+    return (dias.astype('datetime64[D]') - dias.astype('datetime64[D]').astype('datetime64[M]')).astype(np.int64) + 1
+
+def construir_dataframe_movimientos(raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    Construye el DataFrame columnar del motor de matching a partir de un
+    DataFrame con id, fecha, descripcion, valor, tipo y es (y opcionalmente
+    descripcion_normalizada y referencias_descripcion ya guardadas).
+
+    La fecha se interpreta una sola vez (número de día en 'dia') y el valor
+    queda en centavos; solo se conservan las columnas que leen las estrategias.
+    La descripción normalizada y las referencias se toman de las columnas
+    guardadas y solo se calculan para los movimientos que no las tienen.
+    El resultado no se modifica después de la carga: las etapas lo comparten y
+    descartan movimientos con máscaras booleanas.
+    """
+    # round() de Python para conservar exactamente el redondeo anterior
+    valor_rounded = np.array([round(v, 2) for v in raw['valor'].astype('float64').tolist()], dtype='float64')
+
+    if 'descripcion_normalizada' in raw:
+        descripcion_clean = raw['descripcion_normalizada'].to_numpy(dtype=object, copy=True)
+        referencias = raw['referencias_descripcion'].to_numpy(dtype=object, copy=True)
+    else:
+        descripcion_clean = np.full(len(raw), None, dtype=object)
+        referencias = np.full(len(raw), None, dtype=object)
+    faltantes = pd.isna(descripcion_clean) | pd.isna(referencias)
+    if faltantes.any():
+        descripcion_clean[faltantes], referencias[faltantes] = caracteristicas_descripcion_columna(raw['descripcion'][faltantes])
+
+    return pd.DataFrame({
+        'id': raw['id'].to_numpy(),
+        'descripcion_clean': descripcion_clean,
+        'referencias': referencias,
+        'valor_rounded': valor_rounded,
+        # Claves enteras para el motor de matching: valor en centavos y fecha como número de día
+        'valor_centavos': valor_a_centavos(valor_rounded),
+        'dia': dias_de_fechas(raw['fecha']),
+        'tipo': raw['tipo'].to_numpy(),
+        'es': raw['es'].to_numpy()
+    })
+
+def referencias_desde_texto(referencias) -> np.ndarray:
+    """Conjuntos de referencias a partir del texto guardado (ver referencias_a_texto)."""
+    conjuntos = np.empty(len(referencias), dtype=object)
+    conjuntos[:] = [set(texto.split()) if texto else set() for texto in referencias]
+    return conjuntos
+
+def palabras_descripcion_columna(descripciones) -> np.ndarray:
+    """
+    Conjuntos de palabras de las descripciones limpias. Se calculan solo para los
+    movimientos que llegan a compararse por descripción, no en la carga.
+    """
+    palabras = np.empty(len(descripciones), dtype=object)
+    palabras[:] = [set(x.split()) if x else set() for x in descripciones]
+    return palabras
 
 def crear_dataframe_movimientos(movimientos_query, tipo, tipo_es):
+    """
+    Construye el DataFrame de movimientos de forma columnar.
+
+    Acepta tuplas (id, fecha, descripcion, valor) tal como las devuelve
+    get_tuplas_by_conciliacion, o instancias de Movimiento.
+    """
     if not movimientos_query: return pd.DataFrame()
-    data = []
-    for mov in movimientos_query:
-        data.append({
-            'id': mov.id,
-            'fecha': mov.fecha,
-            'fecha_parsed': parse_fecha_segura(mov.fecha),
-            'descripcion': mov.descripcion.strip().lower() if mov.descripcion else '',
-            'descripcion_clean': limpiar_descripcion(mov.descripcion) if mov.descripcion else '',
-            'valor': float(mov.valor),
-            'valor_rounded': round(float(mov.valor), 2),
-            'tipo': tipo,
-            'es': tipo_es
-        })
-    df = pd.DataFrame(data)
-    if not df.empty:
-        df['descripcion_words'] = df['descripcion_clean'].apply(lambda x: set(x.split()) if x else set())
-        df['valor_str'] = df['valor_rounded'].astype(str)
-        df['rango_valor'] = df['valor_rounded'].apply(categorizar_por_valor)
-    return df
+    if isinstance(movimientos_query[0], Movimiento):
+        movimientos_query = [(m.id, m.fecha, m.descripcion, m.valor) for m in movimientos_query]
+    raw = pd.DataFrame.from_records(movimientos_query, columns=COLUMNAS_MOVIMIENTO)
+    raw['tipo'] = tipo
+    raw['es'] = tipo_es
+    return construir_dataframe_movimientos(raw)
+
+def cargar_dataframe_movimientos(movimiento_repo, conciliacion_id, filters):
+    """
+    Construye el DataFrame del motor (ver construir_dataframe_movimientos) en una
+    sola consulta recorrida por lotes de TAMANO_LOTE_CARGA: cada lote se pasa a
+    columnas antes de leer el siguiente, así nunca están en memoria todas las
+    filas crudas (fecha y descripción originales). Vacío si no hay movimientos.
+    """
+    filas = movimiento_repo.iter_by_conciliacion(
+        conciliacion_id, filters, columnas=movimiento_repo.columnas_tuplas_con_tipo(), tamano_lote=TAMANO_LOTE_CARGA
+    )
+    lotes = []
+    while True:
+        lote = list(islice(filas, TAMANO_LOTE_CARGA))
+        if not lote:
+            break
+        lotes.append(construir_dataframe_movimientos(pd.DataFrame.from_records(lote, columns=COLUMNAS_CARGA)))
+    if not lotes:
+        return pd.DataFrame()
+    return lotes[0] if len(lotes) == 1 else pd.concat(lotes, ignore_index=True)
+
+def cargar_movimientos_pendientes(conciliacion_id, db):
+    """
+    Carga en una sola consulta todos los movimientos no conciliados de una
+    conciliación y los reparte en memoria en los cuatro grupos banco/auxiliar x E/S.
+
+    Returns:
+        dict {(fuente, tipo_es): DataFrame}, con DataFrame vacío para los grupos sin movimientos.
+    """
+    factory = RepositoryFactory(db)
+    movimiento_repo = factory.get_movimiento_repository()
+    df = cargar_dataframe_movimientos(movimiento_repo, conciliacion_id, {'estado_conciliacion': 'no_conciliado'})
+    return particionar_dataframe(df)
+
+def particionar_movimientos(tuplas):
+    """
+    Reparte las tuplas (id, fecha, descripcion, valor, tipo, es) en los cuatro
+    grupos banco/auxiliar x E/S y construye el DataFrame de cada grupo.
+    """
+    raw = pd.DataFrame.from_records(tuplas, columns=COLUMNAS_CARGA) if tuplas else None
+    return particionar_dataframe(raw, construir_dataframe_movimientos)
+
+def particionar_dataframe(df, construir=None):
+    """
+    Reparte un DataFrame con columnas tipo y es en los cuatro grupos
+    banco/auxiliar x E/S. construir, si se indica, se aplica a cada grupo
+    (las columnas derivadas se calculan por grupo, sin duplicar la tabla completa).
+
+    Returns:
+        dict {(fuente, tipo_es): DataFrame}, con DataFrame vacío para los grupos sin movimientos.
+    """
+    particiones = {(fuente, tipo_es): pd.DataFrame() for fuente in ('banco', 'auxiliar') for tipo_es in ('E', 'S')}
+    if df is None or df.empty:
+        return particiones
+    for (fuente, tipo_es), indices in df.groupby(['tipo', 'es'], sort=False).indices.items():
+        if (fuente, tipo_es) in particiones:
+            grupo = df.iloc[indices]
+            particiones[(fuente, tipo_es)] = construir(grupo) if construir else grupo.reset_index(drop=True)
+    return particiones
+
+def ancho_bucket_indice():
+    """
+    Ancho del bucket de valor del índice incremental en centavos (mínimo 1).
+    Consultando el bucket de un movimiento y sus dos vecinos se cubren todos los
+    valores que difieren hasta ANCHO_BUCKET_INDICE pesos.
+    """
+    return max(1, int(round(ANCHO_BUCKET_INDICE * 100)))
+
+def rangos_de_dias(dias, margen):
+    """
+    Une las ventanas [dia - margen, dia + margen] en rangos disjuntos (desde, hasta).
+    """
+    dias = np.unique(np.asarray(dias, dtype=np.int64))
+    if len(dias) == 0:
+        return []
+    cortes = np.flatnonzero(np.diff(dias) > 2 * margen + 1) + 1
+    return [(int(bloque[0] - margen), int(bloque[-1] + margen)) for bloque in np.split(dias, cortes)]
+
+def cargar_movimientos_incrementales(conciliacion_id, db, ultimo_movimiento_id, ancho_bucket):
+    """
+    Carga solo lo necesario para conciliar los movimientos agregados después de
+    ultimo_movimiento_id (el delta):
+
+    - los movimientos pendientes del delta;
+    - los movimientos pendientes del índice en el mismo bucket de valor de algún
+      movimiento del delta o en los buckets vecinos (estrategias 1:1);
+    - los del índice dentro de la ventana de fechas de grupos del delta (N:1 / 1:N).
+
+    Returns:
+        Tupla (particiones como en cargar_movimientos_pendientes, ids del delta,
+        cantidad de movimientos traídos del índice).
+    """
+    factory = RepositoryFactory(db)
+    movimiento_repo = factory.get_movimiento_repository()
+    indice_repo = factory.get_indice_repository()
+
+    # Las columnas derivadas del delta se calculan una sola vez y se reutilizan en las particiones
+    df_delta = cargar_dataframe_movimientos(
+        movimiento_repo, conciliacion_id, {'estado_conciliacion': 'no_conciliado', 'id_mayor_a': ultimo_movimiento_id}
+    )
+    if df_delta.empty:
+        return particionar_movimientos([]), [], 0
+    centavos = df_delta['valor_centavos'].to_numpy()
+    dias = df_delta['dia'].to_numpy()
+    validos = (centavos != VALOR_INVALIDO) & (dias != DIA_INVALIDO)
+
+    # Cada movimiento nuevo solo puede conciliarse con el otro lado (banco/auxiliar) del mismo tipo E/S
+    ids_indice = set()
+    for (fuente, tipo_es), indices in df_delta[validos].groupby(['tipo', 'es'], sort=False).indices.items():
+        contraparte = 'auxiliar' if fuente == 'banco' else 'banco'
+        seleccion = np.flatnonzero(validos)[indices]
+        buckets = np.unique(centavos[seleccion] // ancho_bucket)
+        buckets = np.unique(np.concatenate([buckets - 1, buckets, buckets + 1])).tolist()
+        ids_indice.update(indice_repo.get_ids_por_buckets(conciliacion_id, contraparte, tipo_es, buckets))
+        if MAX_MOVIMIENTOS_GRUPO >= 2:
+            ids_indice.update(indice_repo.get_ids_por_rangos_dia(
+                conciliacion_id, contraparte, tipo_es, rangos_de_dias(dias[seleccion], VENTANA_DIAS_GRUPO)
+            ))
+
+    ids_delta = df_delta['id'].tolist()
+    ids_indice.difference_update(ids_delta)
+    existentes = movimiento_repo.get_tuplas_con_tipo_by_ids(
+        conciliacion_id, sorted(ids_indice), {'estado_conciliacion': 'no_conciliado'}
+    )
+    print(f"Conciliación incremental: {len(df_delta)} movimientos nuevos, {len(existentes)} existentes consultados en el índice")
+    df = df_delta
+    if existentes:
+        df = pd.concat([
+            construir_dataframe_movimientos(pd.DataFrame.from_records(existentes, columns=COLUMNAS_CARGA)),
+            df_delta
+        ], ignore_index=True).sort_values('id', kind='stable')
+    return particionar_dataframe(df), ids_delta, len(existentes)
+
+def actualizar_indice_conciliacion(conciliacion_id, db, particiones, ids_conciliados, ultimo_movimiento_id, ids_delta=None):
+    """
+    Actualiza el índice incremental tras una ejecución (sin commit).
+
+    Ejecución completa (ids_delta=None): reconstruye el índice con todos los
+    movimientos que siguen pendientes. Ejecución incremental: quita los movimientos
+    conciliados y agrega los del delta que siguen pendientes.
+    """
+    indice_repo = RepositoryFactory(db).get_indice_repository()
+    ancho_bucket = ancho_bucket_indice()
+
+    frames = [df for df in particiones.values() if not df.empty]
+    pendientes = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['id', 'tipo', 'es', 'valor_centavos', 'dia'])
+    pendientes = pendientes[~pendientes['id'].isin(ids_conciliados)]
+    if ids_delta is None:
+        indice_repo.delete_by_conciliacion(conciliacion_id)
+    else:
+        indice_repo.delete_movimientos(conciliacion_id, sorted(ids_conciliados))
+        pendientes = pendientes[pendientes['id'].isin(ids_delta)]
+
+    validos = (pendientes['valor_centavos'] != VALOR_INVALIDO) & (pendientes['dia'] != DIA_INVALIDO)
+    pendientes = pendientes[validos]
+    indice_repo.insert_bulk([
+        {"id_conciliacion": conciliacion_id, "id_movimiento": id_movimiento, "tipo": tipo, "es": es,
+         "bucket_valor": bucket, "dia": dia}
+        for id_movimiento, tipo, es, bucket, dia in zip(
+            pendientes['id'].astype(int).tolist(),
+            pendientes['tipo'].tolist(),
+            pendientes['es'].tolist(),
+            (pendientes['valor_centavos'] // ancho_bucket).astype(int).tolist(),
+            pendientes['dia'].astype(int).tolist()
+        )
+    ])
+    indice_repo.guardar_estado(conciliacion_id, ultimo_movimiento_id, ancho_bucket)
+
+def invalidar_indice_conciliacion(conciliacion_id, db):
+    """
+    Elimina el índice incremental de la conciliación (sin commit) para que la
+    próxima ejecución incremental sea completa. Se usa al devolver movimientos a
+    'no_conciliado': quedan por debajo de ultimo_movimiento_id y una ejecución
+    incremental no los volvería a considerar.
+    """
+    RepositoryFactory(db).get_indice_repository().delete_by_conciliacion(conciliacion_id)
 
 def extraer_palabras_clave(desc1, desc2):
-    patron_numeros = r'\b\d{3,}\b'
-    patron_codigos = r'\b[A-Z]{2,}\d+\b'
-    nums1 = set(re.findall(patron_numeros, desc1.upper()))
-    nums2 = set(re.findall(patron_numeros, desc2.upper()))
-    codigos1 = set(re.findall(patron_codigos, desc1.upper()))
-    codigos2 = set(re.findall(patron_codigos, desc2.upper()))
-    return nums1.intersection(nums2).union(codigos1.intersection(codigos2))
+    return extraer_referencias(desc1).intersection(extraer_referencias(desc2))
 
 def calcular_similitud_descripcion_mejorada(desc1_clean, desc2_clean, words1, words2):
     if not desc1_clean or not desc2_clean: return 0.0
@@ -97,155 +406,592 @@ def calcular_similitud_descripcion_mejorada(desc1_clean, desc2_clean, words1, wo
     similitud_final = (jaccard * 0.4) + (secuencia * 0.4) + (similitud_clave * 0.2)
     return min(similitud_final, 1.0)
 
-def encontrar_matches_exactos(df_banco: pd.DataFrame, df_auxiliar: pd.DataFrame) -> pd.DataFrame:
+def mascara_activos(df: pd.DataFrame, activos=None) -> np.ndarray:
+    """
+    Máscara booleana de los movimientos que participan en una etapa (todos si activos es None).
+    Las etapas reciben los DataFrames completos y esta máscara en lugar de copias filtradas.
+    """
+    return np.ones(len(df), dtype=bool) if activos is None else np.asarray(activos, dtype=bool)
+
+def generar_candidatos_exactos(df_banco: pd.DataFrame, df_auxiliar: pd.DataFrame, activos_banco=None, activos_auxiliar=None) -> pd.DataFrame:
     """
-    Busca matches EXACTOS por valor, día de la fecha y rango.
+    Genera los pares candidatos a match EXACTO por valor y día de la fecha.
     
-    Se considera un match exacto si coinciden:
-    1. valor_rounded (valor)
-    2. fecha (solo el día)
-    3. rango_valor (rango)
+    Se considera candidato exacto si coinciden:
+    1. valor_centavos (valor)
+    2. día del mes de la fecha
     
-    Args:
-        df_banco: DataFrame con transacciones bancarias (debe tener 'fecha' como datetime).
-        df_auxiliar: DataFrame auxiliar (debe tener 'fecha' como datetime).
+    La clave se empaqueta en un único int64 (centavos * 32 + día del mes), de
+    modo que el cruce es un join hash puramente entero.
+
+    activos_banco / activos_auxiliar: máscaras opcionales de movimientos a considerar.
     
     Returns:
-        DataFrame con los matches exactos encontrados (relación 1:1).
+        DataFrame con columnas id_banco, id_auxiliar, valor_rounded, valor_centavos,
+        es_banco y diff_dias (puede haber varios candidatos por movimiento).
     """
     if df_banco.empty or df_auxiliar.empty:
         return pd.DataFrame()
 
-    # Copiar dataframes
-    df_banco_temp = df_banco.copy()
-    df_auxiliar_temp = df_auxiliar.copy()
-    # print(df_banco_temp)
-    # print(df_auxiliar_temp)
-    # --- LÓGICA: Generar ID por valor y día de la fecha ---
-    try:
-        # AÑADIDO EL FIX: Conversión obligatoria a datetime para evitar errores.
-        df_banco_temp['fecha'] = pd.to_datetime(df_banco_temp['fecha'], errors='coerce')
-        df_auxiliar_temp['fecha'] = pd.to_datetime(df_auxiliar_temp['fecha'], errors='coerce')
-        
-        df_banco_temp['dia_valor_id'] = (
-            df_banco_temp['valor_rounded'].astype(str) + 
-            '_' + 
-            df_banco_temp['fecha'].dt.day.astype(str)
-        )
-        df_auxiliar_temp['dia_valor_id'] = (
-            df_auxiliar_temp['valor_rounded'].astype(str) + 
-            '_' + 
-            df_auxiliar_temp['fecha'].dt.day.astype(str)
-        )
-    except AttributeError:
-        print("Error: Asegúrate de que la columna 'fecha' sea de tipo datetime antes de llamar a la función.")
+    centavos_banco = df_banco['valor_centavos'].to_numpy()
+    centavos_auxiliar = df_auxiliar['valor_centavos'].to_numpy()
+    dias_banco = df_banco['dia'].to_numpy()
+    dias_auxiliar = df_auxiliar['dia'].to_numpy()
+
+    validos_banco = np.flatnonzero(
+        (centavos_banco != VALOR_INVALIDO) & (dias_banco != DIA_INVALIDO) & mascara_activos(df_banco, activos_banco)
+    )
+    validos_auxiliar = np.flatnonzero(
+        (centavos_auxiliar != VALOR_INVALIDO) & (dias_auxiliar != DIA_INVALIDO) & mascara_activos(df_auxiliar, activos_auxiliar)
+    )
+    if len(validos_banco) == 0 or len(validos_auxiliar) == 0:
         return pd.DataFrame()
 
-    # El merge se realiza ÚNICAMENTE con el nuevo identificador, más 'rango_valor'
     merged = pd.merge(
-        df_banco_temp, 
-        df_auxiliar_temp, 
-        on=['dia_valor_id', 'rango_valor'], 
-        suffixes=('_banco', '_auxiliar')
+        pd.DataFrame({
+            'clave': centavos_banco[validos_banco] * 32 + dia_del_mes(dias_banco[validos_banco]),
+            'pos_banco': validos_banco
+        }),
+        pd.DataFrame({
+            'clave': centavos_auxiliar[validos_auxiliar] * 32 + dia_del_mes(dias_auxiliar[validos_auxiliar]),
+            'pos_auxiliar': validos_auxiliar
+        }),
+        on='clave'
     )
-    # print(merged)
     if merged.empty:
         return pd.DataFrame()
-    
-    # Ya no se requiere calcular ni filtrar por similitud de descripción
-    matches_exactos = merged.copy()
-    # print(matches_exactos)
-    # Eliminar duplicados para asegurar relación 1:1
-    # Mantener el primer match encontrado para asegurar la unicidad
-    matches_exactos = matches_exactos.drop_duplicates(subset=['id_banco'], keep='first')
-    matches_exactos = matches_exactos.drop_duplicates(subset=['id_auxiliar'], keep='first')
-    # print(matches_exactos[['id_banco', 'id_auxiliar', 'valor_rounded', 'es_banco']], " funcion de encontrar exactos")
-    # print(matches_exactos, " funcion de encontrar exactossssssssss")
-    # Devolver las columnas relevantes, sin 'similitud'
-    # return matches_exactos[['id_banco', 'id_auxiliar', 'valor_rounded', 'es_banco']]
-    return matches_exactos[['id_banco', 'id_auxiliar', 'valor_rounded_banco', 'es_banco']]
-
-def encontrar_matches_valor_fecha_aproximada(df_banco: pd.DataFrame, df_auxiliar: pd.DataFrame) -> pd.DataFrame:
-    """
-    FUNCIÓN CORREGIDA: Busca matches por valor y rango, permitiendo diferencia de fecha <= 2 días.
-    
-    CORRECCIONES APLICADAS:
-    1. Se eliminó la referencia a columnas inexistentes
-    2. Se corrigió el manejo de fechas
-    3. Se agregó cálculo de similitud de descripción
-    4. Se corrigió el nombre de la variable de retorno
+
+    orden = np.lexsort((merged['pos_auxiliar'].to_numpy(), merged['pos_banco'].to_numpy()))
+    pos_banco = merged['pos_banco'].to_numpy()[orden]
+    pos_auxiliar = merged['pos_auxiliar'].to_numpy()[orden]
+    return construir_candidatos(df_banco, df_auxiliar, pos_banco, pos_auxiliar)
+
+def construir_candidatos(df_banco, df_auxiliar, pos_banco, pos_auxiliar) -> pd.DataFrame:
     """
-    if df_banco.empty or df_auxiliar.empty:
-        return pd.DataFrame()
+    Arma el DataFrame de candidatos a partir de posiciones en df_banco y df_auxiliar.
+    """
+    dias_banco = df_banco['dia'].to_numpy().astype(np.int64)
+    dias_auxiliar = df_auxiliar['dia'].to_numpy().astype(np.int64)
+    return pd.DataFrame({
+        'id_banco': df_banco['id'].to_numpy()[pos_banco],
+        'id_auxiliar': df_auxiliar['id'].to_numpy()[pos_auxiliar],
+        'valor_rounded': df_banco['valor_rounded'].to_numpy()[pos_banco],
+        'valor_centavos': df_banco['valor_centavos'].to_numpy()[pos_banco],
+        'es_banco': df_banco['es'].to_numpy()[pos_banco],
+        'diff_dias': np.abs(dias_banco[pos_banco] - dias_auxiliar[pos_auxiliar])
+    })
 
-    # Copiar dataframes
-    df_banco_temp = df_banco.copy()
-    df_auxiliar_temp = df_auxiliar.copy()
+def encontrar_matches_exactos(df_banco: pd.DataFrame, df_auxiliar: pd.DataFrame, modo_asignacion: str = 'greedy') -> pd.DataFrame:
+    """
+    Busca matches EXACTOS por valor y día de la fecha.
     
-    print(f"Procesando {len(df_banco_temp)} banco vs {len(df_auxiliar_temp)} auxiliar para matches aproximados")
+    Args:
+        df_banco: DataFrame con transacciones bancarias.
+        df_auxiliar: DataFrame auxiliar.
+        modo_asignacion: 'greedy' (menor diferencia de días primero) u 'optimo'
+            (cardinalidad máxima por grupo de valor, ver utils/asignacion.py).
     
-    try:
-        # Asegurar que fecha_parsed sea datetime
-        df_banco_temp['fecha_dt'] = pd.to_datetime(df_banco_temp['fecha_parsed'], format='%Y-%m-%d', errors='coerce')
-        df_auxiliar_temp['fecha_dt'] = pd.to_datetime(df_auxiliar_temp['fecha_parsed'], format='%Y-%m-%d', errors='coerce')
-        # print(df_auxiliar_temp)
-        # print(df_banco_temp)
-    except Exception as e:
-        print(f"Error convirtiendo fechas: {e}")
+    Returns:
+        DataFrame con los matches exactos encontrados (relación 1:1).
+    """
+    candidatos = generar_candidatos_exactos(df_banco, df_auxiliar)
+    if candidatos.empty:
         return pd.DataFrame()
-    
-        # Renombrar columnas para el merge (Necesario para el cálculo de diferencia)
-    # df_banco_temp.rename(columns={'valor_rounded': 'valor_rounded_banco'}, inplace=True)
-    # df_auxiliar_temp.rename(columns={'valor_rounded': 'valor_rounded_auxiliar'}, inplace=True)
-    # print(df_banco_temp)
-    # print(df_banco_temp.columns)
-    # Merge basado en valor_rounded y rango_valor (sin fecha para permitir aproximación)
-    merged = pd.merge(
-        df_banco_temp, 
-        df_auxiliar_temp, 
-        on=['valor_rounded', 'rango_valor'], 
-        suffixes=('_banco', '_auxiliar')
+    matches_exactos = asignar_candidatos(candidatos, modo_asignacion)
+    return matches_exactos[['id_banco', 'id_auxiliar', 'valor_rounded', 'es_banco']].rename(
+        columns={'valor_rounded': 'valor_rounded_banco'}
     )
-    print(merged[['fecha_dt_banco', 'fecha_dt_auxiliar']])
-    if merged.empty:
-        print("No hay coincidencias por valor y rango")
+
+def join_por_valor_y_ventana_fechas(claves_banco, dias_banco, claves_auxiliar, dias_auxiliar, tolerancia_dias, max_por_fila=None):
+    """
+    Join por banda: devuelve los pares (posición banco, posición auxiliar) con la
+    misma clave de valor y una diferencia de fechas <= tolerancia_dias.
+
+    En lugar de un cruce completo por valor seguido de un filtro por fecha, ordena
+    el auxiliar por (clave, día) y ubica con searchsorted el rango de candidatos
+    de cada movimiento del banco, de modo que solo se generan los pares que caen
+    dentro de la ventana de ±tolerancia_dias.
+
+    Args:
+        claves_banco / claves_auxiliar: códigos enteros del valor (>= 0, -1 = descartar)
+        dias_banco / dias_auxiliar: fecha como número de día (int64)
+        tolerancia_dias: máxima diferencia de días permitida
+        max_por_fila: si se indica, cada movimiento del banco conserva como máximo
+            los max_por_fila candidatos más cercanos a cada lado de su fecha, lo que
+            acota los pares generados en bloques densos (ventanas amplias)
+
+    Returns:
+        Tupla (pos_banco, pos_auxiliar) ordenada por posición en banco y luego en auxiliar.
+    """
+    vacio = np.array([], dtype=np.int64)
+    claves_banco = np.asarray(claves_banco, dtype=np.int64)
+    claves_auxiliar = np.asarray(claves_auxiliar, dtype=np.int64)
+    dias_banco = np.asarray(dias_banco, dtype=np.int64)
+    dias_auxiliar = np.asarray(dias_auxiliar, dtype=np.int64)
+
+    validos_banco = np.flatnonzero(claves_banco >= 0)
+    validos_auxiliar = np.flatnonzero(claves_auxiliar >= 0)
+    if len(validos_banco) == 0 or len(validos_auxiliar) == 0:
+        return vacio, vacio
+
+    # Clave compuesta entera: (código de valor, día relativo con margen de tolerancia)
+    dia_minimo = min(dias_banco[validos_banco].min(), dias_auxiliar[validos_auxiliar].min())
+    compuesta_banco = (claves_banco[validos_banco] << 32) + (dias_banco[validos_banco] - dia_minimo + tolerancia_dias)
+    compuesta_auxiliar = (claves_auxiliar[validos_auxiliar] << 32) + (dias_auxiliar[validos_auxiliar] - dia_minimo + tolerancia_dias)
+
+    orden = np.argsort(compuesta_auxiliar, kind='stable')
+    ordenada = compuesta_auxiliar[orden]
+    inicio = np.searchsorted(ordenada, compuesta_banco - tolerancia_dias, side='left')
+    fin = np.searchsorted(ordenada, compuesta_banco + tolerancia_dias, side='right')
+    if max_por_fila is not None:
+        centro = np.searchsorted(ordenada, compuesta_banco, side='left')
+        inicio = np.maximum(inicio, centro - max_por_fila)
+        fin = np.minimum(fin, centro + max_por_fila)
+
+    cantidades = fin - inicio
+    total = int(cantidades.sum())
+    if total == 0:
+        return vacio, vacio
+
+    pos_banco = np.repeat(validos_banco, cantidades)
+    desplazamiento = np.arange(total) - np.repeat(np.cumsum(cantidades) - cantidades, cantidades)
+    pos_auxiliar = validos_auxiliar[orden[np.repeat(inicio, cantidades) + desplazamiento]]
+
+    # Mismo orden que un merge: por fila de banco y luego por fila de auxiliar
+    orden_pares = np.lexsort((pos_auxiliar, pos_banco))
+    return pos_banco[orden_pares], pos_auxiliar[orden_pares]
+
+def claves_valor_y_dia(df_banco: pd.DataFrame, df_auxiliar: pd.DataFrame, activos_banco=None, activos_auxiliar=None):
+    """
+    Prepara las entradas de join_por_valor_y_ventana_fechas: códigos enteros
+    compartidos para el valor (bloque por monto) y número de día de cada lado.
+    Los movimientos con valor o fecha inválidos, o fuera de las máscaras de
+    activos, quedan con código -1.
+
+    Returns:
+        Tupla (claves_banco, dias_banco, claves_auxiliar, dias_auxiliar).
+    """
+    codigos, _ = pd.factorize(np.concatenate([df_banco['valor_centavos'].to_numpy(), df_auxiliar['valor_centavos'].to_numpy()]))
+    dias_banco = df_banco['dia'].to_numpy().astype(np.int64)
+    dias_auxiliar = df_auxiliar['dia'].to_numpy().astype(np.int64)
+    invalidos_banco = (df_banco['valor_centavos'].to_numpy() == VALOR_INVALIDO) | (dias_banco == DIA_INVALIDO) | ~mascara_activos(df_banco, activos_banco)
+    invalidos_auxiliar = (df_auxiliar['valor_centavos'].to_numpy() == VALOR_INVALIDO) | (dias_auxiliar == DIA_INVALIDO) | ~mascara_activos(df_auxiliar, activos_auxiliar)
+    claves_banco = np.where(invalidos_banco, -1, codigos[:len(df_banco)])
+    claves_auxiliar = np.where(invalidos_auxiliar, -1, codigos[len(df_banco):])
+    return claves_banco, dias_banco, claves_auxiliar, dias_auxiliar
+
+def generar_candidatos_aproximados(df_banco: pd.DataFrame, df_auxiliar: pd.DataFrame, tolerancia_dias: int = None,
+                                   activos_banco=None, activos_auxiliar=None) -> pd.DataFrame:
+    """
+    Genera los pares candidatos por valor exacto con diferencia de fecha <= tolerancia_dias.
+
+    Usa un join por banda (join_por_valor_y_ventana_fechas) que solo genera
+    los pares candidatos dentro de la ventana de fechas, evitando el cruce
+    cuadrático cuando muchos movimientos comparten el mismo valor.
+
+    Args:
+        df_banco: DataFrame de movimientos del banco (con 'dia' y 'valor_centavos').
+        df_auxiliar: DataFrame de movimientos del auxiliar.
+        tolerancia_dias: Diferencia máxima de días. Por defecto TOLERANCIA_DIAS_APROXIMADO.
+        activos_banco / activos_auxiliar: Máscaras opcionales de movimientos a considerar.
+
+    Returns:
+        DataFrame con columnas id_banco, id_auxiliar, valor_rounded, valor_centavos,
+        es_banco y diff_dias.
+    """
+    if df_banco.empty or df_auxiliar.empty:
         return pd.DataFrame()
-    
-    print(f"Encontradas {len(merged)} combinaciones por valor/rango")
-    
-    # Calcular la diferencia de días entre las fechas
-    merged['diff_dias'] = abs(merged['fecha_dt_banco'] - merged['fecha_dt_auxiliar']).dt.days
-    # print(merged)
-    # print(merged.columns)
-    # Filtrar por diferencia de días <= 2
-    matches_fecha_aprox = merged[merged['diff_dias'] <= 2].copy()
-    # print(matches_fecha_aprox, 'matchs aproximados')
-    if matches_fecha_aprox.empty:
-        print("No hay matches con diferencia de fecha <= 2 días")
+    if tolerancia_dias is None:
+        tolerancia_dias = TOLERANCIA_DIAS_APROXIMADO
+
+    print(f"Procesando {mascara_activos(df_banco, activos_banco).sum()} banco vs {mascara_activos(df_auxiliar, activos_auxiliar).sum()} "
+          f"auxiliar para matches aproximados (±{tolerancia_dias} días)")
+
+    pos_banco, pos_auxiliar = join_por_valor_y_ventana_fechas(
+        *claves_valor_y_dia(df_banco, df_auxiliar, activos_banco, activos_auxiliar), tolerancia_dias
+    )
+    if len(pos_banco) == 0:
+        print(f"No hay matches con diferencia de fecha <= {tolerancia_dias} días")
         return pd.DataFrame()
-    
-    print(f"Encontrados {len(matches_fecha_aprox)} matches con diferencia <= 2 días")
-    
 
-    # if matches_finales.empty:
-    #     print("No hay matches que superen el umbral de similitud del 85%")
-    #     return pd.DataFrame()
-    
-    # Ordenar por similitud descendente
-    matches_finales = matches_fecha_aprox.copy()
-    # print(matches_finales, 'matchs finales 1') 
-    # matches_finales = matches_finales.sort_values('similitud', ascending=False)
-    
-    # Eliminar duplicados para asegurar relación 1:1
-    matches_finales = matches_finales.drop_duplicates(subset=['id_banco'], keep='first')
-    matches_finales = matches_finales.drop_duplicates(subset=['id_auxiliar'], keep='first')
-    # print(matches_finales, 'matchs finales')
+    print(f"Encontrados {len(pos_banco)} candidatos con diferencia <= {tolerancia_dias} días")
+    return construir_candidatos(df_banco, df_auxiliar, pos_banco, pos_auxiliar)
+
+def encontrar_matches_valor_fecha_aproximada(df_banco: pd.DataFrame, df_auxiliar: pd.DataFrame, tolerancia_dias: int = None, modo_asignacion: str = 'greedy') -> pd.DataFrame:
+    """
+    Busca matches por valor exacto permitiendo una diferencia de fecha <= tolerancia_dias.
+
+    Args:
+        df_banco: DataFrame de movimientos del banco.
+        df_auxiliar: DataFrame de movimientos del auxiliar.
+        tolerancia_dias: Diferencia máxima de días. Por defecto TOLERANCIA_DIAS_APROXIMADO.
+        modo_asignacion: 'greedy' u 'optimo' (ver utils/asignacion.py).
+
+    Returns:
+        DataFrame con los matches aproximados encontrados (relación 1:1).
+    """
+    candidatos = generar_candidatos_aproximados(df_banco, df_auxiliar, tolerancia_dias)
+    if candidatos.empty:
+        return pd.DataFrame()
+    matches_finales = asignar_candidatos(candidatos, modo_asignacion)
     print(f"✓ Matches aproximados finales: {len(matches_finales)}")
-    print(matches_finales.columns)
-    # CORRECCIÓN: Devolver el DataFrame con el nombre correcto
-    #matches_exactos[['id_banco', 'id_auxiliar', 'valor_rounded_banco', 'es_banco']]
     return matches_finales[['id_banco', 'id_auxiliar', 'valor_rounded', 'es_banco']]
 
+def similitudes_descripcion(descripciones_banco, descripciones_auxiliar, palabras_banco, palabras_auxiliar,
+                            referencias_banco, referencias_auxiliar, umbral=0.0):
+    """
+    Calcula calcular_similitud_descripcion_mejorada para una lista de pares con
+    palabras y referencias ya extraídas.
+
+    Jaccard y referencias son baratos; SequenceMatcher solo se ejecuta si con
+    sus cotas superiores (real_quick_ratio, quick_ratio) el par aún puede
+    alcanzar el umbral. Los pares descartados quedan con similitud 0.0.
+
+    Returns:
+        np.ndarray de float64 con la similitud de cada par.
+    """
+    similitudes = np.zeros(len(descripciones_banco), dtype=np.float64)
+    pares = zip(descripciones_banco, descripciones_auxiliar, palabras_banco, palabras_auxiliar,
+                referencias_banco, referencias_auxiliar)
+    for i, (desc1, desc2, words1, words2, refs1, refs2) in enumerate(pares):
+        if not desc1 or not desc2:
+            continue
+        if not words1 or not words2:
+            jaccard = 0.0
+        else:
+            union = len(words1 | words2)
+            jaccard = len(words1 & words2) / union if union > 0 else 0.0
+        similitud_clave = len(refs1 & refs2) / max(len(words1), len(words2), 1)
+        base = (jaccard * 0.4) + (similitud_clave * 0.2)
+
+        matcher = SequenceMatcher(None, desc1, desc2)
+        if base + matcher.real_quick_ratio() * 0.4 < umbral or base + matcher.quick_ratio() * 0.4 < umbral:
+            continue
+        similitud = (jaccard * 0.4) + (matcher.ratio() * 0.4) + (similitud_clave * 0.2)
+        similitudes[i] = min(similitud, 1.0)
+    return similitudes
+
+def generar_candidatos_valor_descripcion(df_banco: pd.DataFrame, df_auxiliar: pd.DataFrame, ventana_dias: int = None,
+                                         umbral: float = None, max_candidatos: int = None,
+                                         activos_banco=None, activos_auxiliar=None) -> pd.DataFrame:
+    """
+    Genera pares candidatos por valor exacto y descripción similar.
+
+    Los candidatos se agrupan en bloques (mismo valor y fechas a menos de
+    ventana_dias); cada movimiento del banco compara su descripción solo con los
+    max_candidatos movimientos del auxiliar más cercanos en fecha de su bloque.
+
+    Args:
+        df_banco: DataFrame de movimientos del banco.
+        df_auxiliar: DataFrame de movimientos del auxiliar.
+        ventana_dias: Ventana de fechas del bloque. Por defecto VENTANA_DIAS_DESCRIPCION.
+        umbral: Similitud mínima (0-1). Por defecto UMBRAL_SIMILITUD_DESCRIPCION.
+        max_candidatos: Candidatos por movimiento del banco. Por defecto MAX_CANDIDATOS_DESCRIPCION.
+        activos_banco / activos_auxiliar: Máscaras opcionales de movimientos a considerar.
+
+    Returns:
+        DataFrame con las columnas de construir_candidatos más 'similitud'.
+    """
+    if df_banco.empty or df_auxiliar.empty:
+        return pd.DataFrame()
+    ventana_dias = VENTANA_DIAS_DESCRIPCION if ventana_dias is None else ventana_dias
+    umbral = UMBRAL_SIMILITUD_DESCRIPCION if umbral is None else umbral
+    max_candidatos = MAX_CANDIDATOS_DESCRIPCION if max_candidatos is None else max_candidatos
+
+    print(f"Procesando {mascara_activos(df_banco, activos_banco).sum()} banco vs {mascara_activos(df_auxiliar, activos_auxiliar).sum()} "
+          f"auxiliar para matches por descripción (±{ventana_dias} días, umbral {umbral}, máx. {max_candidatos} candidatos)")
+
+    pos_banco, pos_auxiliar = join_por_valor_y_ventana_fechas(
+        *claves_valor_y_dia(df_banco, df_auxiliar, activos_banco, activos_auxiliar), ventana_dias, max_por_fila=max_candidatos
+    )
+    if len(pos_banco) == 0:
+        print("No hay candidatos por valor dentro de la ventana de fechas")
+        return pd.DataFrame()
+
+    candidatos = construir_candidatos(df_banco, df_auxiliar, pos_banco, pos_auxiliar)
+
+    # Tope de candidatos por movimiento del banco: los más cercanos en fecha
+    orden = np.lexsort((candidatos['diff_dias'].to_numpy(), pos_banco))
+    rango = np.arange(len(orden)) - np.searchsorted(pos_banco[orden], pos_banco[orden], side='left')
+    conservar = np.sort(orden[rango < max_candidatos])
+    candidatos = candidatos.iloc[conservar].reset_index(drop=True)
+    pos_banco, pos_auxiliar = pos_banco[conservar], pos_auxiliar[conservar]
+
+    # Palabras y conjuntos de referencias solo de los movimientos que aparecen en algún candidato
+    descripciones_banco = df_banco['descripcion_clean'].to_numpy()
+    descripciones_auxiliar = df_auxiliar['descripcion_clean'].to_numpy()
+    usados_banco, inversa_banco = np.unique(pos_banco, return_inverse=True)
+    usados_auxiliar, inversa_auxiliar = np.unique(pos_auxiliar, return_inverse=True)
+    palabras_banco = palabras_descripcion_columna(descripciones_banco[usados_banco])
+    palabras_auxiliar = palabras_descripcion_columna(descripciones_auxiliar[usados_auxiliar])
+    referencias_banco = referencias_desde_texto(df_banco['referencias'].to_numpy()[usados_banco])
+    referencias_auxiliar = referencias_desde_texto(df_auxiliar['referencias'].to_numpy()[usados_auxiliar])
+    similitudes = similitudes_descripcion(
+        descripciones_banco[pos_banco], descripciones_auxiliar[pos_auxiliar],
+        palabras_banco[inversa_banco], palabras_auxiliar[inversa_auxiliar],
+        referencias_banco[inversa_banco], referencias_auxiliar[inversa_auxiliar], umbral
+    )
+
+    candidatos['similitud'] = similitudes
+    candidatos = candidatos[similitudes >= umbral].reset_index(drop=True)
+    print(f"Encontrados {len(candidatos)} candidatos con similitud >= {umbral} (de {len(similitudes)} comparados)")
+    return candidatos
+
+def encontrar_matches_valor_descripcion(df_banco: pd.DataFrame, df_auxiliar: pd.DataFrame, ventana_dias: int = None,
+                                        umbral: float = None, max_candidatos: int = None, modo_asignacion: str = 'greedy') -> pd.DataFrame:
+    """
+    Busca matches por valor exacto y descripción similar (ver generar_candidatos_valor_descripcion).
+    La asignación 1:1 prioriza los pares de mayor similitud.
+
+    Returns:
+        DataFrame con columnas id_banco, id_auxiliar, valor_rounded, es_banco y similitud.
+    """
+    candidatos = generar_candidatos_valor_descripcion(df_banco, df_auxiliar, ventana_dias, umbral, max_candidatos)
+    if candidatos.empty:
+        return pd.DataFrame()
+    matches_finales = asignar_candidatos(candidatos, modo_asignacion, prioridad=-candidatos['similitud'].to_numpy())
+    print(f"✓ Matches por valor y descripción finales: {len(matches_finales)}")
+    return matches_finales[['id_banco', 'id_auxiliar', 'valor_rounded', 'es_banco', 'similitud']]
+
+def join_por_tolerancia_valor(centavos_banco, dias_banco, centavos_auxiliar, dias_auxiliar, tolerancias_centavos, tolerancia_dias):
+    """
+    Devuelve los pares (posición banco, posición auxiliar) con |diferencia de
+    centavos| <= tolerancia del movimiento del banco y |diferencia de días| <= tolerancia_dias.
+
+    El auxiliar se ordena por la clave compuesta (día, centavos) y, para cada
+    desplazamiento de días de la ventana, searchsorted ubica el rango de valores
+    admitidos de cada movimiento del banco. Solo se generan pares que cumplen
+    ambas cotas, sin cruces por valor ni por fecha.
+
+    Args:
+        centavos_banco / centavos_auxiliar: valores en centavos (VALOR_INVALIDO = descartar)
+        dias_banco / dias_auxiliar: número de día (DIA_INVALIDO = descartar)
+        tolerancias_centavos: diferencia máxima de centavos admitida por movimiento del banco
+        tolerancia_dias: máxima diferencia de días permitida
+
+    Returns:
+        Tupla (pos_banco, pos_auxiliar) ordenada por posición en banco y luego en auxiliar.
+    """
+    vacio = np.array([], dtype=np.int64)
+    centavos_banco = np.asarray(centavos_banco, dtype=np.int64)
+    centavos_auxiliar = np.asarray(centavos_auxiliar, dtype=np.int64)
+    dias_banco = np.asarray(dias_banco, dtype=np.int64)
+    dias_auxiliar = np.asarray(dias_auxiliar, dtype=np.int64)
+    tolerancias_centavos = np.asarray(tolerancias_centavos, dtype=np.int64)
+
+    validos_banco = np.flatnonzero((centavos_banco != VALOR_INVALIDO) & (dias_banco != DIA_INVALIDO))
+    validos_auxiliar = np.flatnonzero((centavos_auxiliar != VALOR_INVALIDO) & (dias_auxiliar != DIA_INVALIDO))
+    if len(validos_banco) == 0 or len(validos_auxiliar) == 0:
+        return vacio, vacio
+
+    tolerancias = tolerancias_centavos[validos_banco]
+    centavos_b, centavos_a = centavos_banco[validos_banco], centavos_auxiliar[validos_auxiliar]
+    centavo_minimo = min(centavos_b.min(), centavos_a.min()) - tolerancias.max()
+    dia_minimo = min(dias_banco[validos_banco].min(), dias_auxiliar[validos_auxiliar].min()) - tolerancia_dias
+    # Cada día ocupa un tramo de 'ancho' claves, suficiente para cualquier valor ± tolerancia
+    ancho = max(centavos_b.max(), centavos_a.max()) + tolerancias.max() - centavo_minimo + 1
+
+    compuesta_auxiliar = (dias_auxiliar[validos_auxiliar] - dia_minimo) * ancho + (centavos_a - centavo_minimo)
+    orden = np.argsort(compuesta_auxiliar, kind='stable')
+    ordenada = compuesta_auxiliar[orden]
+
+    bloques_banco, bloques_auxiliar = [], []
+    for desplazamiento in range(-tolerancia_dias, tolerancia_dias + 1):
+        base = (dias_banco[validos_banco] + desplazamiento - dia_minimo) * ancho + (centavos_b - centavo_minimo)
+        inicio = np.searchsorted(ordenada, base - tolerancias, side='left')
+        fin = np.searchsorted(ordenada, base + tolerancias, side='right')
+        cantidades = fin - inicio
+        total = int(cantidades.sum())
+        if total == 0:
+            continue
+        offset = np.arange(total) - np.repeat(np.cumsum(cantidades) - cantidades, cantidades)
+        bloques_banco.append(np.repeat(validos_banco, cantidades))
+        bloques_auxiliar.append(validos_auxiliar[orden[np.repeat(inicio, cantidades) + offset]])
+    if not bloques_banco:
+        return vacio, vacio
+
+    pos_banco = np.concatenate(bloques_banco)
+    pos_auxiliar = np.concatenate(bloques_auxiliar)
+    orden_pares = np.lexsort((pos_auxiliar, pos_banco))
+    return pos_banco[orden_pares], pos_auxiliar[orden_pares]
+
+def tolerancias_valor_centavos(centavos_banco, tolerancia_absoluta: float = None, tolerancia_porcentaje: float = None) -> np.ndarray:
+    """
+    Diferencia máxima admitida (en centavos) para cada valor del banco: la mayor
+    entre la tolerancia absoluta y la porcentual sobre el valor.
+    """
+    tolerancia_absoluta = TOLERANCIA_VALOR_ABSOLUTA if tolerancia_absoluta is None else tolerancia_absoluta
+    tolerancia_porcentaje = TOLERANCIA_VALOR_PORCENTAJE if tolerancia_porcentaje is None else tolerancia_porcentaje
+    centavos_banco = np.asarray(centavos_banco, dtype=np.int64)
+    return np.maximum(
+        np.int64(round(tolerancia_absoluta * 100)),
+        np.floor(np.abs(centavos_banco) * tolerancia_porcentaje / 100).astype(np.int64)
+    )
+
+def generar_candidatos_tolerancia_valor(df_banco: pd.DataFrame, df_auxiliar: pd.DataFrame, tolerancia_dias: int = None,
+                                        tolerancia_absoluta: float = None, tolerancia_porcentaje: float = None,
+                                        activos_banco=None, activos_auxiliar=None) -> pd.DataFrame:
+    """
+    Genera pares candidatos cuyo valor difiere como máximo en la tolerancia de
+    valor y cuya fecha difiere como máximo en tolerancia_dias.
+
+    Args:
+        df_banco: DataFrame de movimientos del banco.
+        df_auxiliar: DataFrame de movimientos del auxiliar.
+        tolerancia_dias: Diferencia máxima de días. Por defecto TOLERANCIA_DIAS_APROXIMADO.
+        tolerancia_absoluta: Diferencia máxima en pesos. Por defecto TOLERANCIA_VALOR_ABSOLUTA.
+        tolerancia_porcentaje: Diferencia máxima en % del valor del banco. Por defecto TOLERANCIA_VALOR_PORCENTAJE.
+        activos_banco / activos_auxiliar: Máscaras opcionales de movimientos a considerar.
+
+    Returns:
+        DataFrame con las columnas de construir_candidatos más 'diferencia_centavos'
+        (banco - auxiliar) y 'diferencia_valor' (en pesos).
+    """
+    if df_banco.empty or df_auxiliar.empty:
+        return pd.DataFrame()
+    tolerancia_dias = TOLERANCIA_DIAS_APROXIMADO if tolerancia_dias is None else tolerancia_dias
+    tolerancia_absoluta = TOLERANCIA_VALOR_ABSOLUTA if tolerancia_absoluta is None else tolerancia_absoluta
+    tolerancia_porcentaje = TOLERANCIA_VALOR_PORCENTAJE if tolerancia_porcentaje is None else tolerancia_porcentaje
+    if tolerancia_absoluta <= 0 and tolerancia_porcentaje <= 0:
+        return pd.DataFrame()
+
+    activos_banco = mascara_activos(df_banco, activos_banco)
+    activos_auxiliar = mascara_activos(df_auxiliar, activos_auxiliar)
+    print(f"Procesando {activos_banco.sum()} banco vs {activos_auxiliar.sum()} auxiliar para matches con tolerancia de valor "
+          f"(±{tolerancia_absoluta} pesos / ±{tolerancia_porcentaje}%, ±{tolerancia_dias} días)")
+
+    centavos_banco = df_banco['valor_centavos'].to_numpy()
+    centavos_auxiliar = df_auxiliar['valor_centavos'].to_numpy()
+    tolerancias = tolerancias_valor_centavos(centavos_banco, tolerancia_absoluta, tolerancia_porcentaje)
+    pos_banco, pos_auxiliar = join_por_tolerancia_valor(
+        np.where(activos_banco, centavos_banco, VALOR_INVALIDO), df_banco['dia'].to_numpy(),
+        np.where(activos_auxiliar, centavos_auxiliar, VALOR_INVALIDO), df_auxiliar['dia'].to_numpy(),
+        tolerancias, tolerancia_dias
+    )
+    if len(pos_banco) == 0:
+        print("No hay candidatos dentro de la tolerancia de valor")
+        return pd.DataFrame()
+
+    candidatos = construir_candidatos(df_banco, df_auxiliar, pos_banco, pos_auxiliar)
+    candidatos['diferencia_centavos'] = centavos_banco[pos_banco] - centavos_auxiliar[pos_auxiliar]
+    candidatos['diferencia_valor'] = candidatos['diferencia_centavos'] / 100
+    print(f"Encontrados {len(candidatos)} candidatos dentro de la tolerancia de valor")
+    return candidatos
+
+def asignar_candidatos_tolerancia_valor(candidatos: pd.DataFrame, modo_asignacion: str = 'greedy') -> pd.DataFrame:
+    """
+    Asignación 1:1 de los candidatos con tolerancia de valor: primero la menor
+    diferencia de valor y, a igualdad, la menor diferencia de días.
+    """
+    if candidatos.empty:
+        return asignar_candidatos(candidatos, modo_asignacion)
+    prioridad = np.abs(candidatos['diferencia_centavos'].to_numpy()) * (int(candidatos['diff_dias'].max()) + 1) + candidatos['diff_dias'].to_numpy()
+    return asignar_candidatos(candidatos, modo_asignacion, prioridad=prioridad, grupos='componentes')
+
+def encontrar_matches_tolerancia_valor(df_banco: pd.DataFrame, df_auxiliar: pd.DataFrame, tolerancia_dias: int = None,
+                                       tolerancia_absoluta: float = None, tolerancia_porcentaje: float = None,
+                                       modo_asignacion: str = 'greedy') -> pd.DataFrame:
+    """
+    Busca matches con diferencia de valor dentro de la tolerancia (ver generar_candidatos_tolerancia_valor).
+
+    Returns:
+        DataFrame con columnas id_banco, id_auxiliar, valor_rounded, es_banco y diferencia_valor.
+    """
+    candidatos = generar_candidatos_tolerancia_valor(df_banco, df_auxiliar, tolerancia_dias, tolerancia_absoluta, tolerancia_porcentaje)
+    if candidatos.empty:
+        return pd.DataFrame()
+    matches_finales = asignar_candidatos_tolerancia_valor(candidatos, modo_asignacion)
+    print(f"✓ Matches con tolerancia de valor finales: {len(matches_finales)}")
+    return matches_finales[['id_banco', 'id_auxiliar', 'valor_rounded', 'es_banco', 'diferencia_valor']]
+
+def crear_presupuesto_grupos(partes=1):
+    """
+    Presupuesto de búsqueda de grupos según la configuración; con partes > 1,
+    la fracción que le corresponde a cada parte de la ejecución (ej. entradas y salidas).
+    """
+    return PresupuestoBusqueda(TIEMPO_MAX_GRUPOS / partes, MAX_COMBINACIONES_GRUPOS // partes)
+
+def encontrar_grupos_por_suma(df_banco: pd.DataFrame, df_auxiliar: pd.DataFrame, max_movimientos: int = None,
+                              ventana_dias: int = None, max_candidatos: int = None, presupuesto: PresupuestoBusqueda = None,
+                              ids_nuevos=None, activos_banco=None, activos_auxiliar=None) -> pd.DataFrame:
+    """
+    Busca conciliaciones N:1 / 1:N: un movimiento de un lado cuyo valor es la
+    suma exacta de 2..max_movimientos movimientos del otro lado dentro de la
+    ventana de fechas (ver utils/subconjuntos.py).
+
+    Primero se buscan movimientos del auxiliar partidos en el banco (1:N) y
+    luego, con los movimientos restantes, los del banco partidos en el auxiliar (N:1).
+
+    Args:
+        df_banco: DataFrame de movimientos del banco.
+        df_auxiliar: DataFrame de movimientos del auxiliar.
+        max_movimientos: Máximo de movimientos por grupo. Por defecto MAX_MOVIMIENTOS_GRUPO.
+        ventana_dias: Diferencia máxima de días. Por defecto VENTANA_DIAS_GRUPO.
+        max_candidatos: Candidatos por movimiento. Por defecto MAX_CANDIDATOS_GRUPO.
+        presupuesto: Límites de tiempo/combinaciones. Por defecto crear_presupuesto_grupos().
+        ids_nuevos: En la conciliación incremental, ids de los movimientos nuevos; solo se
+            buscan grupos que incluyan alguno de ellos.
+        activos_banco / activos_auxiliar: Máscaras opcionales de movimientos a considerar.
+
+    Returns:
+        DataFrame con una fila por grupo: ids_banco, ids_auxiliar (listas) y es_banco.
+        attrs['pares_candidatos'] indica los pares (consolidado, parcial) evaluados.
+    """
+    max_movimientos = MAX_MOVIMIENTOS_GRUPO if max_movimientos is None else max_movimientos
+    ventana_dias = VENTANA_DIAS_GRUPO if ventana_dias is None else ventana_dias
+    max_candidatos = MAX_CANDIDATOS_GRUPO if max_candidatos is None else max_candidatos
+    presupuesto = crear_presupuesto_grupos() if presupuesto is None else presupuesto
+    if df_banco.empty or df_auxiliar.empty or max_movimientos < 2:
+        return pd.DataFrame()
+    # El tiempo de las etapas anteriores no cuenta para el presupuesto de grupos
+    presupuesto.iniciar()
+
+    activos_banco = mascara_activos(df_banco, activos_banco)
+    activos_auxiliar = mascara_activos(df_auxiliar, activos_auxiliar)
+    print(f"Procesando {activos_banco.sum()} banco vs {activos_auxiliar.sum()} auxiliar para grupos por suma "
+          f"(hasta {max_movimientos} movimientos, ±{ventana_dias} días)")
+
+    def centavos_validos(df, activos):
+        # Sin fecha válida el movimiento no puede entrar en ninguna ventana
+        return np.where((df['dia'].to_numpy() == DIA_INVALIDO) | ~activos, VALOR_INVALIDO, df['valor_centavos'].to_numpy())
+
+    centavos_banco, centavos_auxiliar = centavos_validos(df_banco, activos_banco), centavos_validos(df_auxiliar, activos_auxiliar)
+    dias_banco, dias_auxiliar = df_banco['dia'].to_numpy(), df_auxiliar['dia'].to_numpy()
+    ids_banco, ids_auxiliar = df_banco['id'].to_numpy(), df_auxiliar['id'].to_numpy()
+    nuevos_banco = nuevos_auxiliar = None
+    if ids_nuevos is not None:
+        nuevos_banco, nuevos_auxiliar = np.isin(ids_banco, ids_nuevos), np.isin(ids_auxiliar, ids_nuevos)
+
+    grupos = []
+    estadisticas = {'pares_candidatos': 0}
+    # 1:N - un movimiento del auxiliar = suma de varios del banco
+    for pos_auxiliar, posiciones_banco in buscar_grupos_por_suma(
+            centavos_auxiliar, dias_auxiliar, centavos_banco, dias_banco,
+            max_movimientos, ventana_dias, max_candidatos, presupuesto, nuevos_auxiliar, nuevos_banco, estadisticas):
+        grupos.append((ids_banco[posiciones_banco].tolist(), [ids_auxiliar[pos_auxiliar].item()]))
+        centavos_banco[posiciones_banco] = VALOR_INVALIDO
+        centavos_auxiliar[pos_auxiliar] = VALOR_INVALIDO
+
+    # N:1 - un movimiento del banco = suma de varios del auxiliar
+    for pos_banco, posiciones_auxiliar in buscar_grupos_por_suma(
+            centavos_banco, dias_banco, centavos_auxiliar, dias_auxiliar,
+            max_movimientos, ventana_dias, max_candidatos, presupuesto, nuevos_banco, nuevos_auxiliar, estadisticas):
+        grupos.append(([ids_banco[pos_banco].item()], ids_auxiliar[posiciones_auxiliar].tolist()))
+
+    if presupuesto.agotado:
+        print("⚠ Búsqueda de grupos por suma interrumpida: se agotó el presupuesto de tiempo/combinaciones")
+    if not grupos:
+        resultado = pd.DataFrame()
+    else:
+        print(f"✓ Grupos por suma encontrados: {len(grupos)}")
+        resultado = pd.DataFrame({
+            'ids_banco': [banco for banco, _ in grupos],
+            'ids_auxiliar': [auxiliar for _, auxiliar in grupos],
+            'es_banco': df_banco['es'].iloc[0]
+        })
+    resultado.attrs['pares_candidatos'] = estadisticas['pares_candidatos']
+    return resultado
+
 
 def crear_match_y_actualizar_movimientos(mov_banco, mov_auxiliar, conciliacion_id, db, criterio, diferencia=0.0):
     """
@@ -294,149 +1040,486 @@ def verificar_conciliacion_completa(conciliacion_id, db):
             print("✅ Conciliación marcada como finalizada")
 
 
+def diferencias_matches(matches_df):
+    """
+    Diferencia guardada en cada match según el tipo de match (lista de float).
+    """
+    if 'diferencia_valor' in matches_df.columns:
+        return matches_df['diferencia_valor'].astype(float).tolist()  # Diferencia real banco - auxiliar
+    if 'diferencia_dias' in matches_df.columns:
+        return matches_df['diferencia_dias'].astype(float).tolist()
+    if 'similitud' in matches_df.columns:
+        return (1.0 - matches_df['similitud'].astype(float)).tolist()  # Convertir similitud a diferencia
+    return [0.0] * len(matches_df)
+
 def procesar_matches(matches_df, criterio, conciliacion_id, db):
     """
-    Procesa los matches encontrados y los guarda en base de datos
+    Procesa los matches encontrados y los guarda en base de datos en bloque:
+    un INSERT multi-fila de ConciliacionMatch y un UPDATE ... WHERE id IN (...)
+    por lote de movimientos, todo en una sola transacción (la de la unidad de
+    trabajo externa, si la hay).
     
     Args:
         matches_df: DataFrame con los matches encontrados
         criterio: Tipo de criterio ('exacto', 'aproximado', etc.)
         conciliacion_id: ID de la conciliación
         db: Sesión de base de datos
+
+    Returns:
+        Cantidad de matches creados
     """
+    if matches_df.empty:
+        return 0
+
     factory = RepositoryFactory(db)
     movimiento_repo = factory.get_movimiento_repository()
-    
-    matches_creados = []
-    
-    for _, match_row in matches_df.iterrows():
-        # Obtener los movimientos originales
-        mov_banco = movimiento_repo.get_by_id(match_row['id_banco'])
-        mov_auxiliar = movimiento_repo.get_by_id(match_row['id_auxiliar'])
-        
-        if mov_banco and mov_auxiliar:
-            # Determinar la diferencia según el tipo de match
-            if 'diferencia_dias' in match_row:
-                diferencia = match_row['diferencia_dias']
-            elif 'similitud' in match_row:
-                diferencia = 1.0 - match_row['similitud']  # Convertir similitud a diferencia
-            else:
-                diferencia = 0.0
-            
-            # Crear el match usando la función de repositorio
-            match_obj = crear_match_y_actualizar_movimientos(
-                mov_banco, 
-                mov_auxiliar, 
-                conciliacion_id, 
-                db, 
-                criterio, 
-                diferencia
-            )
-            
-            matches_creados.append(match_obj)
-    
-    return matches_creados
+    match_repo = factory.get_match_repository()
+
+    diferencias = diferencias_matches(matches_df)
+    ids_banco = matches_df['id_banco'].astype(int).tolist()
+    ids_auxiliar = matches_df['id_auxiliar'].astype(int).tolist()
+    fecha_match = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    matches_data = [
+        {
+            "id_conciliacion": conciliacion_id,
+            "id_movimiento_banco": id_banco,
+            "id_movimiento_auxiliar": id_auxiliar,
+            "fecha_match": fecha_match,
+            "criterio_match": criterio,
+            "diferencia_valor": diferencia
+        }
+        for id_banco, id_auxiliar, diferencia in zip(ids_banco, ids_auxiliar, diferencias)
+    ]
+
+    with factory.unit_of_work():
+        match_repo.insert_bulk(matches_data)
+        movimiento_repo.set_estado_bulk(ids_banco + ids_auxiliar, "conciliado")
+
+    return len(matches_data)
+
+def procesar_grupos(grupos_df, conciliacion_id, db):
+    """
+    Guarda los grupos N:1 / 1:N en las tablas de conciliación manual
+    (ConciliacionManual con sus movimientos de banco y auxiliar) y marca los
+    movimientos como conciliados, todo en una sola transacción.
+
+    Args:
+        grupos_df: DataFrame de encontrar_grupos_por_suma
+        conciliacion_id: ID de la conciliación
+        db: Sesión de base de datos
 
-def procesar_conciliacion_por_tipo(df_banco, df_auxiliar, tipo_es, conciliacion_id, db):
-    # print(df_banco)
-    # print(df_auxiliar)
+    Returns:
+        Cantidad de grupos creados
     """
-    Procesa la conciliación para un tipo específico (E o S)
+    if grupos_df.empty:
+        return 0
+
+    factory = RepositoryFactory(db)
+    movimiento_repo = factory.get_movimiento_repository()
+    manual_repo = factory.get_manual_repository()
+
+    grupos = list(zip(grupos_df['ids_banco'], grupos_df['ids_auxiliar']))
+    ids_movimientos = [int(i) for banco, auxiliar in grupos for i in banco + auxiliar]
+    try:
+        with factory.unit_of_work():
+            manual_repo.insert_grupos_bulk(conciliacion_id, grupos)
+            movimiento_repo.set_estado_bulk(ids_movimientos, "conciliado")
+    except Exception as e:
+        print(f"Error al guardar grupos por suma: {str(e)}")
+        raise
+
+    print(f"Guardados {len(grupos)} grupos por suma ({len(ids_movimientos)} movimientos)")
+    return len(grupos)
+
+class EstrategiaMatching(ABC):
     """
+    Etapa del pipeline de conciliación automática.
+
+    Cada estrategia recibe los DataFrames completos de banco y auxiliar junto con
+    las máscaras booleanas de los movimientos todavía libres (las etapas previas
+    las van apagando) y devuelve la cantidad de pares candidatos evaluados y el
+    DataFrame de matches asignados.
+    """
+    nombre = None  # prefijo del criterio guardado, ej. 'exacto' -> 'exacto_E'
+    clave_stats = None  # clave de stats_tipo con la cantidad de matches
+
+    @abstractmethod
+    def buscar(self, df_banco, df_auxiliar, activos_banco, activos_auxiliar, contexto):
+        """Devuelve (pares candidatos evaluados, DataFrame de matches asignados)"""
+        pass
+
+    def diferencia_maxima_centavos(self, centavos_banco):
+        """Diferencia de valor (en centavos, en valor absoluto) que admite la estrategia en un par."""
+        return 0
+
+    def ids_conciliados(self, matches):
+        """Ids (banco, auxiliar) de los movimientos conciliados por los matches."""
+        return matches['id_banco'].to_numpy(), matches['id_auxiliar'].to_numpy()
+
+    def registrar_stats(self, stats_tipo, matches):
+        stats_tipo[self.clave_stats] = len(matches)
+        stats_tipo['pares_adicionales_optimo'] += len(matches) - matches.attrs['pares_greedy']
+
+    def asignar(self, candidatos, contexto):
+        return len(candidatos), asignar_candidatos(candidatos, contexto['modo_asignacion'])
+
+class EstrategiaExacta(EstrategiaMatching):
+    """Valor exacto y mismo día del mes."""
+    nombre = 'exacto'
+    clave_stats = 'matches_exactos'
+
+    def buscar(self, df_banco, df_auxiliar, activos_banco, activos_auxiliar, contexto):
+        return self.asignar(generar_candidatos_exactos(df_banco, df_auxiliar, activos_banco, activos_auxiliar), contexto)
+
+class EstrategiaAproximada(EstrategiaMatching):
+    """Valor exacto y fecha dentro de la tolerancia de días."""
+    nombre = 'aproximado'
+    clave_stats = 'matches_aproximados'
+
+    def buscar(self, df_banco, df_auxiliar, activos_banco, activos_auxiliar, contexto):
+        candidatos = generar_candidatos_aproximados(
+            df_banco, df_auxiliar, contexto['tolerancia_dias'], activos_banco=activos_banco, activos_auxiliar=activos_auxiliar
+        )
+        return self.asignar(candidatos, contexto)
+
+class EstrategiaValorDescripcion(EstrategiaMatching):
+    """Valor exacto y descripción similar en una ventana de fechas amplia."""
+    nombre = 'valor_descripcion'
+    clave_stats = 'matches_valor_descripcion'
+
+    def buscar(self, df_banco, df_auxiliar, activos_banco, activos_auxiliar, contexto):
+        candidatos = generar_candidatos_valor_descripcion(
+            df_banco, df_auxiliar, activos_banco=activos_banco, activos_auxiliar=activos_auxiliar
+        )
+        matches = asignar_candidatos(
+            candidatos, contexto['modo_asignacion'],
+            prioridad=-candidatos['similitud'].to_numpy() if not candidatos.empty else None
+        )
+        return len(candidatos), matches
+
+class EstrategiaToleranciaValor(EstrategiaMatching):
+    """Diferencia de valor dentro de la tolerancia y fecha cercana."""
+    nombre = 'tolerancia_valor'
+    clave_stats = 'matches_tolerancia_valor'
+
+    def buscar(self, df_banco, df_auxiliar, activos_banco, activos_auxiliar, contexto):
+        candidatos = generar_candidatos_tolerancia_valor(
+            df_banco, df_auxiliar, contexto['tolerancia_dias'], activos_banco=activos_banco, activos_auxiliar=activos_auxiliar
+        )
+        return len(candidatos), asignar_candidatos_tolerancia_valor(candidatos, contexto['modo_asignacion'])
+
+    def diferencia_maxima_centavos(self, centavos_banco):
+        return int(tolerancias_valor_centavos([centavos_banco])[0])
+
+class EstrategiaGruposPorSuma(EstrategiaMatching):
+    """Grupos N:1 / 1:N por suma exacta."""
+    nombre = 'agrupado'
+    clave_stats = 'grupos_por_suma'
+
+    def buscar(self, df_banco, df_auxiliar, activos_banco, activos_auxiliar, contexto):
+        grupos = encontrar_grupos_por_suma(
+            df_banco, df_auxiliar, presupuesto=contexto['presupuesto_grupos'], ids_nuevos=contexto['ids_nuevos'],
+            activos_banco=activos_banco, activos_auxiliar=activos_auxiliar
+        )
+        return grupos.attrs.get('pares_candidatos', 0), grupos
+
+    def ids_conciliados(self, matches):
+        return (
+            np.array([i for grupo in matches['ids_banco'] for i in grupo], dtype=np.int64),
+            np.array([i for grupo in matches['ids_auxiliar'] for i in grupo], dtype=np.int64)
+        )
+
+    def registrar_stats(self, stats_tipo, matches):
+        stats_tipo['grupos_por_suma'] = len(matches)
+        stats_tipo['movimientos_banco_agrupados'] = int(matches['ids_banco'].map(len).sum())
+        stats_tipo['movimientos_auxiliar_agrupados'] = int(matches['ids_auxiliar'].map(len).sum())
+
+# Registro de estrategias disponibles, por nombre
+ESTRATEGIAS_MATCHING = {
+    estrategia.nombre: estrategia
+    for estrategia in (EstrategiaExacta, EstrategiaAproximada, EstrategiaValorDescripcion,
+                       EstrategiaToleranciaValor, EstrategiaGruposPorSuma)
+}
+
+def construir_estrategias(estrategias=None):
+    """
+    Construye la lista ordenada de estrategias del pipeline.
+
+    Args:
+        estrategias: nombres separados por coma o lista de nombres del registro
+            ESTRATEGIAS_MATCHING (o de estrategias ya construidas, que se
+            devuelven tal cual). Por defecto ESTRATEGIAS_POR_DEFECTO.
+
+    Raises:
+        ValueError: si algún nombre no está registrado o se repite.
+    """
+    estrategias = ESTRATEGIAS_POR_DEFECTO if estrategias is None else estrategias
+    if isinstance(estrategias, str):
+        estrategias = [nombre.strip() for nombre in estrategias.split(',') if nombre.strip()]
+    if all(isinstance(estrategia, EstrategiaMatching) for estrategia in estrategias):
+        return list(estrategias)
+    desconocidas = [nombre for nombre in estrategias if nombre not in ESTRATEGIAS_MATCHING]
+    if desconocidas:
+        raise ValueError(
+            f"Estrategias desconocidas: {', '.join(desconocidas)}. "
+            f"Valores permitidos: {', '.join(ESTRATEGIAS_MATCHING)}"
+        )
+    if len(set(estrategias)) != len(estrategias):
+        raise ValueError("Las estrategias no pueden repetirse")
+    return [ESTRATEGIAS_MATCHING[nombre]() for nombre in estrategias]
+
+def calcular_matches_por_tipo(df_banco, df_auxiliar, tipo_es, tolerancia_dias=None, modo_asignacion='greedy', presupuesto_grupos=None,
+                              ids_nuevos=None, estrategias=None):
+    """
+    Calcula los matches de un tipo específico (E o S) sin tocar la base de datos.
+
+    Las estrategias se ejecutan en orden sobre los mismos DataFrames: los
+    movimientos conciliados en una etapa se descartan de las siguientes
+    apagando su posición en las máscaras de activos, sin copiar los datos.
+
+    tolerancia_dias: diferencia máxima de días para las estrategias aproximada
+    y de tolerancia de valor (por defecto TOLERANCIA_DIAS_APROXIMADO).
+    modo_asignacion: 'greedy' (por defecto) u 'optimo'. En modo 'optimo'
+    stats_tipo['pares_adicionales_optimo'] indica cuántos pares más se
+    encontraron respecto a la asignación greedy.
+    presupuesto_grupos: PresupuestoBusqueda de la estrategia de grupos por suma
+    (se comparte entre entradas y salidas para acotar la ejecución completa).
+    ids_nuevos: en la conciliación incremental, movimientos agregados desde la
+    ejecución anterior (los grupos por suma deben incluir alguno).
+    estrategias: nombres o lista de estrategias (ver construir_estrategias).
+
+    Returns:
+        Tupla (stats_tipo, lista de (criterio, DataFrame de matches)) lista para
+        guardar con guardar_matches_por_tipo. stats_tipo['etapas'] tiene, por
+        estrategia ejecutada, el tiempo, los pares candidatos y los matches.
+    """
+    validar_modo_asignacion(modo_asignacion)
+    estrategias = construir_estrategias(estrategias)
     stats_tipo = {
         'matches_exactos': 0,
         'matches_aproximados': 0,
-        'matches_valor_descripcion': 0
+        'matches_valor_descripcion': 0,
+        'matches_tolerancia_valor': 0,
+        'grupos_por_suma': 0,
+        'movimientos_banco_agrupados': 0,
+        'movimientos_auxiliar_agrupados': 0,
+        'pares_adicionales_optimo': 0,
+        'etapas': []
     }
+    resultados = []
     
     if df_banco.empty or df_auxiliar.empty:
         print(f"No hay suficientes movimientos tipo {tipo_es} para conciliar")
-        return stats_tipo
+        return stats_tipo, resultados
     
-    print(f"Conciliando {len(df_banco)} movimientos banco vs {len(df_auxiliar)} auxiliar (tipo {tipo_es})")
-    
-    # ESTRATEGIA 1: Match exacto (valor + fecha + descripción similar)
-    matches_exactos = encontrar_matches_exactos(df_banco, df_auxiliar)
-    # print(matches_exactos, "en funcion principal llamando a matche exactos")
-    if not matches_exactos.empty:
-        procesar_matches(matches_exactos, f'exacto_{tipo_es}', conciliacion_id, db)
-        stats_tipo['matches_exactos'] = len(matches_exactos)
-        print(f"✓ Matches exactos ({tipo_es}): {len(matches_exactos)}")
-        # print(df_banco)
-        # Remover los matches encontrados
-        df_banco = df_banco[~df_banco['id'].isin(matches_exactos['id_banco'])]
-        df_auxiliar = df_auxiliar[~df_auxiliar['id'].isin(matches_exactos['id_auxiliar'])]
-        # print(df_banco)
-
-    # ESTRATEGIA 2: Match por valor exacto y fecha cercana
-    if not df_banco.empty and not df_auxiliar.empty:
-        matches_aproximados = encontrar_matches_valor_fecha_aproximada(df_banco, df_auxiliar)
-        print(matches_aproximados, "estrategia 2 encontrat matches valor fecha aproximadaaaaaaaa")
-        if not matches_aproximados.empty:
-            procesar_matches(matches_aproximados, f'aproximado_{tipo_es}', conciliacion_id, db)
-            stats_tipo['matches_aproximados'] = len(matches_aproximados)
-            print(f"✓ Matches aproximados ({tipo_es}): {len(matches_aproximados)}")
-
-            # --- CORRECCIÓN APLICADA AQUÍ: Remover matches de la Estrategia 3 ---
-            df_banco = df_banco[~df_banco['id'].isin(matches_aproximados['id_banco'])]
-            df_auxiliar = df_auxiliar[~df_auxiliar['id'].isin(matches_aproximados['id_auxiliar'])]
-            # -------------------------------------------------------------------
+    print(f"Conciliando {len(df_banco)} movimientos banco vs {len(df_auxiliar)} auxiliar (tipo {tipo_es}, asignación {modo_asignacion})")
+
+    contexto = {
+        'tolerancia_dias': tolerancia_dias,
+        'modo_asignacion': modo_asignacion,
+        'presupuesto_grupos': presupuesto_grupos,
+        'ids_nuevos': ids_nuevos
+    }
+    ids_banco = df_banco['id'].to_numpy()
+    ids_auxiliar = df_auxiliar['id'].to_numpy()
+    activos_banco = np.ones(len(df_banco), dtype=bool)
+    activos_auxiliar = np.ones(len(df_auxiliar), dtype=bool)
+
+    for estrategia in estrategias:
+        if not activos_banco.any() or not activos_auxiliar.any():
+            break
+        inicio = time.perf_counter()
+        n_candidatos, matches = estrategia.buscar(df_banco, df_auxiliar, activos_banco, activos_auxiliar, contexto)
+        if not matches.empty:
+            resultados.append((f'{estrategia.nombre}_{tipo_es}', matches))
+            estrategia.registrar_stats(stats_tipo, matches)
+            conciliados_banco, conciliados_auxiliar = estrategia.ids_conciliados(matches)
+            activos_banco &= ~np.isin(ids_banco, conciliados_banco)
+            activos_auxiliar &= ~np.isin(ids_auxiliar, conciliados_auxiliar)
+        etapa = {
+            'estrategia': estrategia.nombre,
+            'tipo': tipo_es,
+            'tiempo_segundos': round(time.perf_counter() - inicio, 4),
+            'candidatos': int(n_candidatos),
+            'matches': len(matches)
+        }
+        stats_tipo['etapas'].append(etapa)
+        print(f"✓ Etapa {estrategia.nombre} ({tipo_es}): {etapa['matches']} matches de {etapa['candidatos']} candidatos "
+              f"en {etapa['tiempo_segundos']}s")
+
+    if modo_asignacion == 'optimo':
+        print(f"✓ Asignación óptima ({tipo_es}): {stats_tipo['pares_adicionales_optimo']} pares más que greedy")
             
+    return stats_tipo, resultados
+
+def guardar_matches_por_tipo(resultados, conciliacion_id, db):
+    """
+    Guarda en base de datos los matches calculados por calcular_matches_por_tipo
+    """
+    for criterio, matches_df in resultados:
+        if criterio.startswith('agrupado_'):
+            procesar_grupos(matches_df, conciliacion_id, db)
+        else:
+            procesar_matches(matches_df, criterio, conciliacion_id, db)
+
+def ids_conciliados_en_resultados(resultados):
+    """Ids de todos los movimientos (banco y auxiliar) conciliados en los resultados."""
+    ids = set()
+    for criterio, matches_df in resultados:
+        estrategia = ESTRATEGIAS_MATCHING[criterio.rsplit('_', 1)[0]]()
+        for conciliados in estrategia.ids_conciliados(matches_df):
+            ids.update(int(i) for i in conciliados)
+    return ids
+
+def procesar_conciliacion_por_tipo(df_banco, df_auxiliar, tipo_es, conciliacion_id, db, tolerancia_dias=None, modo_asignacion='greedy',
+                                   estrategias=None):
+    """
+    Procesa la conciliación para un tipo específico (E o S): calcula los matches
+    y los guarda en base de datos.
+    """
+    stats_tipo, resultados = calcular_matches_por_tipo(
+        df_banco, df_auxiliar, tipo_es, tolerancia_dias, modo_asignacion, estrategias=estrategias
+    )
+    guardar_matches_por_tipo(resultados, conciliacion_id, db)
     return stats_tipo
 
-def realizar_conciliacion_automatica(conciliacion_id, db):
-    # print(conciliacion_id, "id en funcion de conciliacion automatica")
-    # El resto de la función se mantiene igual, ya que solo llama a la función corregida.
-    movimientos_banco_entradas = obtener_movimientos_por_tipo(conciliacion_id, db, 'banco', 'E')
-    movimientos_banco_salidas = obtener_movimientos_por_tipo(conciliacion_id, db, 'banco', 'S')
-    movimientos_auxiliar_entradas = obtener_movimientos_por_tipo(conciliacion_id, db, 'auxiliar', 'E')
-    movimientos_auxiliar_salidas = obtener_movimientos_por_tipo(conciliacion_id, db, 'auxiliar', 'S')
-    
-    df_banco_e = crear_dataframe_movimientos(movimientos_banco_entradas, 'banco', 'E')
-    df_banco_s = crear_dataframe_movimientos(movimientos_banco_salidas, 'banco', 'S')
-    df_auxiliar_e = crear_dataframe_movimientos(movimientos_auxiliar_entradas, 'auxiliar', 'E')
-    df_auxiliar_s = crear_dataframe_movimientos(movimientos_auxiliar_salidas, 'auxiliar', 'S')
-    
+def calcular_conciliacion(particiones, tolerancia_dias=None, modo_asignacion='greedy', ids_delta=None, estrategias=None):
+    """
+    Calcula los matches de entradas y salidas sin tocar la base de datos.
+
+    particiones: DataFrames por (fuente, tipo E/S), ver cargar_movimientos_pendientes.
+    ids_delta: movimientos nuevos de una ejecución incremental (ver calcular_matches_por_tipo).
+
+    Returns:
+        Tupla (stats, resultados, presupuestos_grupos) con resultados como lista de
+        (criterio, DataFrame de matches) de ambos tipos, lista para guardar_matches_por_tipo,
+        y presupuestos_grupos el PresupuestoBusqueda de cada tipo ('E', 'S').
+    """
+    estrategias = construir_estrategias(estrategias)
+    df_banco_e = particiones[('banco', 'E')]
+    df_banco_s = particiones[('banco', 'S')]
+    df_auxiliar_e = particiones[('auxiliar', 'E')]
+    df_auxiliar_s = particiones[('auxiliar', 'S')]
+
     stats = {
         'matches_exactos_entradas': 0, 'matches_exactos_salidas': 0, 'matches_aproximados_entradas': 0, 
         'matches_aproximados_salidas': 0, 'matches_valor_descripcion_entradas': 0, 'matches_valor_descripcion_salidas': 0, 
+        'matches_tolerancia_valor_entradas': 0, 'matches_tolerancia_valor_salidas': 0,
+        'grupos_por_suma_entradas': 0, 'grupos_por_suma_salidas': 0,
         'movimientos_banco_entradas_procesados': len(df_banco_e), 'movimientos_banco_salidas_procesados': len(df_banco_s), 
         'movimientos_auxiliar_entradas_procesados': len(df_auxiliar_e), 'movimientos_auxiliar_salidas_procesados': len(df_auxiliar_s), 
         'movimientos_banco_conciliados': 0, 'movimientos_auxiliar_conciliados': 0, 'total_matches': 0
     }
-    
+
+    # Entradas y luego salidas, cada una con la mitad del presupuesto de grupos:
+    # los grupos encontrados de un tipo no dependen de cuánto consumió el otro
+    presupuestos_grupos = {'E': crear_presupuesto_grupos(partes=2), 'S': crear_presupuesto_grupos(partes=2)}
     print("Procesando conciliación de ENTRADAS...")
-    # print(df_banco_e)
-    # print(df_auxiliar_e)
-    stats_entradas = procesar_conciliacion_por_tipo(df_banco_e, df_auxiliar_e, 'E', conciliacion_id, db)
-    # print(stats_entradas)
+    stats_entradas, resultados_entradas = calcular_matches_por_tipo(
+        df_banco_e, df_auxiliar_e, 'E', tolerancia_dias, modo_asignacion, presupuestos_grupos['E'], ids_delta, estrategias
+    )
     print("Procesando conciliación de SALIDAS...")
-    stats_salidas = procesar_conciliacion_por_tipo(df_banco_s, df_auxiliar_s, 'S', conciliacion_id, db)
-    
+    stats_salidas, resultados_salidas = calcular_matches_por_tipo(
+        df_banco_s, df_auxiliar_s, 'S', tolerancia_dias, modo_asignacion, presupuestos_grupos['S'], ids_delta, estrategias
+    )
+
     stats['matches_exactos_entradas'] = stats_entradas['matches_exactos']
     stats['matches_exactos_salidas'] = stats_salidas['matches_exactos']
     stats['matches_aproximados_entradas'] = stats_entradas['matches_aproximados']
     stats['matches_aproximados_salidas'] = stats_salidas['matches_aproximados']
     stats['matches_valor_descripcion_entradas'] = stats_entradas['matches_valor_descripcion']
     stats['matches_valor_descripcion_salidas'] = stats_salidas['matches_valor_descripcion']
-    
+    stats['matches_tolerancia_valor_entradas'] = stats_entradas['matches_tolerancia_valor']
+    stats['matches_tolerancia_valor_salidas'] = stats_salidas['matches_tolerancia_valor']
+    stats['grupos_por_suma_entradas'] = stats_entradas['grupos_por_suma']
+    stats['grupos_por_suma_salidas'] = stats_salidas['grupos_por_suma']
+
     stats['total_matches'] = (
         stats['matches_exactos_entradas'] + stats['matches_exactos_salidas'] +
         stats['matches_aproximados_entradas'] + stats['matches_aproximados_salidas'] +
-        stats['matches_valor_descripcion_entradas'] + stats['matches_valor_descripcion_salidas']
+        stats['matches_valor_descripcion_entradas'] + stats['matches_valor_descripcion_salidas'] +
+        stats['matches_tolerancia_valor_entradas'] + stats['matches_tolerancia_valor_salidas']
     )
-    
-    stats['movimientos_banco_conciliados'] = stats['total_matches']
-    stats['movimientos_auxiliar_conciliados'] = stats['total_matches']
-    
+
+    # Cada match 1:1 concilia un movimiento de cada lado; los grupos, varios
+    stats['movimientos_banco_conciliados'] = (
+        stats['total_matches'] + stats_entradas['movimientos_banco_agrupados'] + stats_salidas['movimientos_banco_agrupados']
+    )
+    stats['movimientos_auxiliar_conciliados'] = (
+        stats['total_matches'] + stats_entradas['movimientos_auxiliar_agrupados'] + stats_salidas['movimientos_auxiliar_agrupados']
+    )
+    stats['grupos_por_suma'] = stats['grupos_por_suma_entradas'] + stats['grupos_por_suma_salidas']
+    stats['busqueda_grupos_interrumpida'] = any(presupuesto.agotado for presupuesto in presupuestos_grupos.values())
+
     stats['matches_exactos'] = stats['matches_exactos_entradas'] + stats['matches_exactos_salidas']
     stats['matches_aproximados'] = stats['matches_aproximados_entradas'] + stats['matches_aproximados_salidas']
     stats['matches_valor_descripcion'] = stats['matches_valor_descripcion_entradas'] + stats['matches_valor_descripcion_salidas']
+    stats['matches_tolerancia_valor'] = stats['matches_tolerancia_valor_entradas'] + stats['matches_tolerancia_valor_salidas']
+    stats['modo_asignacion'] = modo_asignacion
+    stats['estrategias'] = [estrategia.nombre for estrategia in estrategias]
+    stats['etapas'] = stats_entradas['etapas'] + stats_salidas['etapas']
+    stats['pares_adicionales_optimo'] = stats_entradas['pares_adicionales_optimo'] + stats_salidas['pares_adicionales_optimo']
+    return stats, resultados_entradas + resultados_salidas, presupuestos_grupos
+
+def realizar_conciliacion_automatica(conciliacion_id, db, tolerancia_dias=None, modo_asignacion='greedy', incremental=False,
+                                     estrategias=None):
+    """
+    Concilia automáticamente los movimientos pendientes de una conciliación.
+
+    incremental: si ya existe un índice de una ejecución anterior (con la misma
+    configuración de buckets), solo se concilian los movimientos agregados desde
+    entonces contra los pendientes del índice, con costo proporcional al delta.
+    Sin índice se hace una ejecución completa, que además lo construye.
+    Las tolerancias de valor solo se cubren hasta el ancho del bucket
+    (ANCHO_BUCKET_INDICE); para aplicarlas completas usar una ejecución completa.
+
+    estrategias: nombres (separados por coma o lista) y orden de las etapas del
+    pipeline; por defecto ESTRATEGIAS_POR_DEFECTO. stats['etapas'] detalla el
+    tiempo, los candidatos y los matches de cada etapa.
+
+    stats['memoria_pico_proceso_mb'] es el pico RSS del proceso; con
+    CONCILIACION_MEDIR_MEMORIA=true se agrega 'memoria_pico_conciliacion_mb',
+    el pico de memoria asignada durante esta ejecución, y
+    'memoria_pico_compartida', que indica si otra medición se solapó con ella.
+    """
+    validar_modo_asignacion(modo_asignacion)
+    estrategias = construir_estrategias(estrategias)
+    with MedidorMemoria(MEDIR_MEMORIA_DETALLADA) as medidor:
+        ids_delta = None
+        ultimo_movimiento_id = 0
+        if incremental:
+            estado_indice = RepositoryFactory(db).get_indice_repository().get_estado(conciliacion_id)
+            if estado_indice is None or estado_indice.ancho_bucket != ancho_bucket_indice():
+                print("Sin índice incremental vigente: se realiza una conciliación completa")
+            else:
+                ultimo_movimiento_id = estado_indice.ultimo_movimiento_id
+                particiones, ids_delta, movimientos_indice = cargar_movimientos_incrementales(
+                    conciliacion_id, db, ultimo_movimiento_id, estado_indice.ancho_bucket
+                )
+        if ids_delta is None:
+            particiones = cargar_movimientos_pendientes(conciliacion_id, db)
+
+        stats, resultados, _ = calcular_conciliacion(particiones, tolerancia_dias, modo_asignacion, ids_delta, estrategias)
+
+        # Matches de todas las etapas, índice incremental y estado final en una sola transacción
+        with RepositoryFactory(db).unit_of_work():
+            guardar_matches_por_tipo(resultados, conciliacion_id, db)
+
+            ids_conciliados = ids_conciliados_en_resultados(resultados)
+            ids_cargados = [int(df['id'].max()) for df in particiones.values() if not df.empty]
+            actualizar_indice_conciliacion(
+                conciliacion_id, db, particiones, ids_conciliados,
+                max(ids_cargados + [ultimo_movimiento_id]), ids_delta
+            )
+            verificar_conciliacion_completa(conciliacion_id, db)
     
-    # print(stats)
-    verificar_conciliacion_completa(conciliacion_id, db)
+        stats['incremental'] = ids_delta is not None
+        if ids_delta is not None:
+            stats['movimientos_nuevos'] = len(ids_delta)
+            stats['movimientos_consultados_indice'] = movimientos_indice
     
-    db.commit() # Asumiendo que el commit se maneja en el endpoint de Flask
+    stats.update(medidor.stats())
     return stats
 
 
@@ -467,40 +1550,33 @@ def crear_conciliacion_manual(conciliacion_id, id_banco, id_auxiliar, db):
         movimiento_repo = factory.get_movimiento_repository()
         manual_repo = factory.get_manual_repository()
 
-        # Validar movimientos usando repositorio
-        movimientos_banco = []
-        for banco_id in bancos_ids:
-            mov = movimiento_repo.get_by_id(banco_id)
-            if mov and mov.id_conciliacion == conciliacion_id and mov.tipo == 'banco':
-                movimientos_banco.append(mov)
-
-        movimientos_auxiliar = []
-        for aux_id in aux_ids:
-            mov = movimiento_repo.get_by_id(aux_id)
-            if mov and mov.id_conciliacion == conciliacion_id and mov.tipo == 'auxiliar':
-                movimientos_auxiliar.append(mov)
-
-        print(f"Movimientos banco encontrados: {[m.id for m in movimientos_banco]}")
-        print(f"Movimientos auxiliar encontrados: {[m.id for m in movimientos_auxiliar]}\n")
-
-        # Crear registro en ConciliacionManual
-        conciliacion_manual_data = {"id_conciliacion": conciliacion_id}
-        conciliacion_manual = manual_repo.create(conciliacion_manual_data)
-
-        # Asociar movimientos a la conciliación manual
-        for mov in movimientos_banco:
-            manual_repo.create_banco_item({
-                "id_conciliacion_manual": conciliacion_manual.id,
-                "id_movimiento_banco": mov.id
-            })
-            movimiento_repo.update(mov.id, {"estado_conciliacion": "conciliado"})
-            
-        for mov in movimientos_auxiliar:
-            manual_repo.create_auxiliar_item({
-                "id_conciliacion_manual": conciliacion_manual.id,
-                "id_movimiento_auxiliar": mov.id
-            })
-            movimiento_repo.update(mov.id, {"estado_conciliacion": "conciliado"})
+        # Validar movimientos usando repositorio (una consulta por lote de ids)
+        tipos = {
+            fila[0]: fila[4]
+            for fila in movimiento_repo.get_tuplas_con_tipo_by_ids(conciliacion_id, sorted(set(bancos_ids + aux_ids)))
+        }
+        movimientos_banco = [banco_id for banco_id in bancos_ids if tipos.get(banco_id) == 'banco']
+        movimientos_auxiliar = [aux_id for aux_id in aux_ids if tipos.get(aux_id) == 'auxiliar']
+
+        print(f"Movimientos banco encontrados: {movimientos_banco}")
+        print(f"Movimientos auxiliar encontrados: {movimientos_auxiliar}\n")
+
+        # Registro, movimientos asociados y estados en una sola transacción
+        with factory.unit_of_work():
+            conciliacion_manual_data = {"id_conciliacion": conciliacion_id}
+            conciliacion_manual = manual_repo.create(conciliacion_manual_data)
+
+            for mov_id in movimientos_banco:
+                manual_repo.create_banco_item({
+                    "id_conciliacion_manual": conciliacion_manual.id,
+                    "id_movimiento_banco": mov_id
+                })
+            for mov_id in movimientos_auxiliar:
+                manual_repo.create_auxiliar_item({
+                    "id_conciliacion_manual": conciliacion_manual.id,
+                    "id_movimiento_auxiliar": mov_id
+                })
+            movimiento_repo.set_estado_bulk(movimientos_banco + movimientos_auxiliar, "conciliado")
 
         return {
             'success': True,
@@ -553,15 +1629,19 @@ def eliminar_conciliacion_manual(match_id, db):
         mov_banco = movimiento_repo.get_by_id(match.id_movimiento_banco)
         mov_auxiliar = movimiento_repo.get_by_id(match.id_movimiento_auxiliar)
         
-        # Restaurar estado de los movimientos
-        if mov_banco:
-            movimiento_repo.update(mov_banco.id, {"estado_conciliacion": "no_conciliado"})
-        
-        if mov_auxiliar:
-            movimiento_repo.update(mov_auxiliar.id, {"estado_conciliacion": "no_conciliado"})
-        
-        # Eliminar el match
-        match_repo.delete(match_id)
+        with factory.unit_of_work():
+            # Restaurar estado de los movimientos
+            if mov_banco:
+                movimiento_repo.update(mov_banco.id, {"estado_conciliacion": "no_conciliado"})
+            
+            if mov_auxiliar:
+                movimiento_repo.update(mov_auxiliar.id, {"estado_conciliacion": "no_conciliado"})
+            
+            # Los movimientos liberados deben volver a entrar en la conciliación incremental
+            invalidar_indice_conciliacion(match.id_conciliacion, db)
+
+            # Eliminar el match
+            match_repo.delete(match_id)
         
         return {
             'success': True,
@@ -0,0 +1,80 @@
+"""
+Normalización de descripciones de movimientos.
+
+La descripción limpia (minúsculas, sin puntuación, stop words ni palabras
+cortas) y sus números de referencia se calculan una sola vez al insertar el
+movimiento y se guardan en Movimiento.descripcion_normalizada y
+Movimiento.referencias_descripcion (ver models.py). La conciliación lee esas
+columnas y solo recalcula las de movimientos antiguos que aún no las tienen
+(ver scripts/migrate_add_descripcion_normalizada.py).
+"""
+import re
+
+import pandas as pd
+
+STOP_WORDS = {
+    'de', 'la', 'el', 'en', 'a', 'por', 'con', 'para', 'del', 'los', 'las', 'y', 'o', 'un', 'una',
+    'banco', 'debito', 'credito', 'transferencia', 'pago', 'ref', 'referencia', 'mov', 'movimiento'
+}
+
+def limpiar_descripcion(descripcion):
+    if not descripcion: return ""
+    clean = descripcion.lower()
+    clean = re.sub(r'[^\w\s]', ' ', clean)
+    clean = re.sub(r'\s+', ' ', clean).strip()
+    words = [w for w in clean.split() if w not in STOP_WORDS and len(w) > 2]
+    return ' '.join(words)
+
+# Elimina en una sola pasada las stop words y las palabras de 1 o 2 caracteres
+PATRON_PALABRAS_DESCARTADAS = re.compile(
+    r'\b(?:' + '|'.join(sorted(w for w in STOP_WORDS if len(w) > 2)) + r'|\w{1,2})\b'
+)
+
+def limpiar_descripcion_columna(descripciones: pd.Series) -> pd.Series:
+    """
+    Versión vectorizada de limpiar_descripcion usando operaciones .str
+    """
+    return (
+        descripciones.fillna('').astype(str)
+        .str.lower()
+        .str.replace(r'[^\w\s]', ' ', regex=True)
+        .str.replace(PATRON_PALABRAS_DESCARTADAS, ' ', regex=True)
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+        .astype(object)
+    )
+
+# Números de referencia (3+ dígitos) y códigos alfanuméricos (ej. ABC123) de una descripción.
+# Ambos son palabras completas y no se solapan, así que se extraen con un solo patrón.
+PATRON_REFERENCIAS = re.compile(r'\b\d{3,}\b|\b[A-Z]{2,}\d+\b')
+
+def extraer_referencias(descripcion):
+    return set(PATRON_REFERENCIAS.findall(descripcion.upper()))
+
+def extraer_referencias_columna(descripciones: pd.Series) -> pd.Series:
+    """Versión vectorizada de extraer_referencias para una columna de descripciones limpias."""
+    return descripciones.fillna('').str.upper().str.findall(PATRON_REFERENCIAS).map(set)
+
+def referencias_a_texto(referencias):
+    """Referencias como texto ordenado separado por espacios (formato de Movimiento.referencias_descripcion)."""
+    return ' '.join(sorted(referencias))
+
+def caracteristicas_descripcion(descripcion):
+    """
+    Tupla (descripción normalizada, referencias como texto) de una descripción.
+    """
+    if descripcion is None or (isinstance(descripcion, float) and descripcion != descripcion):  # None o NaN
+        descripcion = ''
+    normalizada = limpiar_descripcion(str(descripcion)) if descripcion else ''
+    return normalizada, referencias_a_texto(extraer_referencias(normalizada))
+
+def caracteristicas_descripcion_columna(descripciones: pd.Series):
+    """
+    Versión vectorizada de caracteristicas_descripcion.
+
+    Returns:
+        Tupla de arrays (descripciones normalizadas, referencias como texto).
+    """
+    normalizadas = limpiar_descripcion_columna(descripciones)
+    referencias = extraer_referencias_columna(normalizadas).map(referencias_a_texto)
+    return normalizadas.to_numpy(dtype=object), referencias.to_numpy(dtype=object)
@@ -0,0 +1,142 @@
+"""
+Normalización de fechas compartida por la carga de archivos y la conciliación.
+
+Las fechas llegan como texto en varios formatos (extractos, auxiliares,
+Excel). Un valor suelto se interpreta con la cascada FORMATOS_FECHA: gana el
+primer formato que lo interpreta y, si ninguno lo hace, se intenta la
+inferencia de pandas con día primero.
+
+Una columna completa (un archivo) se lee con un solo formato: se detecta el
+formato que interpreta más valores distintos y se aplica a todos los que
+encajan en él, de modo que un archivo con fechas mes/día no mezcla lecturas
+cuando el día es <= 12. Solo los valores que no encajan pasan por la cascada.
+
+Los textos se repiten mucho (un mes tiene a lo sumo 31 fechas distintas por
+formato), por eso el parser escalar está memoizado y el de columnas solo
+interpreta los valores distintos, con el formato dominante en una pasada
+vectorizada.
+"""
+import warnings
+from datetime import date, datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Cascada de formatos, en orden de prioridad
+FORMATOS_FECHA = ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%Y/%m/%d', '%Y%m%d', '%d/%m/%y']
+
+TAMANO_CACHE_FECHAS = 8192
+
+# Valores distintos que se examinan para detectar el formato dominante de una columna
+MUESTRA_FORMATO_DOMINANTE = 200
+
+
+@lru_cache(maxsize=TAMANO_CACHE_FECHAS)
+def interpretar_fecha_texto(texto):
+    """
+    Interpreta un texto de fecha ya recortado con la cascada de formatos.
+
+    Returns:
+        Tupla (pd.Timestamp o pd.NaT, formato usado o None si se usó la inferencia o no se pudo).
+    """
+    for formato in FORMATOS_FECHA:
+        try:
+            return pd.Timestamp(datetime.strptime(texto, formato)), formato
+        except ValueError:
+            continue
+    try:
+        with warnings.catch_warnings():
+            # pandas avisa cuando el texto no encaja con dayfirst; el resultado es el esperado
+            warnings.simplefilter('ignore', UserWarning)
+            return pd.to_datetime(texto, dayfirst=True), None
+    except (ValueError, TypeError, OverflowError):
+        return pd.NaT, None
+
+
+def parse_fecha(valor):
+    """
+    Convierte un valor (texto, datetime o date) a pd.Timestamp; pd.NaT si está vacío o no se puede interpretar.
+    """
+    if valor is None or valor is pd.NaT:
+        return pd.NaT
+    if isinstance(valor, (datetime, date)):
+        return pd.Timestamp(valor)
+    if isinstance(valor, float) and valor != valor:  # NaN
+        return pd.NaT
+    texto = str(valor).strip()
+    if not texto:
+        return pd.NaT
+    return interpretar_fecha_texto(texto)[0]
+
+
+def normalizar_fecha(valor):
+    """Fecha en formato YYYY-MM-DD, o None si no se puede interpretar."""
+    fecha = parse_fecha(valor)
+    return None if pd.isna(fecha) else fecha.strftime('%Y-%m-%d')
+
+
+def formato_dominante(textos):
+    """
+    Formato de la cascada que interpreta más valores de la muestra (None si
+    ninguno); a igualdad gana el de mayor prioridad.
+    """
+    muestra = pd.Series(textos[:MUESTRA_FORMATO_DOMINANTE], dtype=object)
+    mejor, mejor_conteo = None, 0
+    for formato in FORMATOS_FECHA:
+        conteo = int(pd.to_datetime(muestra, format=formato, errors='coerce').notna().sum())
+        if conteo > mejor_conteo:
+            mejor, mejor_conteo = formato, conteo
+    return mejor
+
+
+def interpretar_textos_distintos(textos):
+    """
+    Interpreta los textos distintos (ya recortados) de una columna.
+
+    El formato dominante se aplica en una pasada vectorizada a todos los que
+    encajan en él; los que no encajan pasan por la cascada del parser escalar.
+    """
+    textos = pd.Series(textos, dtype=object)
+    resultado = pd.Series(pd.NaT, index=textos.index, dtype='datetime64[ns]')
+    dominante = formato_dominante(textos.tolist())
+    pendientes = pd.Series(True, index=textos.index)
+    if dominante is not None:
+        parseadas = pd.to_datetime(textos, format=dominante, errors='coerce')
+        aceptadas = parseadas.notna()
+        resultado[aceptadas] = parseadas[aceptadas]
+        pendientes = ~aceptadas
+    for idx, texto in textos[pendientes].items():
+        resultado.loc[idx] = interpretar_fecha_texto(texto)[0]
+    return resultado
+
+
+def parse_fechas_columna(fechas: pd.Series) -> pd.Series:
+    """
+    Versión vectorizada de parse_fecha para una columna: devuelve una Series
+    datetime64 con el mismo índice (NaT donde no se pudo interpretar). Los
+    textos se leen con el formato dominante de la columna (ver interpretar_textos_distintos).
+    """
+    if pd.api.types.is_datetime64_any_dtype(fechas):
+        return fechas.astype('datetime64[ns]')
+    valores = fechas.to_numpy(dtype=object)
+    resultado = np.full(len(valores), np.datetime64('NaT'), dtype='datetime64[ns]')
+
+    es_texto = np.fromiter((isinstance(valor, str) for valor in valores), dtype=bool, count=len(valores))
+    # Valores ya de tipo fecha (ej. celdas de Excel), numéricos o nulos: uno a uno
+    for posicion in np.flatnonzero(~es_texto):
+        resultado[posicion] = parse_fecha(valores[posicion]).to_datetime64()
+
+    posiciones = np.flatnonzero(es_texto)
+    textos = pd.Series(valores[posiciones], dtype=object).str.strip()
+    no_vacios = (textos != '').to_numpy()
+    posiciones, textos = posiciones[no_vacios], textos[no_vacios]
+    if len(textos):
+        codigos, distintos = pd.factorize(textos)
+        resultado[posiciones] = interpretar_textos_distintos(distintos).to_numpy()[codigos]
+    return pd.Series(resultado, index=fechas.index)
+
+
+def normalizar_fechas_columna(fechas: pd.Series) -> pd.Series:
+    """Columna de fechas como texto YYYY-MM-DD (NaN donde no se pudo interpretar)."""
+    return parse_fechas_columna(fechas).dt.strftime('%Y-%m-%d')
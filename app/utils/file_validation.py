@@ -3,6 +3,8 @@ import io
 from datetime import datetime
 from collections import defaultdict
 from sqlalchemy.orm import Session
+import pandas as pd
+from app.utils.fechas import parse_fecha
 
 def validar_archivo_csv(contenido_str):
     columnas_esperadas = [
@@ -130,27 +132,11 @@ def agrupar_movimientos_por_mes_y_guardar(movimientos_formateados, empresa_id, c
     
     for movimiento in movimientos_formateados:
         try:
-            # Parsear la fecha (múltiples formatos posibles)
+            # Parsear la fecha (múltiples formatos posibles, ver utils/fechas.py)
             fecha_str = movimiento["fecha"].strip()
-            fecha_obj = None
+            fecha_obj = parse_fecha(fecha_str)
             
-            # Intentar diferentes formatos de fecha
-            formatos_fecha = [
-                "%Y-%m-%d",      # 2025-01-07
-                "%d/%m/%Y",      # 15/01/2025
-                "%d-%m-%Y",      # 15-01-2025
-                "%m/%d/%Y",      # 01/15/2025 (formato americano)
-                "%Y/%m/%d",      # 2025/01/15
-            ]
-            
-            for formato in formatos_fecha:
-                try:
-                    fecha_obj = datetime.strptime(fecha_str, formato)
-                    break
-                except ValueError:
-                    continue
-            
-            if fecha_obj is None:
+            if pd.isna(fecha_obj):
                 print(f"No se pudo parsear la fecha '{fecha_str}' con ningún formato conocido")
                 continue
             
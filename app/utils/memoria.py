@@ -0,0 +1,87 @@
+"""
+Medición del pico de memoria de una conciliación.
+
+Siempre se reporta el pico de memoria residente (RSS) del proceso, que es
+gratuito de consultar pero acumulado desde el arranque del worker. Con
+medición detallada se usa además tracemalloc para obtener el pico de la
+ejecución en sí (NumPy y pandas reportan sus buffers a tracemalloc); tiene un
+costo de CPU apreciable, por eso se activa solo con CONCILIACION_MEDIR_MEMORIA.
+"""
+import sys
+import threading
+import tracemalloc
+
+# tracemalloc es global al proceso: las mediciones detalladas simultáneas
+# (ej. dos requests) comparten una sola sesión de tracing
+_lock = threading.Lock()
+_mediciones_activas = 0
+_mediciones_iniciadas = 0
+_tracing_propio = False
+
+
+def memoria_pico_proceso_mb():
+    """Pico de memoria residente del proceso en MB, o None si la plataforma no lo expone."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB y macOS bytes
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class MedidorMemoria:
+    """
+    Context manager que mide el pico de memoria del bloque.
+
+    Con detallada=True el pico del bloque queda en pico_mb (tracemalloc). Las
+    mediciones detalladas simultáneas cuentan referencias: la primera arranca
+    tracemalloc (o solo reinicia su pico si ya estaba activo desde afuera) y
+    la última en salir lo detiene. Como el pico es del proceso, si otra
+    medición se solapó con el bloque su pico incluye la memoria de ambas y
+    queda marcado en compartida.
+    """
+
+    def __init__(self, detallada=False):
+        self.detallada = detallada
+        self.pico_mb = None
+        self.compartida = False
+        self._inicio = None
+
+    def __enter__(self):
+        global _mediciones_activas, _mediciones_iniciadas, _tracing_propio
+        if self.detallada:
+            with _lock:
+                if _mediciones_activas == 0:
+                    if tracemalloc.is_tracing():
+                        tracemalloc.reset_peak()
+                    else:
+                        tracemalloc.start()
+                        _tracing_propio = True
+                else:
+                    self.compartida = True
+                _mediciones_activas += 1
+                _mediciones_iniciadas += 1
+                self._inicio = _mediciones_iniciadas
+        return self
+
+    def __exit__(self, tipo_excepcion, excepcion, traza):
+        global _mediciones_activas, _tracing_propio
+        if self.detallada:
+            with _lock:
+                self.pico_mb = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+                # Otra medición empezó durante este bloque
+                self.compartida = self.compartida or _mediciones_iniciadas != self._inicio
+                _mediciones_activas -= 1
+                if _mediciones_activas == 0 and _tracing_propio:
+                    tracemalloc.stop()
+                    _tracing_propio = False
+        return False
+
+    def stats(self):
+        """Claves de memoria para las estadísticas de la ejecución."""
+        stats = {'memoria_pico_proceso_mb': memoria_pico_proceso_mb()}
+        if self.pico_mb is not None:
+            stats['memoria_pico_conciliacion_mb'] = self.pico_mb
+            stats['memoria_pico_compartida'] = self.compartida
+        return stats
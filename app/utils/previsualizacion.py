@@ -0,0 +1,224 @@
+"""
+Previsualización de la conciliación automática.
+
+previsualizar_conciliacion_automatica ejecuta el pipeline completo sobre los
+movimientos pendientes sin escribir nada en la base de datos. Las propuestas
+(pares 1:1 y grupos N:1 / 1:N) se envían como NDJSON en bloques de
+TAMANO_BLOQUE_PREVISUALIZACION líneas, para que la interfaz las muestre a
+medida que llegan. La primera línea es el resumen con las estadísticas.
+
+aplicar_propuestas guarda las propuestas aceptadas en una sola transacción,
+validando antes que sus movimientos sigan pendientes y que sus valores
+cumplan el criterio. La diferencia de valor se recalcula con los valores
+guardados; la que envía el cliente se ignora.
+"""
+import json
+import os
+from datetime import datetime
+
+from ..repositories.factory import RepositoryFactory
+from .asignacion import validar_modo_asignacion
+from .conciliaciones import (
+    ESTRATEGIAS_MATCHING, MEDIR_MEMORIA_DETALLADA, calcular_conciliacion, cargar_movimientos_pendientes,
+    construir_estrategias, diferencias_matches, valor_a_centavos, verificar_conciliacion_completa
+)
+from .memoria import MedidorMemoria
+
+# Propuestas por bloque de la respuesta NDJSON
+TAMANO_BLOQUE_PREVISUALIZACION = int(os.getenv("CONCILIACION_TAMANO_BLOQUE_PREVISUALIZACION", "500"))
+
+
+def previsualizar_conciliacion_automatica(conciliacion_id, db, tolerancia_dias=None, modo_asignacion='greedy', estrategias=None):
+    """
+    Calcula los matches de la conciliación automática sin guardarlos.
+
+    Siempre considera todos los movimientos pendientes (no usa ni actualiza el
+    índice incremental).
+
+    Returns:
+        Tupla (stats, resultados) como en calcular_conciliacion; stats['total_propuestas']
+        es la cantidad de pares y grupos propuestos.
+    """
+    validar_modo_asignacion(modo_asignacion)
+    estrategias = construir_estrategias(estrategias)
+    with MedidorMemoria(MEDIR_MEMORIA_DETALLADA) as medidor:
+        particiones = cargar_movimientos_pendientes(conciliacion_id, db)
+        stats, resultados, _ = calcular_conciliacion(particiones, tolerancia_dias, modo_asignacion, estrategias=estrategias)
+    stats['total_propuestas'] = sum(len(matches_df) for _, matches_df in resultados)
+    stats.update(medidor.stats())
+    return stats, resultados
+
+
+def propuestas_desde_resultados(resultados):
+    """
+    Recorre los resultados como propuestas serializables:
+    {'criterio', 'id_banco', 'id_auxiliar', 'diferencia_valor'} para los pares y
+    {'criterio', 'ids_banco', 'ids_auxiliar'} para los grupos por suma.
+    """
+    for criterio, matches_df in resultados:
+        if criterio.startswith('agrupado_'):
+            for ids_banco, ids_auxiliar in zip(matches_df['ids_banco'], matches_df['ids_auxiliar']):
+                yield {
+                    'criterio': criterio,
+                    'ids_banco': [int(i) for i in ids_banco],
+                    'ids_auxiliar': [int(i) for i in ids_auxiliar]
+                }
+        else:
+            ids_banco = matches_df['id_banco'].astype(int).tolist()
+            ids_auxiliar = matches_df['id_auxiliar'].astype(int).tolist()
+            for id_banco, id_auxiliar, diferencia in zip(ids_banco, ids_auxiliar, diferencias_matches(matches_df)):
+                yield {
+                    'criterio': criterio,
+                    'id_banco': id_banco,
+                    'id_auxiliar': id_auxiliar,
+                    'diferencia_valor': diferencia
+                }
+
+
+def lineas_ndjson_previsualizacion(stats, resultados, tamano_bloque=None):
+    """
+    Genera la respuesta NDJSON en bloques de texto: una línea {'tipo': 'resumen', 'stats'}
+    y luego una línea {'tipo': 'propuesta', ...} por propuesta.
+    """
+    tamano_bloque = tamano_bloque or TAMANO_BLOQUE_PREVISUALIZACION
+    yield json.dumps({'tipo': 'resumen', 'stats': stats}, ensure_ascii=False) + '\n'
+    bloque = []
+    for propuesta in propuestas_desde_resultados(resultados):
+        bloque.append(json.dumps({'tipo': 'propuesta', **propuesta}))
+        if len(bloque) >= tamano_bloque:
+            yield '\n'.join(bloque) + '\n'
+            bloque = []
+    if bloque:
+        yield '\n'.join(bloque) + '\n'
+
+
+def validar_propuestas(conciliacion_id, propuestas, db):
+    """
+    Verifica que cada propuesta tenga un criterio conocido, que sus movimientos
+    sean de la conciliación, sigan pendientes, estén del lado correcto y sean del
+    mismo tipo E/S, y que ningún movimiento aparezca en dos propuestas.
+
+    También verifica los valores guardados: en un par la diferencia debe estar
+    dentro de la que admite la estrategia del criterio (cero salvo en
+    tolerancia_valor) y en un grupo ambos lados deben sumar lo mismo.
+
+    Returns:
+        Tupla (pares, grupos) con pares como [(criterio, id_banco, id_auxiliar, diferencia)],
+        donde diferencia es valor banco - valor auxiliar en pesos, y grupos como
+        [(ids_banco, ids_auxiliar)].
+
+    Raises:
+        ValueError: con el detalle de las propuestas inválidas.
+    """
+    pares, grupos, errores = [], [], []
+    vistos = set()
+    lados = []
+    for posicion, propuesta in enumerate(propuestas):
+        criterio = propuesta.get('criterio') or ''
+        estrategia = criterio.rsplit('_', 1)[0]
+        if estrategia not in ESTRATEGIAS_MATCHING or not criterio.endswith(('_E', '_S')):
+            errores.append(f"propuesta {posicion}: criterio '{criterio}' desconocido")
+            continue
+        if estrategia == 'agrupado':
+            ids_banco = [int(i) for i in propuesta.get('ids_banco') or []]
+            ids_auxiliar = [int(i) for i in propuesta.get('ids_auxiliar') or []]
+        elif propuesta.get('id_banco') is not None and propuesta.get('id_auxiliar') is not None:
+            ids_banco, ids_auxiliar = [int(propuesta['id_banco'])], [int(propuesta['id_auxiliar'])]
+        else:
+            ids_banco = ids_auxiliar = []
+        if not ids_banco or not ids_auxiliar:
+            errores.append(f"propuesta {posicion}: faltan movimientos de banco o auxiliar")
+            continue
+        repetidos = vistos.intersection(ids_banco + ids_auxiliar)
+        if repetidos or len(set(ids_banco + ids_auxiliar)) != len(ids_banco) + len(ids_auxiliar):
+            errores.append(f"propuesta {posicion}: movimientos repetidos {sorted(repetidos)}")
+            continue
+        vistos.update(ids_banco + ids_auxiliar)
+        lados.append((posicion, criterio, ids_banco, ids_auxiliar))
+
+    filas = RepositoryFactory(db).get_movimiento_repository().get_tuplas_con_tipo_by_ids(
+        conciliacion_id, sorted(vistos), {'estado_conciliacion': 'no_conciliado'}
+    )
+    pendientes = {fila[0]: (fila[4], fila[5]) for fila in filas}
+    centavos = dict(zip((fila[0] for fila in filas), valor_a_centavos([fila[3] for fila in filas]).tolist()))
+    for posicion, criterio, ids_banco, ids_auxiliar in lados:
+        tipo_es = criterio[-1]
+        invalidos = [i for i in ids_banco if pendientes.get(i) != ('banco', tipo_es)]
+        invalidos += [i for i in ids_auxiliar if pendientes.get(i) != ('auxiliar', tipo_es)]
+        if invalidos:
+            errores.append(f"propuesta {posicion}: movimientos no pendientes o no válidos {invalidos}")
+            continue
+        centavos_banco = sum(centavos[i] for i in ids_banco)
+        diferencia = centavos_banco - sum(centavos[i] for i in ids_auxiliar)
+        estrategia = ESTRATEGIAS_MATCHING[criterio.rsplit('_', 1)[0]]()
+        if estrategia.nombre == 'agrupado':
+            if diferencia != 0:
+                errores.append(f"propuesta {posicion}: los movimientos del grupo no suman lo mismo (diferencia {diferencia / 100})")
+                continue
+            grupos.append((ids_banco, ids_auxiliar))
+        else:
+            if abs(diferencia) > estrategia.diferencia_maxima_centavos(centavos_banco):
+                errores.append(f"propuesta {posicion}: diferencia de valor {diferencia / 100} fuera de la tolerancia de '{criterio}'")
+                continue
+            pares.append((criterio, ids_banco[0], ids_auxiliar[0], diferencia / 100))
+
+    if errores:
+        raise ValueError("; ".join(errores))
+    return pares, grupos
+
+
+def aplicar_propuestas(conciliacion_id, propuestas, db):
+    """
+    Guarda las propuestas aceptadas (formato de propuestas_desde_resultados) en
+    una sola transacción: los matches 1:1, los grupos como conciliaciones
+    manuales y el estado 'conciliado' de todos sus movimientos. Si alguna
+    propuesta no es válida no se guarda ninguna.
+
+    Returns:
+        dict con matches_creados, grupos_creados y movimientos_conciliados.
+
+    Los movimientos se marcan con un UPDATE condicionado a que sigan en
+    'no_conciliado': si otra aplicación concurrente ya concilió alguno tras la
+    validación, se revierte todo.
+
+    Raises:
+        ValueError: si alguna propuesta no es válida (ver validar_propuestas) o
+            alguno de sus movimientos se concilió mientras se aplicaban.
+    """
+    pares, grupos = validar_propuestas(conciliacion_id, propuestas, db)
+
+    factory = RepositoryFactory(db)
+    fecha_match = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    matches_data = [
+        {
+            "id_conciliacion": conciliacion_id,
+            "id_movimiento_banco": id_banco,
+            "id_movimiento_auxiliar": id_auxiliar,
+            "fecha_match": fecha_match,
+            "criterio_match": criterio,
+            "diferencia_valor": diferencia
+        }
+        for criterio, id_banco, id_auxiliar, diferencia in pares
+    ]
+    ids_movimientos = [mov_id for _, id_banco, id_auxiliar, _ in pares for mov_id in (id_banco, id_auxiliar)]
+    ids_movimientos += [mov_id for ids_banco, ids_auxiliar in grupos for mov_id in ids_banco + ids_auxiliar]
+    with factory.unit_of_work():
+        actualizados = factory.get_movimiento_repository().set_estado_bulk(
+            ids_movimientos, "conciliado", estado_actual="no_conciliado"
+        )
+        if actualizados != len(ids_movimientos):
+            raise ValueError(
+                f"{len(ids_movimientos) - actualizados} movimientos se conciliaron mientras se aplicaban las propuestas"
+            )
+        factory.get_match_repository().insert_bulk(matches_data)
+        factory.get_manual_repository().insert_grupos_bulk(conciliacion_id, grupos)
+        # El índice incremental solo guarda movimientos pendientes
+        factory.get_indice_repository().delete_movimientos(conciliacion_id, ids_movimientos)
+        verificar_conciliacion_completa(conciliacion_id, db)
+
+    print(f"Propuestas aplicadas: {len(pares)} matches y {len(grupos)} grupos ({len(ids_movimientos)} movimientos)")
+    return {
+        'matches_creados': len(pares),
+        'grupos_creados': len(grupos),
+        'movimientos_conciliados': len(ids_movimientos)
+    }
@@ -0,0 +1,178 @@
+"""
+Búsqueda de grupos N:1 / 1:N por suma exacta de valores.
+
+Un movimiento (ej. una consignación consolidada en el auxiliar) se concilia
+con varios movimientos del otro lado (ej. los abonos parciales del banco)
+cuando la suma en centavos de estos últimos es exactamente su valor.
+
+Para cada movimiento se toman como candidatos los movimientos libres del otro
+lado dentro de la ventana de fechas (los más cercanos primero, con un tope) y
+se busca el grupo más pequeño de hasta max_tamano movimientos con la suma
+exacta mediante meet-in-the-middle: se enumeran los subconjuntos de cada
+mitad de los candidatos y se cruzan por la suma complementaria.
+
+Toda la búsqueda de una ejecución comparte un PresupuestoBusqueda (tiempo y
+cantidad de combinaciones evaluadas) para no bloquear nunca al worker. El
+reloj del presupuesto arranca con la búsqueda de grupos, no al crearlo, y se
+revisa durante la enumeración de cada mitad.
+"""
+import threading
+import time
+from itertools import combinations
+
+import numpy as np
+
+# Combinaciones enumeradas entre revisiones del presupuesto
+COMBINACIONES_POR_REVISION = 1024
+
+
+class PresupuestoBusqueda:
+    """Límites de tiempo y de combinaciones evaluadas para la búsqueda de grupos."""
+
+    def __init__(self, tiempo_max_segundos, max_combinaciones):
+        self.tiempo_max_segundos = tiempo_max_segundos
+        self.limite = None
+        self.combinaciones_restantes = max_combinaciones
+        self.agotado = False
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        """Arranca el reloj; si ya estaba corriendo no hace nada."""
+        with self._lock:
+            if self.limite is None:
+                self.limite = time.monotonic() + self.tiempo_max_segundos
+
+    def consumir(self, combinaciones):
+        self.iniciar()
+        with self._lock:
+            self.combinaciones_restantes -= combinaciones
+            if self.combinaciones_restantes <= 0 or time.monotonic() >= self.limite:
+                self.agotado = True
+        return not self.agotado
+
+
+def enumerar_sumas(valores, posiciones, max_tamano, objetivo, presupuesto):
+    """
+    Enumera los subconjuntos de hasta max_tamano posiciones con suma <= objetivo,
+    consumiendo el presupuesto cada COMBINACIONES_POR_REVISION combinaciones.
+
+    Returns:
+        dict {(suma, tamaño): primer subconjunto encontrado}, o None si se agotó el presupuesto.
+    """
+    sumas = {}
+    evaluadas = 0
+    for tamano in range(max_tamano + 1):
+        for combo in combinations(posiciones, tamano):
+            evaluadas += 1
+            if evaluadas == COMBINACIONES_POR_REVISION:
+                if not presupuesto.consumir(evaluadas):
+                    return None
+                evaluadas = 0
+            suma = sum(valores[i] for i in combo)
+            if suma <= objetivo and (suma, tamano) not in sumas:
+                sumas[(suma, tamano)] = combo
+    if not presupuesto.consumir(evaluadas):
+        return None
+    return sumas
+
+
+def buscar_subconjunto(objetivo, valores, max_tamano, presupuesto):
+    """
+    Busca el subconjunto más pequeño (2..max_tamano elementos) de valores
+    positivos que sume exactamente objetivo.
+
+    Args:
+        objetivo: suma buscada en centavos
+        valores: lista de valores en centavos (todos > 0)
+        max_tamano: máximo de elementos del grupo
+        presupuesto: PresupuestoBusqueda consumido por las combinaciones evaluadas
+
+    Returns:
+        Tupla de índices sobre valores, o None si no hay grupo (o se agotó el presupuesto).
+    """
+    # Cotas: ni los max_tamano mayores alcanzan el objetivo, o los dos menores ya lo superan
+    ordenados = sorted(valores)
+    if sum(ordenados[-max_tamano:]) < objetivo or sum(ordenados[:2]) > objetivo:
+        return None
+
+    mitad = len(valores) // 2
+    izquierda = enumerar_sumas(valores, range(mitad), max_tamano, objetivo, presupuesto)
+    if izquierda is None:
+        return None
+    derecha = enumerar_sumas(valores, range(mitad, len(valores)), max_tamano, objetivo, presupuesto)
+    if derecha is None:
+        return None
+
+    mejor = None
+    for (suma, tamano_izquierda), combo_izquierda in izquierda.items():
+        for tamano_derecha in range(max(0, 2 - tamano_izquierda), max_tamano - tamano_izquierda + 1):
+            combo_derecha = derecha.get((objetivo - suma, tamano_derecha))
+            if combo_derecha is None:
+                continue
+            if mejor is None or tamano_izquierda + tamano_derecha < len(mejor):
+                mejor = combo_izquierda + combo_derecha
+            break
+        if mejor is not None and len(mejor) == 2:
+            break
+    return mejor
+
+
+def buscar_grupos_por_suma(centavos_uno, dias_uno, centavos_muchos, dias_muchos, max_tamano,
+                           ventana_dias, max_candidatos, presupuesto, nuevos_uno=None, nuevos_muchos=None,
+                           estadisticas=None):
+    """
+    Busca, para cada movimiento del lado "uno", un grupo de movimientos del lado
+    "muchos" cuya suma sea exactamente su valor. Cada movimiento se usa una sola vez.
+
+    Args:
+        centavos_uno / dias_uno: valor en centavos y número de día del lado consolidado
+        centavos_muchos / dias_muchos: lo mismo para el lado con los movimientos parciales
+        max_tamano: máximo de movimientos por grupo
+        ventana_dias: diferencia máxima de días entre el consolidado y cada parcial
+        max_candidatos: parciales más cercanos en fecha considerados por consolidado
+        presupuesto: PresupuestoBusqueda compartido de la ejecución
+        nuevos_uno / nuevos_muchos: máscaras opcionales de movimientos nuevos; si se
+            indican, solo se buscan grupos donde participe al menos uno de ellos
+            (los grupos entre movimientos ya procesados se buscaron antes)
+        estadisticas: dict opcional donde se acumulan en 'pares_candidatos' los
+            pares (consolidado, parcial) evaluados
+
+    Returns:
+        Lista de (posición uno, lista de posiciones muchos).
+    """
+    centavos_uno = np.asarray(centavos_uno, dtype=np.int64)
+    dias_uno = np.asarray(dias_uno, dtype=np.int64)
+    centavos_muchos = np.asarray(centavos_muchos, dtype=np.int64)
+    dias_muchos = np.asarray(dias_muchos, dtype=np.int64)
+
+    orden = np.argsort(dias_muchos, kind='stable')
+    dias_ordenados = dias_muchos[orden]
+    inicios = np.searchsorted(dias_ordenados, dias_uno - ventana_dias, side='left')
+    fines = np.searchsorted(dias_ordenados, dias_uno + ventana_dias, side='right')
+    usados = np.zeros(len(centavos_muchos), dtype=bool)
+
+    grupos = []
+    for posicion in range(len(centavos_uno)):
+        if presupuesto.agotado:
+            break
+        objetivo = int(centavos_uno[posicion])
+        if objetivo <= 0 or fines[posicion] - inicios[posicion] < 2:
+            continue
+
+        candidatos = orden[inicios[posicion]:fines[posicion]]
+        candidatos = candidatos[~usados[candidatos] & (centavos_muchos[candidatos] > 0) & (centavos_muchos[candidatos] < objetivo)]
+        if len(candidatos) < 2:
+            continue
+        if nuevos_uno is not None and not nuevos_uno[posicion] and not nuevos_muchos[candidatos].any():
+            continue
+        cercania = np.abs(dias_muchos[candidatos] - dias_uno[posicion])
+        candidatos = candidatos[np.argsort(cercania, kind='stable')[:max_candidatos]]
+
+        if estadisticas is not None:
+            estadisticas['pares_candidatos'] = estadisticas.get('pares_candidatos', 0) + len(candidatos)
+        grupo = buscar_subconjunto(objetivo, centavos_muchos[candidatos].tolist(), max_tamano, presupuesto)
+        if grupo is not None:
+            seleccionados = candidatos[list(grupo)]
+            usados[seleccionados] = True
+            grupos.append((posicion, sorted(seleccionados.tolist())))
+    return grupos
@@ -1,6 +1,7 @@
 import pandas as pd
 import os
 from app.models import Conciliacion, Movimiento
+from app.repositories.factory import RepositoryFactory
 
 
 # Variable base para la URL del servidor
@@ -18,12 +19,13 @@ def calcular_stats_conciliacion(db, conciliacion_id):
     """
     Calcula totales y porcentaje de conciliación para una conciliación dada
     """
-    movimientos = db.query(Movimiento).filter(
-        Movimiento.id_conciliacion == conciliacion_id
-    ).all()
+    conteos = RepositoryFactory(db).get_movimiento_repository().count_by_conciliaciones([conciliacion_id])
+    return stats_desde_conteos(*conteos[conciliacion_id])
 
-    total_movimientos = len(movimientos)
-    total_conciliados = len([m for m in movimientos if m.estado_conciliacion == 'conciliado'])
+def stats_desde_conteos(total_movimientos, total_conciliados):
+    """
+    Estadísticas de calcular_stats_conciliacion a partir de los conteos (total, conciliados)
+    """
     total_no_conciliados = total_movimientos - total_conciliados
     porcentaje_conciliacion = (total_conciliados / total_movimientos * 100) if total_movimientos > 0 else 0
 
@@ -226,10 +228,8 @@ def obtener_estadisticas_empresa(db, empresa_id):
     
     # Calcular promedio de avance
     if total_conciliaciones > 0:
-        promedios = []
-        for c in conciliaciones:
-            stats = calcular_stats_conciliacion(db, c.id)
-            promedios.append(stats['porcentaje_conciliacion'])
+        conteos = RepositoryFactory(db).get_movimiento_repository().count_by_conciliaciones([c.id for c in conciliaciones])
+        promedios = [stats_desde_conteos(*conteos[c.id])['porcentaje_conciliacion'] for c in conciliaciones]
         promedio_avance = sum(promedios) / len(promedios)
     else:
         promedio_avance = 0
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Benchmark reproducible de la conciliación automática con datos sintéticos.
+
+Para cada tamaño genera un extracto bancario y un auxiliar con la misma semilla
+(montos repetidos, desfase de fechas, comisiones, movimientos partidos en
+grupos y movimientos sin pareja), los guarda en una base SQLite temporal y
+ejecuta realizar_conciliacion_automatica de punta a punta. Reporta el tiempo
+por etapa, el pico de memoria, las consultas a la base de datos y el recall
+contra las parejas conocidas de la generación.
+
+La conciliación de cada tamaño corre en un proceso nuevo para que el pico de
+memoria del proceso no incluya la generación ni los tamaños anteriores. Con
+--salida se guarda el resultado en JSON (con el commit y las versiones) y con
+--comparar se muestran las diferencias contra un resultado anterior, para
+comparar entre commits. La búsqueda de grupos tiene un presupuesto de tiempo
+(CONCILIACION_GRUPO_TIEMPO_MAX): si se agota, 'busqueda_grupos_interrumpida'
+lo indica y los resultados de esa etapa dejan de ser deterministas.
+
+Uso:
+  python scripts/benchmark_conciliacion.py
+  python scripts/benchmark_conciliacion.py --tamanos 1000 10000 100000 1000000 --salida bench.json
+  python scripts/benchmark_conciliacion.py --tamanos 10000 --comparar bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from multiprocessing import get_context
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# El benchmark usa su propia base; app.database solo exige que la variable exista
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import create_engine, event, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import (
+    Conciliacion, ConciliacionManualAuxiliar, ConciliacionManualBanco, ConciliacionMatch, Empresa, Movimiento
+)
+from app.utils.conciliaciones import realizar_conciliacion_automatica
+from app.utils.descripciones import caracteristicas_descripcion_columna
+from app.utils.memoria import MedidorMemoria
+
+TAMANOS_POR_DEFECTO = [1000, 10000, 100000]
+FECHA_INICIO = date(2025, 1, 1)
+TAMANO_LOTE_INSERT = 10000
+
+PALABRAS = ['pago', 'proveedor', 'cliente', 'nomina', 'transferencia', 'consignacion', 'factura', 'abono',
+            'servicios', 'arriendo', 'impuestos', 'retencion', 'honorarios', 'compra', 'venta', 'anticipo']
+
+# Clases de unidad generada
+PAR, GRUPO, SIN_PAREJA = 0, 1, 2
+
+
+def generar_datos(filas, semilla=42, densidad_duplicados=0.2, desfase_dias=3, fraccion_partidos=0.05,
+                  fraccion_sin_pareja=0.05, fraccion_comision=0.03, dias_periodo=30, valores_repetidos=200):
+    """
+    Genera unas `filas` movimientos de banco y auxiliar (aproximadamente) de forma determinista.
+
+    Args:
+        densidad_duplicados: fracción de montos tomados de un conjunto de valores_repetidos montos
+        desfase_dias: diferencia máxima de días entre el banco y el auxiliar de una pareja
+        fraccion_partidos: fracción de unidades que son un movimiento partido en 2 o 3 del otro lado
+        fraccion_sin_pareja: fracción de unidades sin contraparte
+        fraccion_comision: fracción de parejas con una diferencia de valor menor a 100 pesos
+
+    Returns:
+        Tupla (DataFrame con id, fecha, descripcion, valor, tipo, es; set de parejas
+        (id_banco, id_auxiliar) esperadas; cantidad de movimientos con pareja).
+    """
+    rng = np.random.default_rng(semilla)
+    unidades = max(1, filas // 2)
+    clases = rng.choice(3, size=unidades, p=[1 - fraccion_partidos - fraccion_sin_pareja, fraccion_partidos, fraccion_sin_pareja])
+    es = rng.choice(np.array(['E', 'S'], dtype=object), size=unidades)
+    dias = rng.integers(0, dias_periodo, size=unidades)
+    pesos = np.maximum(np.round(np.exp(rng.normal(12.5, 1.5, size=unidades))), 1000)
+    repetidos = rng.random(unidades) < densidad_duplicados
+    pesos[repetidos] = rng.choice(np.round(rng.uniform(1, 500, size=valores_repetidos)) * 1000, size=repetidos.sum())
+    centavos = (pesos * 100).astype(np.int64)
+    referencias = rng.integers(100000, 999999, size=unidades)
+    palabras = rng.choice(np.array(PALABRAS, dtype=object), size=(unidades, 2))
+
+    filas_banco, filas_auxiliar = [], []
+
+    def agregar(destino, unidad, dia, valor_centavos, descripcion):
+        destino.append((unidad, int(dia), int(valor_centavos), es[unidad], descripcion))
+
+    # Parejas 1:1: mismo monto (salvo comisión) y fecha con desfase
+    pares = np.flatnonzero(clases == PAR)
+    desfases = rng.integers(-desfase_dias, desfase_dias + 1, size=len(pares))
+    comisiones = np.where(rng.random(len(pares)) < fraccion_comision, rng.integers(1, 100, size=len(pares)) * 100, 0)
+    for unidad, desfase, comision in zip(pares.tolist(), desfases.tolist(), comisiones.tolist()):
+        palabra_1, palabra_2 = palabras[unidad]
+        agregar(filas_auxiliar, unidad, dias[unidad], centavos[unidad], f"{palabra_1} {palabra_2} factura {referencias[unidad]}")
+        agregar(filas_banco, unidad, dias[unidad] + desfase, centavos[unidad] - comision,
+                f"{palabra_1.upper()} {palabra_2.upper()} REF {referencias[unidad]}")
+
+    # Movimientos partidos: un consolidado contra 2 o 3 parciales del otro lado
+    for unidad in np.flatnonzero(clases == GRUPO).tolist():
+        partes = int(rng.integers(2, 4))
+        cortes = np.sort(rng.choice(int(centavos[unidad]) // 100 - 1, size=partes - 1, replace=False) + 1) * 100
+        valores = np.diff(np.concatenate([[0], cortes, [centavos[unidad]]]))
+        consolidado_en_banco = bool(rng.integers(0, 2))
+        uno, muchos = (filas_banco, filas_auxiliar) if consolidado_en_banco else (filas_auxiliar, filas_banco)
+        palabra_1, palabra_2 = palabras[unidad]
+        agregar(uno, unidad, dias[unidad], centavos[unidad], f"{palabra_1} consolidado {referencias[unidad]}")
+        for valor, desfase in zip(valores.tolist(), rng.integers(-2, 3, size=partes).tolist()):
+            agregar(muchos, unidad, dias[unidad] + desfase, valor, f"{palabra_2} parcial")
+
+    # Ruido: movimientos sin contraparte de cualquiera de los dos lados
+    for unidad in np.flatnonzero(clases == SIN_PAREJA).tolist():
+        destino = filas_banco if rng.integers(0, 2) else filas_auxiliar
+        agregar(destino, unidad, dias[unidad], centavos[unidad], f"{palabras[unidad][0]} varios")
+
+    columnas = ['unidad', 'dia', 'centavos', 'es', 'descripcion']
+    df = pd.concat([
+        pd.DataFrame(filas_banco, columns=columnas).assign(tipo='banco'),
+        pd.DataFrame(filas_auxiliar, columns=columnas).assign(tipo='auxiliar')
+    ], ignore_index=True)
+    # Ids en orden aleatorio para que el orden de inserción no favorezca al matching
+    df['id'] = rng.permutation(len(df)) + 1
+    df['fecha'] = (pd.Timestamp(FECHA_INICIO) + pd.to_timedelta(df['dia'], unit='D')).dt.strftime('%Y-%m-%d')
+    df['valor'] = df['centavos'] / 100
+
+    # Parejas esperadas: cada banco con cada auxiliar de la misma unidad
+    con_pareja = df[clases[df['unidad'].to_numpy()] != SIN_PAREJA]
+    parejas = con_pareja.loc[con_pareja['tipo'] == 'banco', ['unidad', 'id']].merge(
+        con_pareja.loc[con_pareja['tipo'] == 'auxiliar', ['unidad', 'id']], on='unidad', suffixes=('_banco', '_auxiliar')
+    )
+    esperadas = set(zip(parejas['id_banco'].tolist(), parejas['id_auxiliar'].tolist()))
+    return df[['id', 'fecha', 'descripcion', 'valor', 'tipo', 'es']], esperadas, len(con_pareja)
+
+
+def guardar_datos(engine, df):
+    """Inserta la empresa, la conciliación y los movimientos con INSERTs por lote."""
+    Base.metadata.create_all(bind=engine)
+    normalizadas, referencias = caracteristicas_descripcion_columna(df['descripcion'])
+    registros = df.assign(
+        id_conciliacion=1, estado_conciliacion='no_conciliado',
+        descripcion_normalizada=normalizadas, referencias_descripcion=referencias
+    ).to_dict('records')
+    with engine.begin() as conn:
+        conn.execute(insert(Empresa), [{'id': 1, 'nit': '900000000', 'razon_social': 'Benchmark'}])
+        conn.execute(insert(Conciliacion), [{'id': 1, 'id_empresa': 1, 'estado': 'en_proceso'}])
+        for i in range(0, len(registros), TAMANO_LOTE_INSERT):
+            conn.execute(insert(Movimiento), registros[i:i + TAMANO_LOTE_INSERT])
+
+
+def parejas_encontradas(db):
+    """Parejas (id_banco, id_auxiliar) guardadas: matches 1:1 y el producto de cada grupo."""
+    parejas = set(db.execute(select(ConciliacionMatch.id_movimiento_banco, ConciliacionMatch.id_movimiento_auxiliar)))
+    parejas.update(db.execute(
+        select(ConciliacionManualBanco.id_movimiento_banco, ConciliacionManualAuxiliar.id_movimiento_auxiliar).join(
+            ConciliacionManualAuxiliar,
+            ConciliacionManualAuxiliar.id_conciliacion_manual == ConciliacionManualBanco.id_conciliacion_manual
+        )
+    ))
+    return {(int(banco), int(auxiliar)) for banco, auxiliar in parejas}
+
+
+def conciliar_en_proceso(ruta_db, opciones):
+    """
+    Ejecuta la conciliación sobre la base del benchmark (en un proceso nuevo).
+
+    Returns:
+        Tupla (stats de la conciliación, segundos, consultas ejecutadas, pico de
+        memoria asignada en MB o None).
+    """
+    engine = create_engine(f"sqlite:///{ruta_db}")
+    consultas = {'total': 0}
+
+    def contar_consulta(*_):
+        consultas['total'] += 1
+
+    event.listen(engine, 'before_cursor_execute', contar_consulta)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        with MedidorMemoria(opciones['memoria_detallada']) as medidor:
+            inicio = time.perf_counter()
+            stats = realizar_conciliacion_automatica(
+                1, db, modo_asignacion=opciones['modo_asignacion'], estrategias=opciones['estrategias']
+            )
+            segundos = time.perf_counter() - inicio
+    finally:
+        db.close()
+        engine.dispose()
+    stats.update(medidor.stats())
+    return stats, segundos, consultas['total'], medidor.pico_mb
+
+
+def ejecutar_tamano(filas, opciones):
+    """Genera y guarda un tamaño, lo concilia en un proceso nuevo y devuelve sus métricas."""
+    inicio = time.perf_counter()
+    df, esperadas, movimientos_con_pareja = generar_datos(filas, **opciones['generacion'])
+    tiempo_generacion = time.perf_counter() - inicio
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_db = os.path.join(directorio, 'benchmark.db')
+        engine = create_engine(f"sqlite:///{ruta_db}")
+        inicio = time.perf_counter()
+        guardar_datos(engine, df)
+        tiempo_insercion = time.perf_counter() - inicio
+
+        # Proceso nuevo: el pico de memoria del proceso es solo el de la conciliación
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            stats, tiempo_conciliacion, consultas, memoria_asignada = executor.submit(
+                conciliar_en_proceso, ruta_db, opciones
+            ).result()
+
+        db = sessionmaker(bind=engine)()
+        encontradas = parejas_encontradas(db)
+        db.close()
+        engine.dispose()
+
+    etapas = {}
+    for etapa in stats['etapas']:
+        acumulada = etapas.setdefault(etapa['estrategia'], {'tiempo_segundos': 0.0, 'candidatos': 0, 'matches': 0})
+        acumulada['tiempo_segundos'] = round(acumulada['tiempo_segundos'] + etapa['tiempo_segundos'], 4)
+        acumulada['candidatos'] += etapa['candidatos']
+        acumulada['matches'] += etapa['matches']
+    # Entradas y salidas corren en paralelo: se toma la suma de ambas como costo de cada etapa
+    tiempo_etapas = sum(etapa['tiempo_segundos'] for etapa in etapas.values())
+    aciertos = len(encontradas & esperadas)
+    ids_con_pareja = {mov_id for pareja in esperadas for mov_id in pareja}
+    conciliados = {mov_id for pareja in encontradas for mov_id in pareja}
+    resultado = {
+        'filas': len(df),
+        'tiempo_generacion_segundos': round(tiempo_generacion, 3),
+        'tiempo_insercion_segundos': round(tiempo_insercion, 3),
+        'tiempo_conciliacion_segundos': round(tiempo_conciliacion, 3),
+        'tiempo_etapas_segundos': round(tiempo_etapas, 3),
+        'etapas': etapas,
+        'consultas_bd': consultas,
+        'memoria_pico_proceso_mb': stats['memoria_pico_proceso_mb'],
+        'total_matches': stats['total_matches'],
+        'grupos_por_suma': stats['grupos_por_suma'],
+        'busqueda_grupos_interrumpida': stats['busqueda_grupos_interrumpida'],
+        'parejas_esperadas': len(esperadas),
+        'recall_parejas': round(aciertos / len(esperadas), 4) if esperadas else None,
+        'precision_parejas': round(aciertos / len(encontradas), 4) if encontradas else None,
+        # Con montos y fechas repetidos una pareja puede cruzarse con otra equivalente
+        'recall_movimientos': round(len(conciliados & ids_con_pareja) / movimientos_con_pareja, 4) if movimientos_con_pareja else None
+    }
+    if memoria_asignada is not None:
+        resultado['memoria_pico_conciliacion_mb'] = memoria_asignada
+    return resultado
+
+
+def commit_actual():
+    """Hash corto del commit del repositorio (None fuera de git)."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def imprimir_resultado(resultado):
+    print(f"\n📊 {resultado['filas']} movimientos: conciliación en {resultado['tiempo_conciliacion_segundos']}s "
+          f"({resultado['consultas_bd']} consultas, pico {resultado['memoria_pico_proceso_mb']} MB"
+          + (f", {resultado['memoria_pico_conciliacion_mb']} MB asignados" if 'memoria_pico_conciliacion_mb' in resultado else '')
+          + ")")
+    for nombre, etapa in resultado['etapas'].items():
+        print(f"   {nombre:<18} {etapa['tiempo_segundos']:>9.4f}s  {etapa['candidatos']:>10} candidatos  {etapa['matches']:>8} matches")
+    print(f"   {'etapas (E + S)':<18} {resultado['tiempo_etapas_segundos']:>9.4f}s")
+    print(f"   recall parejas {resultado['recall_parejas']}  precisión {resultado['precision_parejas']}  "
+          f"recall movimientos {resultado['recall_movimientos']}")
+
+
+def comparar(resultados, archivo_base):
+    """Muestra las diferencias contra un resultado guardado con --salida."""
+    with open(archivo_base, encoding='utf-8') as f:
+        base = json.load(f)
+    if base['parametros'] != resultados['parametros']:
+        print("⚠️ Los parámetros difieren del resultado base; la comparación no es directa")
+    anteriores = {resultado['filas']: resultado for resultado in base['resultados']}
+    print(f"\nComparación contra {base.get('commit') or archivo_base}:")
+    for resultado in resultados['resultados']:
+        anterior = anteriores.get(resultado['filas'])
+        if anterior is None:
+            continue
+        razon = resultado['tiempo_conciliacion_segundos'] / anterior['tiempo_conciliacion_segundos'] if anterior['tiempo_conciliacion_segundos'] else float('nan')
+        print(f"   {resultado['filas']:>8} filas: tiempo x{razon:.2f} "
+              f"({anterior['tiempo_conciliacion_segundos']}s -> {resultado['tiempo_conciliacion_segundos']}s), "
+              f"consultas {anterior['consultas_bd']} -> {resultado['consultas_bd']}, "
+              f"recall {anterior['recall_parejas']} -> {resultado['recall_parejas']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la conciliación automática con datos sintéticos")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=TAMANOS_POR_DEFECTO, help="movimientos por ejecución")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--densidad-duplicados", type=float, default=0.2, help="fracción de montos repetidos")
+    parser.add_argument("--desfase-dias", type=int, default=3, help="desfase máximo de fechas banco/auxiliar")
+    parser.add_argument("--fraccion-partidos", type=float, default=0.05, help="fracción de movimientos partidos")
+    parser.add_argument("--fraccion-sin-pareja", type=float, default=0.05, help="fracción de movimientos sin contraparte")
+    parser.add_argument("--fraccion-comision", type=float, default=0.03, help="fracción de parejas con comisión")
+    parser.add_argument("--modo-asignacion", default="greedy")
+    parser.add_argument("--estrategias", default=None, help="estrategias separadas por coma")
+    parser.add_argument("--memoria-detallada", action="store_true", help="medir la memoria asignada con tracemalloc")
+    parser.add_argument("--salida", help="archivo JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="archivo JSON de una ejecución anterior")
+    args = parser.parse_args()
+
+    opciones = {
+        'generacion': {
+            'semilla': args.semilla, 'densidad_duplicados': args.densidad_duplicados, 'desfase_dias': args.desfase_dias,
+            'fraccion_partidos': args.fraccion_partidos, 'fraccion_sin_pareja': args.fraccion_sin_pareja,
+            'fraccion_comision': args.fraccion_comision
+        },
+        'modo_asignacion': args.modo_asignacion,
+        'estrategias': args.estrategias,
+        'memoria_detallada': args.memoria_detallada
+    }
+    resultados = {
+        'commit': commit_actual(),
+        'entorno': {
+            'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'sqlalchemy': sqlalchemy.__version__, 'plataforma': platform.platform()
+        },
+        'parametros': opciones,
+        'resultados': []
+    }
+    for filas in args.tamanos:
+        print(f"Ejecutando benchmark con {filas} movimientos...")
+        resultado = ejecutar_tamano(filas, opciones)
+        imprimir_resultado(resultado)
+        resultados['resultados'].append(resultado)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.salida}")
+    if args.comparar:
+        comparar(resultados, args.comparar)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
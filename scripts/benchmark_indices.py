@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Planes y tiempos de las consultas de conciliación antes y después de los
+índices compuestos de movimientos y conciliacion_matches.
+
+Genera una base SQLite temporal con --filas movimientos (1.000.000 por defecto)
+repartidos en --conciliaciones conciliaciones, con una parte ya conciliada y un
+match por cada par de movimientos conciliados. Las tablas se crean sin los
+índices de la migración; se ejecutan las consultas representativas (carga de
+pendientes por tipo y E/S, detalle, conteo agrupado del listado y matches de
+una conciliación), se muestra el plan y el tiempo mediano, se crean los índices
+con migrate_add_indices_conciliacion y se repite.
+
+Con --database-url se usa otra base (ej. PostgreSQL, donde el plan sale de
+EXPLAIN ANALYZE). Debe estar vacía: el script no usa una base que ya tenga la
+tabla movimientos.
+
+Uso:
+  python scripts/benchmark_indices.py
+  python scripts/benchmark_indices.py --filas 100000 --salida indices.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# El benchmark usa su propia base; app.database solo exige que la variable exista
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import bindparam, create_engine, inspect, insert, text
+
+from app.database import Base
+from app.models import Conciliacion, ConciliacionMatch, Empresa, Movimiento
+from benchmark_conciliacion import commit_actual
+from migrate_add_indices_conciliacion import INDEXES, add_indexes
+
+TAMANO_LOTE_INSERT = 50000
+
+# Conciliaciones del listado de una empresa en el conteo agrupado
+CONCILIACIONES_LISTADO = 40
+
+CONSULTAS = {
+    'pendientes_banco_E': """
+        SELECT id, fecha, descripcion, valor, descripcion_normalizada, referencias_descripcion
+        FROM movimientos
+        WHERE id_conciliacion = :conciliacion AND estado_conciliacion = 'no_conciliado' AND tipo = 'banco' AND es = 'E'
+    """,
+    'detalle_pendientes': """
+        SELECT id, fecha, descripcion, valor, tipo, es
+        FROM movimientos
+        WHERE id_conciliacion = :conciliacion AND estado_conciliacion = 'no_conciliado'
+    """,
+    'conteo_agrupado': """
+        SELECT id_conciliacion, COUNT(id), SUM(CASE WHEN estado_conciliacion = 'conciliado' THEN 1 ELSE 0 END)
+        FROM movimientos
+        WHERE id_conciliacion IN :conciliaciones
+        GROUP BY id_conciliacion
+    """,
+    'matches_conciliacion': """
+        SELECT id, id_movimiento_banco, id_movimiento_auxiliar, criterio_match, diferencia_valor
+        FROM conciliacion_matches
+        WHERE id_conciliacion = :conciliacion
+    """,
+}
+
+
+def sentencia(sql):
+    """text() de la consulta; la lista de conciliaciones se expande a IN (...)."""
+    stmt = text(sql)
+    if ':conciliaciones' in sql:
+        stmt = stmt.bindparams(bindparam('conciliaciones', expanding=True))
+    return stmt
+
+
+def generar_datos(engine, filas, conciliaciones, semilla=42, fraccion_conciliados=0.7):
+    """
+    Inserta movimientos agrupados por conciliación (como quedan al cargar los
+    archivos) y un match por cada par de movimientos conciliados consecutivos.
+    """
+    rng = np.random.default_rng(semilla)
+    ids = np.arange(1, filas + 1)
+    id_conciliacion = np.sort(rng.integers(1, conciliaciones + 1, filas))
+    conciliado = rng.random(filas) < fraccion_conciliados
+    movimientos = pd.DataFrame({
+        'id': ids,
+        'id_conciliacion': id_conciliacion,
+        'fecha': (pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 30, filas), unit='D')).strftime('%Y-%m-%d'),
+        'descripcion': 'pago referencia ' + pd.Series(rng.integers(0, 100000, filas)).astype(str),
+        'valor': np.round(rng.uniform(1000, 5000000, filas), 2),
+        'tipo': np.where(rng.random(filas) < 0.5, 'banco', 'auxiliar'),
+        'es': np.where(rng.random(filas) < 0.5, 'E', 'S'),
+        'estado_conciliacion': np.where(conciliado, 'conciliado', 'no_conciliado'),
+    })
+    ids_conciliados = ids[conciliado]
+    pares = len(ids_conciliados) // 2
+    matches = pd.DataFrame({
+        'id_conciliacion': id_conciliacion[conciliado][0:2 * pares:2],
+        'id_movimiento_banco': ids_conciliados[0:2 * pares:2],
+        'id_movimiento_auxiliar': ids_conciliados[1:2 * pares:2],
+        'fecha_match': '2025-02-01 00:00:00',
+        'criterio_match': 'exacto_E',
+        'diferencia_valor': 0.0,
+    })
+
+    with engine.begin() as conn:
+        conn.execute(insert(Empresa), [{'id': 1, 'nit': '900000000', 'razon_social': 'Benchmark'}])
+        conn.execute(insert(Conciliacion), [{'id': i, 'id_empresa': 1, 'estado': 'en_proceso'} for i in range(1, conciliaciones + 1)])
+        for modelo, df in ((Movimiento, movimientos), (ConciliacionMatch, matches)):
+            registros = df.to_dict('records')
+            for i in range(0, len(registros), TAMANO_LOTE_INSERT):
+                conn.execute(insert(modelo), registros[i:i + TAMANO_LOTE_INSERT])
+    return len(matches)
+
+
+def plan_consulta(conn, sql, parametros):
+    """Plan de la consulta como lista de líneas (EXPLAIN ANALYZE en PostgreSQL)."""
+    dialecto = conn.dialect.name
+    prefijo = {'sqlite': 'EXPLAIN QUERY PLAN ', 'postgresql': 'EXPLAIN ANALYZE '}.get(dialecto, 'EXPLAIN ')
+    filas = conn.execute(sentencia(prefijo + sql.strip()), parametros)
+    if dialecto == 'sqlite':
+        return [fila[3] for fila in filas]
+    if dialecto == 'postgresql':
+        return [fila[0] for fila in filas]
+    return [' | '.join(str(valor) for valor in fila) for fila in filas]
+
+
+def medir_consultas(engine, parametros, repeticiones):
+    """Tiempo mediano (en segundos), filas devueltas y plan de cada consulta."""
+    resultados = {}
+    with engine.connect() as conn:
+        for nombre, sql in CONSULTAS.items():
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                filas = conn.execute(sentencia(sql), parametros).fetchall()
+                tiempos.append(time.perf_counter() - inicio)
+            resultados[nombre] = {
+                'tiempo_segundos': round(statistics.median(tiempos), 5),
+                'filas': len(filas),
+                'plan': plan_consulta(conn, sql, parametros),
+            }
+    return resultados
+
+
+def imprimir_comparacion(antes, despues):
+    for nombre in CONSULTAS:
+        razon = antes[nombre]['tiempo_segundos'] / despues[nombre]['tiempo_segundos'] if despues[nombre]['tiempo_segundos'] else float('nan')
+        print(f"\n🔎 {nombre} ({despues[nombre]['filas']} filas): "
+              f"{antes[nombre]['tiempo_segundos']}s -> {despues[nombre]['tiempo_segundos']}s (x{razon:.1f})")
+        print("   antes:   " + "\n            ".join(antes[nombre]['plan']))
+        print("   después: " + "\n            ".join(despues[nombre]['plan']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Planes de consulta antes y después de los índices de conciliación")
+    parser.add_argument("--filas", type=int, default=1000000, help="movimientos a generar")
+    parser.add_argument("--conciliaciones", type=int, default=200, help="conciliaciones entre las que se reparten")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--repeticiones", type=int, default=5, help="ejecuciones por consulta (se reporta la mediana)")
+    parser.add_argument("--database-url", help="base vacía a usar en lugar de una SQLite temporal")
+    parser.add_argument("--salida", help="archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        engine = create_engine(args.database_url or f"sqlite:///{os.path.join(directorio, 'indices.db')}")
+        if inspect(engine).has_table(Movimiento.__tablename__):
+            print("⚠️ La base ya tiene la tabla movimientos; usar una base vacía")
+            return 1
+
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            for index in INDEXES:
+                index.drop(bind=conn)
+
+        print(f"Generando {args.filas} movimientos en {args.conciliaciones} conciliaciones...")
+        inicio = time.perf_counter()
+        matches = generar_datos(engine, args.filas, args.conciliaciones, args.semilla)
+        print(f"   {matches} matches, generado en {time.perf_counter() - inicio:.1f}s")
+
+        parametros = {
+            'conciliacion': args.conciliaciones // 2 or 1,
+            'conciliaciones': list(range(1, min(args.conciliaciones, CONCILIACIONES_LISTADO) + 1)),
+        }
+        antes = medir_consultas(engine, parametros, args.repeticiones)
+
+        inicio = time.perf_counter()
+        add_indexes(engine)
+        tiempo_indices = round(time.perf_counter() - inicio, 2)
+        print(f"   índices creados en {tiempo_indices}s")
+        despues = medir_consultas(engine, parametros, args.repeticiones)
+        engine.dispose()
+
+    imprimir_comparacion(antes, despues)
+
+    if args.salida:
+        resultados = {
+            'commit': commit_actual(),
+            'entorno': {
+                'python': platform.python_version(), 'sqlalchemy': sqlalchemy.__version__,
+                'base': engine.dialect.name, 'plataforma': platform.platform()
+            },
+            'parametros': {'filas': args.filas, 'conciliaciones': args.conciliaciones, 'semilla': args.semilla,
+                           'repeticiones': args.repeticiones},
+            'tiempo_creacion_indices_segundos': tiempo_indices,
+            'antes': antes,
+            'despues': despues,
+        }
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
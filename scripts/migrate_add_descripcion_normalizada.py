@@ -0,0 +1,91 @@
+"""
+Migration script to add descripcion_normalizada and referencias_descripcion
+columns to movimientos table and backfill them for existing rows.
+
+The backfill runs in chunks (MIGRATION_CHUNK_SIZE, default 5000) and can be
+interrupted and re-run: only rows with descripcion_normalizada NULL are processed.
+
+Run:
+  python scripts/migrate_add_descripcion_normalizada.py
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from sqlalchemy import create_engine, inspect, text
+from dotenv import load_dotenv
+
+from app.utils.descripciones import caracteristicas_descripcion_columna
+
+# Load environment variables
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    print("DATABASE_URL not found in environment variables")
+    raise SystemExit(1)
+
+CHUNK_SIZE = int(os.getenv("MIGRATION_CHUNK_SIZE", "5000"))
+
+engine = create_engine(DATABASE_URL)
+
+COLUMNS = ['descripcion_normalizada', 'referencias_descripcion']
+
+
+def add_columns():
+    existing = {column['name'] for column in inspect(engine).get_columns('movimientos')}
+    with engine.connect() as conn:
+        for column in COLUMNS:
+            if column in existing:
+                print(f"Column {column} already exists")
+                continue
+            conn.execute(text(f"ALTER TABLE movimientos ADD COLUMN {column} TEXT"))
+            print(f"Added {column} column to movimientos table")
+        conn.commit()
+
+
+def backfill():
+    total = 0
+    ultimo_id = 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(text("""
+                SELECT id, descripcion
+                FROM movimientos
+                WHERE descripcion_normalizada IS NULL AND id > :ultimo_id
+                ORDER BY id
+                LIMIT :limite
+            """), {'ultimo_id': ultimo_id, 'limite': CHUNK_SIZE}).fetchall()
+            if not rows:
+                break
+
+            ids = [row[0] for row in rows]
+            normalizadas, referencias = caracteristicas_descripcion_columna(pd.Series([row[1] for row in rows]))
+            conn.execute(
+                text("""
+                    UPDATE movimientos
+                    SET descripcion_normalizada = :normalizada, referencias_descripcion = :referencias
+                    WHERE id = :id
+                """),
+                [
+                    {'id': id_, 'normalizada': normalizada, 'referencias': referencia}
+                    for id_, normalizada, referencia in zip(ids, normalizadas, referencias)
+                ]
+            )
+            conn.commit()
+
+        total += len(ids)
+        ultimo_id = ids[-1]
+        print(f"Backfilled {total} movimientos")
+    print(f"Backfill done: {total} movimientos updated")
+
+
+def migrate():
+    add_columns()
+    backfill()
+
+
+if __name__ == "__main__":
+    migrate()
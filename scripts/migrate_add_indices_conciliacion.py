@@ -0,0 +1,64 @@
+"""
+Migration script to add the composite indexes used by the reconciliation
+queries (declared in app/models.py):
+
+  movimientos (id_conciliacion, estado_conciliacion, tipo, es)
+  conciliacion_matches (id_conciliacion)
+
+Indexes that already exist are skipped, so it can be re-run. On PostgreSQL
+they are built with CREATE INDEX CONCURRENTLY so large tables stay writable
+while the index is created.
+
+Run:
+  python scripts/migrate_add_indices_conciliacion.py
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, inspect, text
+from dotenv import load_dotenv
+
+from app.models import ConciliacionMatch, Movimiento
+
+# Load environment variables
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    print("DATABASE_URL not found in environment variables")
+    raise SystemExit(1)
+
+engine = create_engine(DATABASE_URL)
+
+INDEXES = [index for model in (Movimiento, ConciliacionMatch) for index in model.__table__.indexes]
+
+
+def add_indexes(engine):
+    inspector = inspect(engine)
+    concurrently = 'CONCURRENTLY ' if engine.dialect.name == 'postgresql' else ''
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for index in INDEXES:
+            table = index.table.name
+            if index.name in {existing['name'] for existing in inspector.get_indexes(table)}:
+                print(f"Index {index.name} already exists")
+                continue
+            columns = ', '.join(column.name for column in index.columns)
+            print(f"Creating index {index.name} on {table} ({columns})...")
+            conn.execute(text(f"CREATE INDEX {concurrently}{index.name} ON {table} ({columns})"))
+            print(f"Added index {index.name}")
+
+        # Refresh planner statistics so the new indexes are used right away
+        if engine.dialect.name in ('postgresql', 'sqlite'):
+            for table in sorted({index.table.name for index in INDEXES}):
+                conn.execute(text(f"ANALYZE {table}"))
+
+
+def migrate():
+    add_indexes(engine)
+
+
+if __name__ == "__main__":
+    migrate()
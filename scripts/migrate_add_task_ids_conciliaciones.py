@@ -0,0 +1,40 @@
+"""
+Migration script to add ids_conciliaciones column to tasks table.
+
+Batch reconciliation tasks ('conciliacion_lote') store the ids of every
+conciliación in the batch there, comma separated; id_conciliacion keeps
+pointing to one of them.
+
+Run:
+  python scripts/migrate_add_task_ids_conciliaciones.py
+"""
+
+import os
+from sqlalchemy import create_engine, inspect, text
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    print("DATABASE_URL not found in environment variables")
+    raise SystemExit(1)
+
+engine = create_engine(DATABASE_URL)
+
+def migrate():
+    columns = {column['name'] for column in inspect(engine).get_columns('tasks')}
+    if 'ids_conciliaciones' in columns:
+        print("Column ids_conciliaciones already exists")
+        return
+
+    with engine.connect() as conn:
+        conn.execute(text("""
+            ALTER TABLE tasks ADD COLUMN ids_conciliaciones TEXT
+        """))
+        conn.commit()
+        print("Added ids_conciliaciones column to tasks table")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,175 @@
+"""
+Migration script to convert movimientos.fecha to DATE and movimientos.valor to
+NUMERIC(18,2).
+
+The converted values are written to the new columns fecha_date and
+valor_numeric, backfilled in chunks (MIGRATION_CHUNK_SIZE, default 5000)
+keyset-paginated by id, and then swapped in place of the old columns in one
+transaction. Dates are parsed with the same format cascade as the uploads
+(app/utils/fechas.py); amounts are rounded to cents.
+
+The swap transaction first runs a catch-up backfill for the rows inserted
+while the main backfill was running (on PostgreSQL the table is locked against
+writes for the duration of the swap). The old text column is kept as
+fecha_texto: dates that could not be parsed are left NULL in fecha and listed
+by id, so they can be reviewed and fixed before dropping fecha_texto by hand.
+
+The backfill can be interrupted and re-run: only rows with valor_numeric NULL
+are processed. Once the columns are swapped the script does nothing.
+
+Run:
+  python scripts/migrate_movimientos_fecha_valor.py
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from sqlalchemy import Date, create_engine, inspect, text
+from dotenv import load_dotenv
+
+from app.utils.fechas import normalizar_fechas_columna
+
+# Load environment variables
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    print("DATABASE_URL not found in environment variables")
+    raise SystemExit(1)
+
+CHUNK_SIZE = int(os.getenv("MIGRATION_CHUNK_SIZE", "5000"))
+
+engine = create_engine(DATABASE_URL)
+
+# Old column -> (new column, SQL type)
+COLUMNS = {
+    'fecha': ('fecha_date', 'DATE'),
+    'valor': ('valor_numeric', 'NUMERIC(18,2)'),
+}
+
+
+def already_migrated():
+    columns = {column['name']: column['type'] for column in inspect(engine).get_columns('movimientos')}
+    return isinstance(columns.get('fecha'), Date) and 'fecha_date' not in columns
+
+
+def add_columns():
+    existing = {column['name'] for column in inspect(engine).get_columns('movimientos')}
+    with engine.connect() as conn:
+        for new_column, sql_type in COLUMNS.values():
+            if new_column in existing:
+                print(f"Column {new_column} already exists")
+                continue
+            conn.execute(text(f"ALTER TABLE movimientos ADD COLUMN {new_column} {sql_type}"))
+            print(f"Added {new_column} column to movimientos table")
+        conn.commit()
+
+
+# Unparseable dates listed by the swap
+MAX_IDS_REPORTED = 20
+
+
+def backfill_chunk(conn, ultimo_id):
+    """Converts the next chunk of rows after ultimo_id and returns their ids."""
+    rows = conn.execute(text("""
+        SELECT id, fecha, valor
+        FROM movimientos
+        WHERE valor_numeric IS NULL AND id > :ultimo_id
+        ORDER BY id
+        LIMIT :limite
+    """), {'ultimo_id': ultimo_id, 'limite': CHUNK_SIZE}).fetchall()
+    if not rows:
+        return []
+
+    ids = [row[0] for row in rows]
+    fechas = normalizar_fechas_columna(pd.Series([row[1] for row in rows], dtype=object))
+    conn.execute(
+        text("""
+            UPDATE movimientos
+            SET fecha_date = :fecha, valor_numeric = :valor
+            WHERE id = :id
+        """),
+        [
+            {
+                'id': id_,
+                'fecha': None if pd.isna(fecha) else fecha,
+                'valor': None if valor is None else round(float(valor), 2)
+            }
+            for id_, fecha, valor in zip(ids, fechas, (row[2] for row in rows))
+        ]
+    )
+    return ids
+
+
+def backfill_pending(conn):
+    """Converts every pending row through conn and returns how many there were."""
+    total = 0
+    ultimo_id = 0
+    while True:
+        ids = backfill_chunk(conn, ultimo_id)
+        if not ids:
+            return total
+        total += len(ids)
+        ultimo_id = ids[-1]
+
+
+def backfill():
+    total = 0
+    ultimo_id = 0
+    while True:
+        with engine.connect() as conn:
+            ids = backfill_chunk(conn, ultimo_id)
+            if not ids:
+                break
+            conn.commit()
+
+        total += len(ids)
+        ultimo_id = ids[-1]
+        print(f"Backfilled {total} movimientos")
+    print(f"Backfill done: {total} movimientos updated")
+
+
+def report_unparsed_dates(conn):
+    rows = conn.execute(text("""
+        SELECT id
+        FROM movimientos
+        WHERE fecha_date IS NULL AND fecha IS NOT NULL AND TRIM(fecha) <> ''
+        ORDER BY id
+    """)).fetchall()
+    if rows:
+        ids = ', '.join(str(row[0]) for row in rows[:MAX_IDS_REPORTED])
+        more = f" (and {len(rows) - MAX_IDS_REPORTED} more)" if len(rows) > MAX_IDS_REPORTED else ""
+        print(f"{len(rows)} dates could not be parsed and are NULL in fecha; "
+              f"their text is kept in fecha_texto. Ids: {ids}{more}")
+    return [row[0] for row in rows]
+
+
+def swap_columns():
+    with engine.begin() as conn:
+        if engine.dialect.name == 'postgresql':
+            # Keeps the running app from inserting rows between the catch-up and the swap
+            conn.execute(text("LOCK TABLE movimientos IN EXCLUSIVE MODE"))
+        print(f"Catch-up backfill: {backfill_pending(conn)} movimientos updated")
+        report_unparsed_dates(conn)
+
+        conn.execute(text("ALTER TABLE movimientos DROP COLUMN valor"))
+        conn.execute(text("ALTER TABLE movimientos RENAME COLUMN valor_numeric TO valor"))
+        print("Replaced valor with valor_numeric")
+        conn.execute(text("ALTER TABLE movimientos RENAME COLUMN fecha TO fecha_texto"))
+        conn.execute(text("ALTER TABLE movimientos RENAME COLUMN fecha_date TO fecha"))
+        print("Replaced fecha with fecha_date; the old column is kept as fecha_texto")
+
+
+def migrate():
+    if already_migrated():
+        print("movimientos.fecha is already a DATE column")
+        return
+    add_columns()
+    backfill()
+    swap_columns()
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Script para conciliar automáticamente varias conciliaciones en paralelo
+(cierre de mes). Usa procesos independientes, cada uno con su propia conexión.
+
+Uso:
+  python scripts/procesar_lote.py --ids 12 13 14
+  python scripts/procesar_lote.py --empresa 3 --mes 01 --anio 2025 --workers 4
+"""
+
+import argparse
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.repositories.factory import RepositoryFactory
+from app.utils.asignacion import MODOS_ASIGNACION
+from app.utils.conciliacion_lote import procesar_conciliaciones_en_lote
+
+
+def seleccionar_conciliaciones(args):
+    """Ids a procesar: los indicados o las conciliaciones no finalizadas de la empresa/periodo."""
+    if args.ids:
+        return args.ids
+    db = SessionLocal()
+    try:
+        conciliaciones = RepositoryFactory(db).get_conciliacion_repository().get_by_empresa_periodo(
+            args.empresa, args.mes, args.anio, incluir_finalizadas=args.incluir_finalizadas
+        )
+        return [c.id for c in conciliaciones]
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conciliación automática en lote")
+    seleccion = parser.add_mutually_exclusive_group(required=True)
+    seleccion.add_argument("--ids", type=int, nargs="+", help="ids de las conciliaciones")
+    seleccion.add_argument("--empresa", type=int, help="id de la empresa")
+    parser.add_argument("--mes", help="mes conciliado (con --empresa)")
+    parser.add_argument("--anio", help="año conciliado (con --empresa)")
+    parser.add_argument("--incluir-finalizadas", action="store_true", help="incluir conciliaciones finalizadas")
+    parser.add_argument("--workers", type=int, default=None, help="procesos simultáneos")
+    parser.add_argument("--modo-asignacion", choices=MODOS_ASIGNACION, default="greedy")
+    parser.add_argument("--incremental", action="store_true", help="solo movimientos nuevos desde la última ejecución")
+    parser.add_argument("--estrategias", default=None, help="estrategias separadas por coma")
+    args = parser.parse_args()
+
+    conciliacion_ids = seleccionar_conciliaciones(args)
+    if not conciliacion_ids:
+        print("No hay conciliaciones para procesar")
+        return 0
+
+    resultado = procesar_conciliaciones_en_lote(
+        conciliacion_ids, max_workers=args.workers, modo_asignacion=args.modo_asignacion,
+        incremental=args.incremental, estrategias=args.estrategias
+    )
+    for item in resultado['resultados']:
+        if item['estado'] == 'ok':
+            print(f"  #{item['conciliacion_id']}: {item['stats']['total_matches']} matches en {item['tiempo_segundos']}s")
+        else:
+            print(f"  #{item['conciliacion_id']}: ERROR {item['error']}")
+    print(json.dumps(resultado['stats'], indent=2, ensure_ascii=False))
+    print(f"📊 {len(conciliacion_ids)} conciliaciones en {resultado['tiempo_segundos']}s con {resultado['workers']} workers")
+    return 1 if resultado['stats']['conciliaciones_con_error'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,769 @@
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import asyncio
+import io
+import json
+import time
+import tracemalloc
+from datetime import date
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import BackgroundTasks, UploadFile
+from sqlalchemy import create_engine, event, text, update
+from sqlalchemy.exc import StatementError
+from sqlalchemy.orm import sessionmaker
+from app.api import routes_conciliacion
+from app.database import Base
+from app.models import (
+    Conciliacion, ConciliacionManual, ConciliacionManualAuxiliar, ConciliacionManualBanco, ConciliacionMatch, Empresa,
+    IndiceConciliacion, Movimiento, Task
+)
+from app.repositories.factory import RepositoryFactory
+from app.utils.asignacion import asignar_candidatos
+from app.utils.conciliacion_lote import procesar_conciliaciones_en_lote
+from app.utils.fechas import normalizar_fecha, normalizar_fechas_columna
+from app.utils import conciliaciones, previsualizacion
+from app.utils.memoria import MedidorMemoria
+from app.utils.previsualizacion import aplicar_propuestas, lineas_ndjson_previsualizacion, previsualizar_conciliacion_automatica
+from app.utils.subconjuntos import COMBINACIONES_POR_REVISION, PresupuestoBusqueda, buscar_subconjunto
+from app.utils.conciliaciones import (
+    DIA_INVALIDO, EstrategiaMatching, calcular_conciliacion, calcular_matches_por_tipo, cargar_movimientos_pendientes, categorizar_por_valor_columna, construir_estrategias, encontrar_grupos_por_suma, crear_dataframe_movimientos, encontrar_matches_exactos,
+    encontrar_matches_tolerancia_valor, encontrar_matches_valor_fecha_aproximada, generar_candidatos_aproximados,
+    generar_candidatos_valor_descripcion, realizar_conciliacion_automatica, crear_conciliacion_manual, limpiar_descripcion, limpiar_descripcion_columna,
+    palabras_descripcion_columna, parse_fecha_segura, parse_fechas_columna
+)
+
+
+# Base de datos SQLite en memoria con una conciliación vacía
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add(Empresa(id=1, nit='900123456', razon_social='Empresa Test'))
+    session.add(Conciliacion(id=1, id_empresa=1, estado='en_proceso'))
+    session.commit()
+    yield session
+    session.close()
+
+
+def agregar_movimientos(db, filas):
+    db.add_all([
+        Movimiento(id_conciliacion=1, fecha=fecha, descripcion=descripcion, valor=valor,
+                   tipo=tipo, es=es, estado_conciliacion=estado)
+        for tipo, es, fecha, descripcion, valor, estado in filas
+    ])
+    db.commit()
+
+
+# Test: el parser vectorizado de fechas da lo mismo que el parse_fecha_segura original
+def test_parse_fechas_columna_equivale_a_parse_fecha_segura():
+    fechas = pd.Series(['2025-01-07', '13/01/2025', '01/13/2025', '07-01-2025', '20250107',
+                        '07/01/25', ' 2025-02-03 ', '', None, 'no es fecha'], dtype=object)
+    # Resultados del parse_fecha_segura escalar anterior a la vectorización
+    esperado = pd.Series(pd.to_datetime([
+        '2025-01-07', '2025-01-13', '2025-01-13', '2025-01-07', '2025-01-07',
+        '2025-01-07', '2025-02-03', None, None, None
+    ]), dtype='datetime64[ns]')
+    pd.testing.assert_series_equal(parse_fechas_columna(fechas), esperado)
+    assert [parse_fecha_segura(f) for f in fechas[:3]] == list(esperado[:3])
+
+
+# Test: el formato dominante de la columna se aplica a todos los valores que encajan en él
+def test_parse_fechas_columna_formato_dominante():
+    # Archivo con fechas mes/día: '05/01/2025' es 1 de mayo aunque también encaje en %d/%m/%Y
+    fechas = pd.Series(['01/13/2025', '01/14/2025', '01/13/2025', '05/01/2025', pd.Timestamp('2025-01-20'), '2025/01/21'],
+                       index=[5, 5, 6, 7, 8, 9], dtype=object)
+    resultado = parse_fechas_columna(fechas)
+    assert list(resultado.index) == [5, 5, 6, 7, 8, 9]
+    assert resultado.dt.strftime('%Y-%m-%d').tolist() == [
+        '2025-01-13', '2025-01-14', '2025-01-13', '2025-05-01', '2025-01-20', '2025-01-21'
+    ]
+    # Con todas las fechas ambiguas gana el formato de mayor prioridad (día/mes)
+    assert normalizar_fechas_columna(pd.Series(['05/01/2025', '06/02/2025'])).tolist() == ['2025-01-05', '2025-02-06']
+    assert normalizar_fechas_columna(pd.Series(['07-01-2025', 'x'])).tolist()[0] == '2025-01-07'
+    assert normalizar_fecha('20250107') == '2025-01-07' and normalizar_fecha('') is None
+
+
+# Test: la limpieza vectorizada da lo mismo que el limpiar_descripcion original
+def test_limpiar_descripcion_columna_equivale_a_limpiar_descripcion():
+    descripciones = pd.Series(['Pago PSE ref 12345 - Nómina', '  TRANSFERENCIA a la cuenta ABC123  ',
+                               None, '', 'de la el', 'CHEQUE #0045, comisión/iva'], dtype=object)
+    # Resultados del limpiar_descripcion escalar anterior a la vectorización
+    esperado = ['pse 12345 nómina', 'cuenta abc123', '', '', '', 'cheque 0045 comisión iva']
+    assert limpiar_descripcion_columna(descripciones).tolist() == esperado
+    assert [limpiar_descripcion(d) if d else '' for d in descripciones] == esperado
+
+
+# Test: el DataFrame construido desde tuplas es igual al construido desde objetos ORM
+def test_crear_dataframe_movimientos_desde_tuplas():
+    movimientos = [
+        Movimiento(id=1, fecha='2025-01-07', descripcion='Pago nómina 123', valor=1500000.0),
+        Movimiento(id=2, fecha='08/01/2025', descripcion=None, valor=99999.999),
+        Movimiento(id=3, fecha=None, descripcion='Comisión', valor=25000000),
+    ]
+    tuplas = [(m.id, m.fecha, m.descripcion, m.valor) for m in movimientos]
+
+    df = crear_dataframe_movimientos(tuplas, 'banco', 'E')
+
+    pd.testing.assert_frame_equal(df, crear_dataframe_movimientos(movimientos, 'banco', 'E'))
+    assert categorizar_por_valor_columna(df['valor_rounded']).tolist() == ['grande', 'mediano', 'muy_grande']
+    assert df['valor_rounded'].tolist() == [1500000.0, 100000.0, 25000000.0]
+    assert df['descripcion_clean'].tolist() == ['nómina 123', '', 'comisión']
+    assert df.loc[1, 'dia'] - df.loc[0, 'dia'] == 1
+    assert palabras_descripcion_columna(df['descripcion_clean']).tolist() == [{'nómina', '123'}, set(), {'comisión'}]
+    assert df.loc[2, 'dia'] == DIA_INVALIDO
+    # Solo las columnas del motor: la fecha se interpreta una vez y queda como número de día
+    assert list(df.columns) == ['id', 'descripcion_clean', 'referencias', 'valor_rounded', 'valor_centavos', 'dia', 'tipo', 'es']
+
+
+# Test: el join por banda respeta la tolerancia de días configurada
+def test_matches_aproximados_respetan_tolerancia_dias():
+    df_banco = crear_dataframe_movimientos([
+        (1, '2025-01-10', 'nomina', 500000.0),
+        (2, '2025-01-10', 'nomina', 500000.0),
+        (3, '2025-01-20', 'arriendo', 1200000.0),
+    ], 'banco', 'S')
+    df_auxiliar = crear_dataframe_movimientos([
+        (10, '2025-01-12', 'nomina', 500000.0),
+        (11, '2025-01-25', 'nomina', 500000.0),
+        (12, '2025-01-24', 'arriendo', 1200000.0),
+    ], 'auxiliar', 'S')
+
+    matches = encontrar_matches_valor_fecha_aproximada(df_banco, df_auxiliar, tolerancia_dias=2)
+    assert list(zip(matches['id_banco'], matches['id_auxiliar'])) == [(1, 10)]
+
+    matches = encontrar_matches_valor_fecha_aproximada(df_banco, df_auxiliar, tolerancia_dias=4)
+    assert list(zip(matches['id_banco'], matches['id_auxiliar'])) == [(1, 10), (3, 12)]
+
+
+# Test: con valores repetidos el mismo día se emparejan todos los movimientos posibles
+def test_matches_exactos_no_descartan_pares_validos():
+    df_banco = crear_dataframe_movimientos([
+        (1, '2025-01-15', 'comision', 12000.0),
+        (2, '2025-01-15', 'comision', 12000.0),
+    ], 'banco', 'S')
+    df_auxiliar = crear_dataframe_movimientos([
+        (10, '2025-01-15', 'comision', 12000.0),
+        (11, '2025-01-15', 'comision', 12000.0),
+    ], 'auxiliar', 'S')
+
+    matches = encontrar_matches_exactos(df_banco, df_auxiliar)
+    assert sorted(zip(matches['id_banco'], matches['id_auxiliar'])) == [(1, 10), (2, 11)]
+
+
+# Test: el modo óptimo encuentra pares que la asignación greedy pierde
+def test_asignacion_optima_supera_a_greedy():
+    df_banco = crear_dataframe_movimientos([
+        (1, '2025-01-10', 'nomina', 500000.0),
+        (2, '2025-01-12', 'nomina', 500000.0),
+    ], 'banco', 'S')
+    df_auxiliar = crear_dataframe_movimientos([
+        (10, '2025-01-11', 'nomina', 500000.0),
+        (11, '2025-01-09', 'nomina', 500000.0),
+    ], 'auxiliar', 'S')
+
+    greedy = encontrar_matches_valor_fecha_aproximada(df_banco, df_auxiliar, tolerancia_dias=2)
+    assert len(greedy) == 1
+
+    optimo = asignar_candidatos(generar_candidatos_aproximados(df_banco, df_auxiliar, 2), 'optimo')
+    assert sorted(zip(optimo['id_banco'], optimo['id_auxiliar'])) == [(1, 11), (2, 10)]
+    assert len(optimo) - optimo.attrs['pares_greedy'] == 1
+
+
+# Test: el motor trabaja con claves enteras (centavos y número de día)
+def test_claves_enteras_para_matching():
+    df_banco = crear_dataframe_movimientos([(1, '2025-03-05', 'iva', 0.1 + 0.2)], 'banco', 'S')
+    df_auxiliar = crear_dataframe_movimientos([(10, '05/02/2025', 'iva', 0.3)], 'auxiliar', 'S')
+
+    assert df_banco['valor_centavos'].dtype == 'int64' and df_banco['dia'].dtype == 'int32'
+    assert df_banco['valor_centavos'].tolist() == df_auxiliar['valor_centavos'].tolist() == [30]
+
+    # Mismo valor y mismo día del mes (en meses distintos) es un match exacto
+    matches = encontrar_matches_exactos(df_banco, df_auxiliar)
+    assert list(zip(matches['id_banco'], matches['id_auxiliar'])) == [(1, 10)]
+
+
+# Test: una sola consulta reparte los movimientos pendientes en los cuatro grupos
+def test_cargar_movimientos_pendientes_particiona_por_tipo(db):
+    agregar_movimientos(db, [
+        ('banco', 'E', '2025-01-02', 'Consignación', 100.0, 'no_conciliado'),
+        ('auxiliar', 'S', '2025-01-03', 'Pago proveedor', 200.0, 'no_conciliado'),
+        ('banco', 'E', '2025-01-04', 'Consignación', 300.0, 'no_conciliado'),
+        ('banco', 'S', '2025-01-05', 'Comisión', 400.0, 'conciliado'),
+    ])
+
+    particiones = cargar_movimientos_pendientes(1, db)
+
+    esperado = crear_dataframe_movimientos([(1, '2025-01-02', 'Consignación', 100.0),
+                                            (3, '2025-01-04', 'Consignación', 300.0)], 'banco', 'E')
+    pd.testing.assert_frame_equal(particiones[('banco', 'E')], esperado)
+    assert particiones[('auxiliar', 'S')]['id'].tolist() == [2]
+    assert particiones[('banco', 'S')].empty and particiones[('auxiliar', 'E')].empty
+
+
+# Test: los movimientos se recorren por lotes con solo las columnas pedidas, y la carga por lotes da el mismo resultado
+def test_iter_by_conciliacion_por_lotes(db, monkeypatch):
+    agregar_movimientos(db, [
+        ('banco', 'E', f'2025-01-0{dia}', 'Consignación', 100.0 * dia, 'conciliado' if dia == 3 else 'no_conciliado')
+        for dia in range(1, 8)
+    ])
+    movimiento_repo = RepositoryFactory(db).get_movimiento_repository()
+
+    filas = list(movimiento_repo.iter_by_conciliacion(1, {'estado_conciliacion': 'no_conciliado'}, columnas=['id', 'valor'], tamano_lote=2))
+    assert [fila._asdict() for fila in filas[:2]] == [{'id': 1, 'valor': 100.0}, {'id': 2, 'valor': 200.0}]
+    assert [fila.id for fila in filas] == [1, 2, 4, 5, 6, 7]
+
+    completo = cargar_movimientos_pendientes(1, db)[('banco', 'E')]
+    monkeypatch.setattr('app.utils.conciliaciones.TAMANO_LOTE_CARGA', 4)
+    pd.testing.assert_frame_equal(cargar_movimientos_pendientes(1, db)[('banco', 'E')], completo)
+
+
+# Test: los conteos de varias conciliaciones salen de una sola consulta agrupada
+def test_count_by_conciliaciones_una_consulta(db):
+    db.add(Conciliacion(id=2, id_empresa=1, estado='en_proceso'))
+    db.add(Conciliacion(id=3, id_empresa=1, estado='en_proceso'))
+    agregar_movimientos(db, [
+        ('banco', 'E', '2025-01-02', 'Consignación', 100.0, 'conciliado'),
+        ('auxiliar', 'E', '2025-01-02', 'Consignación', 100.0, 'conciliado'),
+        ('banco', 'S', '2025-01-05', 'Comisión', 400.0, 'no_conciliado'),
+    ])
+    db.add(Movimiento(id_conciliacion=2, fecha='2025-01-02', descripcion='Pago', valor=5.0, tipo='banco', es='S',
+                      estado_conciliacion='no_conciliado'))
+    db.commit()
+
+    consultas = []
+    event.listen(db.bind, 'before_cursor_execute', lambda *args: consultas.append(args[2]))
+    conteos = RepositoryFactory(db).get_movimiento_repository().count_by_conciliaciones([1, 2, 3])
+    assert conteos == {1: (3, 2), 2: (1, 0), 3: (0, 0)}
+    assert len(consultas) == 1
+
+
+# Test: la unidad de trabajo agrupa las operaciones de los repositorios en un solo commit o un solo rollback
+def test_unit_of_work_un_solo_commit(db):
+    agregar_movimientos(db, [
+        ('banco', 'E', '2025-01-02', 'Consignación', 100.0, 'no_conciliado'),
+        ('auxiliar', 'E', '2025-01-02', 'Consignación', 60.0, 'no_conciliado'),
+        ('auxiliar', 'E', '2025-01-02', 'Consignación', 40.0, 'no_conciliado'),
+    ])
+    commits = []
+    event.listen(db, 'after_commit', lambda session: commits.append(session))
+
+    resultado = crear_conciliacion_manual(1, [1], [2, 3], db)
+    assert resultado['success'] is True and len(commits) == 1
+    assert db.query(ConciliacionManualAuxiliar).count() == 2
+    assert db.query(Movimiento).filter(Movimiento.estado_conciliacion == 'conciliado').count() == 3
+
+    factory = RepositoryFactory(db)
+    with pytest.raises(RuntimeError):
+        with factory.unit_of_work():
+            manual = factory.get_manual_repository().create({"id_conciliacion": 1})
+            assert manual.id is not None  # flush: el id ya está asignado
+            with factory.unit_of_work():
+                factory.get_conciliacion_repository().update(1, {"estado": "finalizada"})
+            raise RuntimeError("falla a mitad del bloque")
+    assert len(commits) == 1
+    assert db.query(ConciliacionManual).count() == 1
+    assert db.get(Conciliacion, 1).estado == 'en_proceso'
+
+
+# Test: update_bulk agrupa las actualizaciones sin cargar objetos ORM
+def test_update_bulk_por_conjuntos(db):
+    agregar_movimientos(db, [
+        ('banco', 'E', '2025-01-02', 'Consignación', 100.0, 'no_conciliado'),
+        ('banco', 'E', '2025-01-03', 'Consignación', 200.0, 'no_conciliado'),
+        ('banco', 'E', '2025-01-04', 'Consignación', 300.0, 'no_conciliado'),
+        ('auxiliar', 'E', '2025-01-05', 'Consignación', 400.0, 'no_conciliado'),
+    ])
+    consultas = []
+    event.listen(db.bind, 'before_cursor_execute', lambda *args: consultas.append(args[2]))
+
+    actualizados = RepositoryFactory(db).get_movimiento_repository().update_bulk([
+        {'id': 1, 'estado_conciliacion': 'conciliado'},
+        {'id': 2, 'estado_conciliacion': 'conciliado'},
+        {'id': 3, 'valor': 350.0},
+        {'id': 4, 'valor': 450.0, 'descripcion': 'Pago PSE ref 12345'},
+        {'id': 99, 'valor': 1.0},
+    ])
+
+    assert actualizados == 4
+    assert not [sql for sql in consultas if sql.lstrip().upper().startswith('SELECT')]
+    db.expire_all()
+    assert [m.valor for m in db.query(Movimiento).order_by(Movimiento.id)] == [100.0, 200.0, 350.0, 450.0]
+    assert db.query(Movimiento).filter(Movimiento.estado_conciliacion == 'conciliado').count() == 2
+    assert db.get(Movimiento, 4).referencias_descripcion == '12345'
+
+
+# Test: create_bulk inserta en bloque sin refrescar cada fila y devuelve los ids en orden
+def test_create_bulk_sin_refresh(db):
+    factory = RepositoryFactory(db)
+    consultas = []
+    event.listen(db.bind, 'before_cursor_execute', lambda *args: consultas.append(args[2]))
+
+    ids = factory.get_movimiento_repository().create_bulk([
+        {'id_conciliacion': 1, 'fecha': '2025-01-02', 'descripcion': 'Pago PSE ref 12345', 'valor': 100.0, 'tipo': 'banco', 'es': 'E'},
+        {'id_conciliacion': 1, 'fecha': '2025-01-02', 'descripcion': 'Consignación', 'valor': 100.0, 'tipo': 'auxiliar', 'es': 'E'},
+    ])
+    # Sin SELECT de refresh; en PostgreSQL además es un solo INSERT ... RETURNING por lote
+    assert all(sql.startswith('INSERT') for sql in consultas) and ids == sorted(ids)
+    assert factory.get_match_repository().create_bulk([
+        {'id_conciliacion': 1, 'id_movimiento_banco': ids[0], 'id_movimiento_auxiliar': ids[1], 'criterio_match': 'exacto_E'}
+    ], return_ids=False) is None
+
+    banco = db.get(Movimiento, ids[0])
+    assert banco.estado_conciliacion == 'no_conciliado' and banco.referencias_descripcion == '12345'
+    assert db.query(ConciliacionMatch).one().id_movimiento_auxiliar == ids[1]
+
+
+# Test: las consultas de pendientes y de matches por conciliación usan los índices compuestos
+def test_consultas_usan_indices_compuestos(db):
+    plan = db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT id FROM movimientos "
+        "WHERE id_conciliacion = 1 AND estado_conciliacion = 'no_conciliado' AND tipo = 'banco' AND es = 'E'"
+    )).fetchall()
+    assert 'ix_movimientos_conciliacion_estado_tipo_es' in plan[0][3]
+    plan = db.execute(text("EXPLAIN QUERY PLAN SELECT id FROM conciliacion_matches WHERE id_conciliacion = 1")).fetchall()
+    assert 'ix_conciliacion_matches_conciliacion' in plan[0][3]
+
+
+# Test: fecha y valor se guardan como DATE y NUMERIC y se leen como texto ISO y float
+def test_fecha_y_valor_tipados(db):
+    agregar_movimientos(db, [
+        ('banco', 'E', '13/01/2025', 'Consignación', 0.1 + 0.2, 'no_conciliado'),
+        ('banco', 'E', '20250107', 'Consignación', 100, 'no_conciliado'),
+        ('banco', 'E', '', 'Consignación', 1234.567, 'no_conciliado'),
+    ])
+    RepositoryFactory(db).get_movimiento_repository().create_bulk([
+        {'id_conciliacion': 1, 'fecha': pd.Timestamp('2025-02-01'), 'descripcion': 'Pago', 'valor': 5.0, 'tipo': 'auxiliar', 'es': 'E'}
+    ], return_ids=False)
+    db.expire_all()
+
+    movimientos = db.query(Movimiento).order_by(Movimiento.id).all()
+    assert [m.fecha for m in movimientos] == ['2025-01-13', '2025-01-07', None, '2025-02-01']
+    assert [m.valor for m in movimientos] == [0.3, 100.0, 1234.57, 5.0] and isinstance(movimientos[1].valor, float)
+    # Los filtros por rango comparan fechas en la base
+    assert db.query(Movimiento).filter(Movimiento.fecha.between('10/01/2025', '2025-01-31')).one().id == 1
+    # El motor lee las fechas como date y calcula el día sin interpretar texto
+    tuplas = RepositoryFactory(db).get_movimiento_repository().get_tuplas_con_tipo_by_conciliacion(1)
+    assert [t[1] for t in tuplas] == [date(2025, 1, 13), date(2025, 1, 7), None, date(2025, 2, 1)]
+    df = cargar_movimientos_pendientes(1, db)[('banco', 'E')]
+    assert df['dia'].tolist() == [20101, 20095, DIA_INVALIDO]
+
+    # Un texto que no es fecha se rechaza al escribir en lugar de guardarse como NULL
+    with pytest.raises(StatementError) as error:
+        agregar_movimientos(db, [('banco', 'E', 'no es fecha', 'Consignación', 1.0, 'no_conciliado')])
+    assert isinstance(error.value.orig, ValueError)
+    db.rollback()
+    assert db.query(Movimiento).count() == 4
+
+
+# Test: la descripción normalizada y las referencias se guardan al insertar y se recalculan si faltan o cambia la descripción
+def test_caracteristicas_descripcion_guardadas(db):
+    agregar_movimientos(db, [
+        ('banco', 'E', '2025-01-02', 'Pago PSE ref 12345 - Nómina ABC99', 100.0, 'no_conciliado'),
+        ('banco', 'E', '2025-01-03', 'Consignación', 200.0, 'no_conciliado'),
+    ])
+    movimiento = db.query(Movimiento).filter(Movimiento.id == 1).one()
+    assert movimiento.descripcion_normalizada == 'pse 12345 nómina abc99'
+    assert movimiento.referencias_descripcion == '12345 ABC99'
+
+    movimiento.descripcion = 'Abono 777'
+    db.commit()
+    assert (movimiento.descripcion_normalizada, movimiento.referencias_descripcion) == ('abono 777', '777')
+
+    # Movimiento antiguo sin características: se calculan al cargar
+    db.execute(update(Movimiento).where(Movimiento.id == 2).values(descripcion_normalizada=None, referencias_descripcion=None))
+    db.commit()
+    df = cargar_movimientos_pendientes(1, db)[('banco', 'E')]
+    assert df['descripcion_clean'].tolist() == ['abono 777', 'consignación']
+    assert df['referencias'].tolist() == ['777', '']
+
+
+# Test: los movimientos cargados desde un archivo guardan las características de la descripción
+def test_carga_archivo_guarda_caracteristicas_descripcion(db):
+    archivo = io.BytesIO()
+    pd.DataFrame({
+        'Fecha': ['02/01/2025', '03/01/2025'],
+        'Descripcion': ['Pago PSE ref 12345 - Nómina ABC99', 'Consignación'],
+        'Valor': [100, -200.5],
+        'ES': ['E', 'S'],
+    }).to_excel(archivo, index=False)
+    archivo.seek(0)
+
+    asyncio.run(routes_conciliacion.agregar_movimientos_a_conciliacion(
+        1, UploadFile(file=archivo, filename='banco.xlsx'), 'banco', db=db,
+        current_user=SimpleNamespace(id=1, role='administrador')
+    ))
+
+    filas = db.execute(text(
+        "SELECT descripcion_normalizada, referencias_descripcion, valor FROM movimientos ORDER BY id"
+    )).fetchall()
+    assert [tuple(fila) for fila in filas] == [('pse 12345 nómina abc99', '12345 ABC99', 100), ('consignación', '', 200.5)]
+
+
+# Test: la estrategia por descripción empareja fuera de la tolerancia de fechas según la similitud
+def test_matches_valor_descripcion_por_similitud():
+    df_banco = crear_dataframe_movimientos([
+        (1, '2025-01-02', 'Pago proveedor ACME ref 98765', 750000.0),
+        (2, '2025-01-03', 'Comisión manejo cuenta', 750000.0),
+    ], 'banco', 'S')
+    df_auxiliar = crear_dataframe_movimientos([
+        (10, '2025-01-18', 'Arriendo oficina enero', 750000.0),
+        (11, '2025-01-20', 'Pago a proveedor ACME ref 98765', 750000.0),
+    ], 'auxiliar', 'S')
+
+    stats, resultados = calcular_matches_por_tipo(df_banco, df_auxiliar, 'S')
+
+    assert stats['matches_aproximados'] == 0 and stats['matches_valor_descripcion'] == 1
+    criterio, matches = resultados[0]
+    assert criterio == 'valor_descripcion_S'
+    assert list(zip(matches['id_banco'], matches['id_auxiliar'])) == [(1, 11)]
+    assert matches.loc[0, 'similitud'] >= 0.6
+
+    # Con un solo candidato por movimiento solo se compara el más cercano en fecha
+    candidatos = generar_candidatos_valor_descripcion(df_banco, df_auxiliar, umbral=0.0, max_candidatos=1)
+    assert list(zip(candidatos['id_banco'], candidatos['id_auxiliar'])) == [(1, 10), (2, 10)]
+
+
+# Test: la tolerancia de valor acepta diferencias pequeñas y prefiere la menor
+def test_matches_tolerancia_valor():
+    df_banco = crear_dataframe_movimientos([
+        (1, '2025-02-10', 'transferencia', 1000000.0),
+        (2, '2025-02-10', 'pago', 200000.0),
+    ], 'banco', 'S')
+    df_auxiliar = crear_dataframe_movimientos([
+        (10, '2025-02-11', 'transferencia', 1000085.0),
+        (11, '2025-02-10', 'transferencia', 1000030.5),
+        (12, '2025-02-10', 'pago', 201000.0),
+    ], 'auxiliar', 'S')
+
+    matches = encontrar_matches_tolerancia_valor(df_banco, df_auxiliar, tolerancia_absoluta=100)
+    assert list(zip(matches['id_banco'], matches['id_auxiliar'])) == [(1, 11)]
+    assert matches.loc[0, 'diferencia_valor'] == -30.5
+
+    # La cota porcentual se aplica sobre el valor del banco (0.5% de 200000 = 1000)
+    matches = encontrar_matches_tolerancia_valor(df_banco, df_auxiliar, tolerancia_absoluta=0, tolerancia_porcentaje=0.5)
+    assert sorted(zip(matches['id_banco'], matches['id_auxiliar'])) == [(1, 11), (2, 12)]
+
+
+# Test: la diferencia real de valor queda guardada en el match
+def test_conciliacion_guarda_diferencia_valor(db):
+    agregar_movimientos(db, [
+        ('banco', 'E', '2025-02-03', 'Consignación cliente', 500000.0, 'no_conciliado'),
+        ('auxiliar', 'E', '2025-02-04', 'Recaudo cliente', 499990.0, 'no_conciliado'),
+    ])
+
+    # La estrategia de tolerancia de valor es opcional: por defecto no concilia el par
+    assert realizar_conciliacion_automatica(1, db)['total_matches'] == 0
+
+    stats = realizar_conciliacion_automatica(1, db, estrategias='exacto,tolerancia_valor')
+
+    assert stats['matches_tolerancia_valor_entradas'] == 1 and stats['total_matches'] == 1
+    assert stats['memoria_pico_proceso_mb'] > 0
+    match = db.query(ConciliacionMatch).one()
+    assert match.criterio_match == 'tolerancia_valor_E' and match.diferencia_valor == 10.0
+
+
+# Test: la medición detallada reporta el pico de memoria del bloque
+def test_medidor_memoria_reporta_pico():
+    with MedidorMemoria(detallada=True) as medidor:
+        bloque = np.ones(4 * 1024 * 1024, dtype=np.int64)
+        del bloque
+
+    stats = medidor.stats()
+    assert stats['memoria_pico_conciliacion_mb'] >= 32
+    assert 'memoria_pico_conciliacion_mb' not in MedidorMemoria().stats()
+    assert stats['memoria_pico_compartida'] is False
+
+
+# Test: mediciones solapadas comparten tracemalloc y solo la última en salir lo detiene
+def test_medidor_memoria_mediciones_solapadas():
+    tracing_previo = tracemalloc.is_tracing()
+    primera = MedidorMemoria(detallada=True).__enter__()
+    with MedidorMemoria(detallada=True) as segunda:
+        pass
+    assert tracemalloc.is_tracing()
+    primera.__exit__(None, None, None)
+
+    assert tracemalloc.is_tracing() == tracing_previo
+    assert segunda.stats()['memoria_pico_compartida'] and primera.stats()['memoria_pico_compartida']
+
+
+# Test: el orden de las estrategias es configurable y cada etapa reporta tiempo, candidatos y matches
+def test_pipeline_estrategias_configurable():
+    df_banco = crear_dataframe_movimientos([
+        (1, '2025-03-05', 'pago proveedor', 100000.0),
+        (2, '2025-03-10', 'pago nomina', 250000.0),
+    ], 'banco', 'S')
+    df_auxiliar = crear_dataframe_movimientos([
+        (10, '2025-03-05', 'pago proveedor', 100000.0),
+        (11, '2025-03-11', 'nomina marzo', 250000.0),
+    ], 'auxiliar', 'S')
+
+    stats, resultados = calcular_matches_por_tipo(df_banco, df_auxiliar, 'S')
+    assert [criterio for criterio, _ in resultados] == ['exacto_S', 'aproximado_S']
+    # Con todo conciliado no se ejecutan las etapas restantes
+    assert [etapa['estrategia'] for etapa in stats['etapas']] == ['exacto', 'aproximado']
+    assert [(etapa['candidatos'], etapa['matches']) for etapa in stats['etapas']] == [(1, 1), (1, 1)]
+    assert all(etapa['tiempo_segundos'] >= 0 for etapa in stats['etapas'])
+
+    # Sin la etapa exacta, la aproximada concilia ambos pares
+    stats, resultados = calcular_matches_por_tipo(df_banco, df_auxiliar, 'S', estrategias='aproximado,tolerancia_valor')
+    assert [criterio for criterio, _ in resultados] == ['aproximado_S']
+    assert stats['matches_aproximados'] == 2 and stats['matches_exactos'] == 0
+
+    # Las estrategias nuevas deben implementar buscar
+    with pytest.raises(TypeError):
+        type('EstrategiaIncompleta', (EstrategiaMatching,), {'nombre': 'incompleta'})()
+
+    with pytest.raises(ValueError):
+        construir_estrategias('exacto,inexistente')
+
+
+# Test: los movimientos partidos se concilian en grupo (1:N y N:1) en las tablas manuales
+def test_conciliacion_grupos_por_suma(db):
+    agregar_movimientos(db, [
+        ('banco', 'E', '2025-03-03', 'Abono parcial', 100000.0, 'no_conciliado'),
+        ('banco', 'E', '2025-03-04', 'Abono parcial', 150000.0, 'no_conciliado'),
+        ('banco', 'E', '2025-03-05', 'Abono parcial', 250000.0, 'no_conciliado'),
+        ('banco', 'E', '2025-03-04', 'Abono', 77777.0, 'no_conciliado'),
+        ('auxiliar', 'E', '2025-03-04', 'Consignación consolidada', 500000.0, 'no_conciliado'),
+        ('banco', 'S', '2025-03-10', 'Pago consolidado', 300000.0, 'no_conciliado'),
+        ('auxiliar', 'S', '2025-03-09', 'Factura 1', 120000.0, 'no_conciliado'),
+        ('auxiliar', 'S', '2025-03-11', 'Factura 2', 180000.0, 'no_conciliado'),
+    ])
+
+    stats = realizar_conciliacion_automatica(1, db)
+
+    assert stats['grupos_por_suma_entradas'] == 1 and stats['grupos_por_suma_salidas'] == 1
+    assert stats['movimientos_banco_conciliados'] == 4 and stats['movimientos_auxiliar_conciliados'] == 3
+    grupos = {
+        manual.id: (
+            sorted(i.id_movimiento_banco for i in db.query(ConciliacionManualBanco).filter_by(id_conciliacion_manual=manual.id)),
+            sorted(i.id_movimiento_auxiliar for i in db.query(ConciliacionManualAuxiliar).filter_by(id_conciliacion_manual=manual.id)),
+        )
+        for manual in db.query(ConciliacionManual).all()
+    }
+    assert sorted(grupos.values()) == [([1, 2, 3], [5]), ([6], [7, 8])]
+    assert db.query(Movimiento).filter_by(estado_conciliacion='no_conciliado').one().id == 4
+
+
+# Test: la previsualización no escribe y las propuestas aceptadas se guardan en bloque
+def test_previsualizar_y_aplicar_propuestas(db):
+    agregar_movimientos(db, [
+        ('banco', 'E', '2025-03-03', 'Abono parcial', 100000.0, 'no_conciliado'),
+        ('banco', 'E', '2025-03-04', 'Abono parcial', 150000.0, 'no_conciliado'),
+        ('auxiliar', 'E', '2025-03-04', 'Consignación consolidada', 250000.0, 'no_conciliado'),
+        ('banco', 'S', '2025-03-10', 'Pago proveedor', 80000.0, 'no_conciliado'),
+        ('auxiliar', 'S', '2025-03-10', 'Pago proveedor', 80000.0, 'no_conciliado'),
+        ('banco', 'S', '2025-03-12', 'Pago nómina', 45000.0, 'no_conciliado'),
+        ('auxiliar', 'S', '2025-03-12', 'Pago nómina', 45000.0, 'no_conciliado'),
+    ])
+
+    stats, resultados = previsualizar_conciliacion_automatica(1, db)
+    lineas = [json.loads(linea) for bloque in lineas_ndjson_previsualizacion(stats, resultados, tamano_bloque=1)
+              for linea in bloque.splitlines()]
+    assert lineas[0]['tipo'] == 'resumen' and lineas[0]['stats']['total_propuestas'] == 3
+    propuestas = [{k: v for k, v in linea.items() if k != 'tipo'} for linea in lineas[1:]]
+    assert sorted(p['criterio'] for p in propuestas) == ['agrupado_E', 'exacto_S', 'exacto_S']
+    assert db.query(ConciliacionMatch).count() == 0 and db.query(ConciliacionManual).count() == 0
+
+    # Se acepta el grupo y un solo par; una propuesta ya aplicada ya no es válida
+    aceptadas = [p for p in propuestas if p['criterio'] == 'agrupado_E' or p.get('id_banco') == 4]
+    assert aplicar_propuestas(1, aceptadas, db) == {'matches_creados': 1, 'grupos_creados': 1, 'movimientos_conciliados': 5}
+    assert sorted(m.id for m in db.query(Movimiento).filter_by(estado_conciliacion='no_conciliado')) == [6, 7]
+    with pytest.raises(ValueError):
+        aplicar_propuestas(1, propuestas, db)
+    assert db.query(ConciliacionMatch).count() == 1
+
+
+# Test: al aplicar se validan los valores guardados y se detectan movimientos conciliados entretanto
+def test_aplicar_propuestas_valida_valores_y_concurrencia(db, monkeypatch):
+    agregar_movimientos(db, [
+        ('banco', 'S', '2025-03-10', 'Pago proveedor', 50000.0, 'no_conciliado'),
+        ('auxiliar', 'S', '2025-03-10', 'Pago proveedor', 49990.0, 'no_conciliado'),
+        ('banco', 'E', '2025-03-03', 'Abono parcial', 100000.0, 'no_conciliado'),
+        ('banco', 'E', '2025-03-04', 'Abono parcial', 150000.0, 'no_conciliado'),
+        ('auxiliar', 'E', '2025-03-04', 'Consignación consolidada', 250010.0, 'no_conciliado'),
+        ('banco', 'E', '2025-03-20', 'Consignación', 300000.0, 'no_conciliado'),
+        ('auxiliar', 'E', '2025-03-20', 'Consignación', 300000.0, 'no_conciliado'),
+    ])
+
+    with pytest.raises(ValueError, match='fuera de la tolerancia'):
+        aplicar_propuestas(1, [{'criterio': 'exacto_S', 'id_banco': 1, 'id_auxiliar': 2, 'diferencia_valor': 0}], db)
+    with pytest.raises(ValueError, match='no suman lo mismo'):
+        aplicar_propuestas(1, [{'criterio': 'agrupado_E', 'ids_banco': [3, 4], 'ids_auxiliar': [5]}], db)
+
+    # La diferencia guardada sale de los valores, no de la propuesta
+    aplicar_propuestas(1, [{'criterio': 'tolerancia_valor_S', 'id_banco': 1, 'id_auxiliar': 2, 'diferencia_valor': 999}], db)
+    assert db.query(ConciliacionMatch).one().diferencia_valor == 10.0
+
+    # Otra aplicación concilia el movimiento 7 después de la validación: no se guarda nada
+    validar = previsualizacion.validar_propuestas
+
+    def validar_y_conciliar_en_paralelo(*args):
+        resultado = validar(*args)
+        db.execute(update(Movimiento).where(Movimiento.id == 7).values(estado_conciliacion='conciliado'))
+        return resultado
+
+    monkeypatch.setattr(previsualizacion, 'validar_propuestas', validar_y_conciliar_en_paralelo)
+    with pytest.raises(ValueError, match='se conciliaron'):
+        aplicar_propuestas(1, [{'criterio': 'exacto_E', 'id_banco': 6, 'id_auxiliar': 7}], db)
+    assert db.query(ConciliacionMatch).count() == 1
+    assert db.query(Movimiento).filter_by(id=6).one().estado_conciliacion == 'no_conciliado'
+
+
+# Test: entradas y salidas buscan grupos con su propia parte del presupuesto
+def test_grupos_por_suma_presupuesto_por_tipo(db, monkeypatch):
+    agregar_movimientos(db, [
+        ('banco', 'E', '2025-03-03', 'Abono parcial', 100000.0, 'no_conciliado'),
+        ('banco', 'E', '2025-03-04', 'Abono parcial', 150000.0, 'no_conciliado'),
+        ('banco', 'E', '2025-03-05', 'Abono parcial', 250000.0, 'no_conciliado'),
+        ('banco', 'E', '2025-03-04', 'Abono', 77777.0, 'no_conciliado'),
+        ('auxiliar', 'E', '2025-03-04', 'Consignación consolidada', 500000.0, 'no_conciliado'),
+        ('banco', 'S', '2025-03-10', 'Pago consolidado', 300000.0, 'no_conciliado'),
+        ('auxiliar', 'S', '2025-03-09', 'Factura 1', 120000.0, 'no_conciliado'),
+        ('auxiliar', 'S', '2025-03-11', 'Factura 2', 180000.0, 'no_conciliado'),
+    ])
+    # Entradas agota su mitad (6 combinaciones); salidas encuentra su grupo con la suya
+    monkeypatch.setattr(conciliaciones, 'MAX_COMBINACIONES_GRUPOS', 12)
+    for _ in range(2):
+        stats, _, presupuestos = calcular_conciliacion(cargar_movimientos_pendientes(1, db))
+        assert (stats['grupos_por_suma_entradas'], stats['grupos_por_suma_salidas']) == (0, 1)
+        assert presupuestos['E'].agotado and not presupuestos['S'].agotado
+        assert stats['busqueda_grupos_interrumpida']
+
+
+# Test: sin presupuesto de combinaciones la búsqueda de grupos se detiene
+def test_grupos_por_suma_respetan_presupuesto():
+    df_banco = crear_dataframe_movimientos([(1, '2025-03-03', 'abono', 100.0), (2, '2025-03-03', 'abono', 200.0)], 'banco', 'E')
+    df_auxiliar = crear_dataframe_movimientos([(10, '2025-03-03', 'consignacion', 300.0)], 'auxiliar', 'E')
+
+    assert len(encontrar_grupos_por_suma(df_banco, df_auxiliar, presupuesto=PresupuestoBusqueda(10, 1000))) == 1
+    presupuesto = PresupuestoBusqueda(10, 0)
+    assert encontrar_grupos_por_suma(df_banco, df_auxiliar, presupuesto=presupuesto).empty
+    assert presupuesto.agotado
+
+    # El reloj arranca con la búsqueda de grupos, no al crear el presupuesto
+    presupuesto = PresupuestoBusqueda(0.05, 1000)
+    time.sleep(0.1)
+    assert len(encontrar_grupos_por_suma(df_banco, df_auxiliar, presupuesto=presupuesto)) == 1
+    assert not presupuesto.agotado
+
+    # Sin tiempo, la enumeración de una mitad se corta en la primera revisión
+    presupuesto = PresupuestoBusqueda(0, 10 ** 9)
+    assert buscar_subconjunto(150, list(range(1, 41)), 4, presupuesto) is None
+    assert presupuesto.agotado and presupuesto.combinaciones_restantes == 10 ** 9 - COMBINACIONES_POR_REVISION
+
+
+# Test: la conciliación incremental solo consulta los pendientes relacionados con los movimientos nuevos
+def test_conciliacion_incremental_usa_solo_el_delta(db):
+    agregar_movimientos(db, [
+        ('banco', 'E', '2025-04-02', 'Consignación', 100000.0, 'no_conciliado'),
+        ('banco', 'E', '2025-04-20', 'Consignación', 555000.0, 'no_conciliado'),
+        ('auxiliar', 'S', '2025-04-10', 'Pago', 80000.0, 'no_conciliado'),
+    ])
+    stats = realizar_conciliacion_automatica(1, db, incremental=True)
+    assert stats['incremental'] is False and stats['total_matches'] == 0
+    assert db.query(IndiceConciliacion).count() == 3
+
+    agregar_movimientos(db, [
+        ('auxiliar', 'E', '2025-04-03', 'Consignación', 100000.0, 'no_conciliado'),
+    ])
+    stats = realizar_conciliacion_automatica(1, db, incremental=True)
+
+    assert stats['incremental'] is True and stats['movimientos_nuevos'] == 1
+    assert stats['movimientos_consultados_indice'] == 1 and stats['matches_aproximados_entradas'] == 1
+    assert sorted(i.id_movimiento for i in db.query(IndiceConciliacion)) == [2, 3]
+
+    # Sin movimientos nuevos no hay nada que conciliar
+    stats = realizar_conciliacion_automatica(1, db, incremental=True)
+    assert stats['movimientos_nuevos'] == 0 and stats['total_matches'] == 0
+
+
+# Test: al deshacer un grupo sus movimientos vuelven a conciliarse en la siguiente ejecución incremental
+def test_deshacer_grupo_reingresa_a_conciliacion_incremental(db):
+    agregar_movimientos(db, [
+        ('banco', 'E', '2025-03-03', 'Abono parcial', 100000.0, 'no_conciliado'),
+        ('banco', 'E', '2025-03-04', 'Abono parcial', 150000.0, 'no_conciliado'),
+        ('auxiliar', 'E', '2025-03-04', 'Consignación consolidada', 250000.0, 'no_conciliado'),
+    ])
+    assert realizar_conciliacion_automatica(1, db, incremental=True)['grupos_por_suma_entradas'] == 1
+
+    manual = db.query(ConciliacionManual).one()
+    usuario = SimpleNamespace(id=1, role='administrador')
+    routes_conciliacion.eliminar_conciliacion_manual(manual.id, db=db, current_user=usuario)
+    assert db.query(Movimiento).filter_by(estado_conciliacion='no_conciliado').count() == 3
+
+    stats = realizar_conciliacion_automatica(1, db, incremental=True)
+
+    assert stats['grupos_por_suma_entradas'] == 1
+    assert db.query(Movimiento).filter_by(estado_conciliacion='no_conciliado').count() == 0
+
+    # Al eliminar la conciliación se elimina también su índice
+    routes_conciliacion.eliminar_conciliacion(1, db=db, current_user=usuario)
+    assert db.query(IndiceConciliacion).count() == 0 and db.query(Conciliacion).count() == 0
+
+
+# Test: el lote concilia cada conciliación en su propio proceso y agrega las estadísticas
+def test_procesar_conciliaciones_en_lote(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'lote.db'}"
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Empresa(id=1, nit='900123456', razon_social='Empresa Test'))
+    for conciliacion_id in (1, 2):
+        session.add(Conciliacion(id=conciliacion_id, id_empresa=1, estado='en_proceso'))
+        session.add_all([
+            Movimiento(id_conciliacion=conciliacion_id, fecha='2025-04-02', descripcion='pago', valor=1000.0 * conciliacion_id,
+                       tipo=tipo, es='S', estado_conciliacion='no_conciliado')
+            for tipo in ('banco', 'auxiliar')
+        ])
+    session.commit()
+
+    avance = []
+    resultado = procesar_conciliaciones_en_lote(
+        [2, 1, 3], max_workers=2, database_url=database_url,
+        al_completar=lambda r, completadas, total: avance.append((completadas, total))
+    )
+
+    assert avance == [(1, 3), (2, 3), (3, 3)]
+    assert [r['conciliacion_id'] for r in resultado['resultados']] == [1, 2, 3]
+    assert all(r['estado'] == 'ok' for r in resultado['resultados'])
+    assert resultado['stats']['conciliaciones'] == 3 and resultado['stats']['total_matches'] == 2
+    assert resultado['stats']['etapas'][0]['estrategia'] == 'exacto'
+    session.expire_all()
+    assert session.query(ConciliacionMatch).count() == 2
+    assert session.query(Movimiento).filter(Movimiento.estado_conciliacion == 'conciliado').count() == 4
+    session.close()
+
+
+# Test: el endpoint de lote no bloquea la request: crea la tarea y deja el lote en segundo plano
+def test_procesar_lote_en_segundo_plano(db):
+    db.add(Conciliacion(id=2, id_empresa=1, estado='en_proceso'))
+    db.commit()
+    background_tasks = BackgroundTasks()
+    request = routes_conciliacion.ProcesarLoteRequest(ids=[2, 1])
+
+    respuesta = routes_conciliacion.procesar_lote(
+        request, background_tasks, db=db, current_user=SimpleNamespace(id=1, role='administrador')
+    )
+
+    task = db.query(Task).one()
+    assert respuesta['task_id'] == task.id and respuesta['conciliaciones'] == [1, 2]
+    assert task.tipo == 'conciliacion_lote' and task.estado == 'pending' and task.id_conciliacion == 1
+    assert len(background_tasks.tasks) == 1
+    assert background_tasks.tasks[0].func is routes_conciliacion.procesar_lote_en_segundo_plano
+    assert background_tasks.tasks[0].kwargs['conciliacion_ids'] == [1, 2]
+
+    # La tarea guarda todo el lote y no se pierde al eliminar la conciliación a la que está asociada
+    assert routes_conciliacion.ids_conciliaciones_tarea(task) == [1, 2]
+    routes_conciliacion.eliminar_conciliacion(1, db=db, current_user=SimpleNamespace(id=1, role='administrador'))
+    db.expire_all()
+    task = db.query(Task).one()
+    assert task.id_conciliacion == 2 and routes_conciliacion.ids_conciliaciones_tarea(task) == [2]